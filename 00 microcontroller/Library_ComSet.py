@@ -57,6 +57,9 @@ for device in deviceList.values():
 			f"{device['Driver']}"
 			)(i2c, **device["Parameter"])
 
+		#tag with the physical bus (all i2c devices share one bus)
+		device["Bus"] = f"i2c{i2cInfo['bus']}"
+
 	else:
 
 		#make the instance using the non-i2c constructor
@@ -65,7 +68,77 @@ for device in deviceList.values():
 			f"{device['Driver']}"
 			)(**device["Parameter"])
 
+		#tag with the physical bus (uart devices by bus id; the rest are gpio)
+		if "bus" in device["Parameter"]:
+			device["Bus"] = f"uart{device['Parameter']['bus']}"
+
+		else:
+			device["Bus"] = "gpio"
+
 #get list of settings
 settings = read_file(
 	file_name = jsonpth + 'Library_settings.json'
-	)
\ No newline at end of file
+	)
+
+#switch the profiler on or off (see Library_profiler.py)
+from Library_profiler import myProfiler
+
+myProfiler.enabled = settings.get("profiling", True)
+
+#let the shared modbus buses report how long they wait on the bus
+from umodbus import serial as modbus
+
+modbus.wait_hook = myProfiler.addWait
+
+#add the firmware-level (virtual) devices; these are not on any physical bus
+
+#snapshot: reads a set of device/method pairs in one pass
+from Library_snapshot import Snapshot
+
+deviceList["snapshot"] = {
+	"Driver": "Snapshot",
+	"Bus": "system",
+	"Instance": Snapshot(deviceList, settings.get("pollChannels", [])),
+	}
+
+#protocol: switches the desktop link to binary frames (Library_protocol.py)
+from Library_protocol import Protocol
+
+deviceList["protocol"] = {
+	"Driver": "Protocol",
+	"Bus": "system",
+	"Instance": Protocol(),
+	}
+
+#stream: pushes readings of a set of channels to the desktop on a timer
+from Library_stream import Stream
+
+deviceList["stream"] = {
+	"Driver": "Stream",
+	"Bus": "system",
+	"Instance": Stream(
+		deviceList,
+		settings.get("streamChannels", settings.get("pollChannels", [])),
+		settings.get("streamPeriod", 0.1),
+		settings.get("runtime") == "asyncio"
+		),
+	}
+
+#logger: records readings of a set of channels into RAM (and flash) on a timer
+from Library_logger import Logger
+
+deviceList["logger"] = {
+	"Driver": "Logger",
+	"Bus": "system",
+	"Instance": Logger(
+		deviceList,
+		settings.get("logChannels", settings.get("pollChannels", [])),
+		settings["loggerPeriod"],
+		settings.get("logSize", 1000),
+		settings.get("logFile") or None,
+		settings.get("runtime") == "asyncio"
+		),
+	}
+
+if settings.get("logging"):
+	deviceList["logger"]["Instance"].start()
\ No newline at end of file
@@ -9,8 +9,19 @@ to the pi pico controller
 '''
 
 from sys import stdin
-from select import select
+from select import poll, POLLIN
 from time import time
+from micropython import const
+
+from Library_protocol import SYNC, COMMAND, frameDecoder, replyError
+
+#size of the ring holding typed commands (longer commands are dropped)
+RING_SIZE = const(512)
+
+#most bytes taken from the port in one read
+CHUNK_SIZE = const(64)
+NEWLINE = const(10)
+RETURN = const(13)
 
 #define communcation class
 class Communicate:
@@ -26,11 +37,64 @@ class Communicate:
         __lastExectued : float
             time when last executed
 
-        __message : string
-            communication message
+        __ring : bytearray
+            preallocated ring the typed command is collected in
+
+        __view : memoryview
+            view of the ring, to copy commands out without an extra slice
+
+        __start : int
+            index of the first byte of the command in the ring
+
+        __length : int
+            number of bytes of the command in the ring so far
+
+        __dropping : bool
+            whether the rest of a too-long command is being dropped
+
+        __stream : stream
+            the usb port (stdin)
+
+        __chunk : bytearray
+            buffer the waiting bytes are read into (so reading allocates
+            nothing)
+
+        __any : function or None
+            the port's any(), telling how many bytes are waiting, if it has
+            one; everything waiting is then taken in one read
+
+        __byte : bytearray
+            one-byte buffer for ports without any() (see __fill)
+
+        __poll : poll
+            poll object telling whether stdin has bytes waiting (for ports
+            without any())
+
+        __decoder : frameDecoder
+            collects binary frames (see Library_protocol.py)
+
+        overflows : int
+            number of typed commands dropped for being longer than the ring
+
+        invalid : int
+            number of messages dropped for not being valid utf-8
         '''
         self.__lastExecuted = time()
-        self.__message = ""
+        self.__ring = bytearray(RING_SIZE)
+        self.__view = memoryview(self.__ring)
+        self.__start = 0
+        self.__length = 0
+        self.__stream = stdin.buffer
+        self.__chunk = bytearray(CHUNK_SIZE)
+        self.__any = getattr(self.__stream, "any", None)
+        self.__byte = bytearray(1)
+        self.__dropping = False
+        self.__decoder = frameDecoder()
+        self.overflows = 0
+        self.invalid = 0
+
+        self.__poll = poll()
+        self.__poll.register(stdin, POLLIN)
 
 
     def read(self):
@@ -39,26 +103,23 @@ class Communicate:
 
         Returns
         -------
-        msg : float
-            The message to read
+        msg : list
+            The messages to read; typed commands as strings and binary
+            command frames as (id, string)
         '''
 
         #make empty list
         msg = []
-        
-        #get messages from read list
-        while stdin in select([stdin], [], [], 0)[0]:
-            char = stdin.read(1)
-            
-            #if new line, pull attribute to msg and reset attribute
-            if char == "\n":
-                if len(self.__message) > 0:
-                    msg.append(self.__message)
-                    self.__message = ""
-            
-            #or else store in attribute
-            else:
-                self.__message += char
+
+        chunk = self.__chunk
+        n = self.__fill()
+
+        #drain every byte that is waiting
+        while n > 0:
+            for i in range(n):
+                self.__feed(chunk[i], msg)
+
+            n = self.__fill()
         
         #store execution time
         self.__lastExecuted = time()
@@ -66,6 +127,113 @@ class Communicate:
         return msg
 
 
+    def __fill(self):
+        '''
+        Reads every waiting byte (up to CHUNK_SIZE) into the chunk buffer and
+        returns how many: in one read if the port can tell how many are
+        waiting, else a byte at a time for as long as poll says more are
+        waiting (the pico's usb stdin has no any(), and blocks until it has
+        as many bytes as were asked for)
+        '''
+        chunk = self.__chunk
+
+        if self.__any is not None:
+            n = min(self.__any(), CHUNK_SIZE)
+
+            if n == 0:
+                return 0
+
+            return self.__stream.readinto(chunk, n) or 0
+
+        byte = self.__byte
+        n = 0
+
+        while n < CHUNK_SIZE and self.__poll.poll(0):
+            if not self.__stream.readinto(byte, 1):
+                break
+
+            chunk[n] = byte[0]
+            n += 1
+
+        return n
+
+
+    def __feed(self, b, msg):
+        '''
+        Adds one byte to the frame or typed command being collected, adding
+        the message to msg once it is whole
+        '''
+
+        #binary frames start with SYNC (never part of a typed command)
+        if self.__decoder.busy() or (b == SYNC and self.__length == 0):
+            frame = self.__decoder.feed(b)
+
+            if frame is not None:
+                msgid, ftype, payload = frame
+
+                if ftype != COMMAND:
+                    replyError(msgid, "unknown frame type")
+                    return
+
+                #a bad command only loses itself, not the rest of the pass
+                try:
+                    msg.append((msgid, payload.decode()))
+
+                except UnicodeError:
+                    self.invalid += 1
+                    replyError(msgid, "command is not valid utf-8")
+
+            return
+
+        #if new line, copy the command out of the ring and start over
+        if b == NEWLINE:
+            if self.__length > 0 and not self.__dropping:
+                try:
+                    msg.append(self.__take())
+
+                except UnicodeError:
+                    self.invalid += 1
+
+            self.__dropping = False
+
+        #a command that does not fit could not be valid; drop the rest of
+        # it up to the next new line
+        elif self.__length == RING_SIZE or self.__dropping:
+            if not self.__dropping:
+                self.overflows += 1
+                self.__dropping = True
+
+            self.__start = (self.__start + self.__length) % RING_SIZE
+            self.__length = 0
+
+        #or else store in the ring
+        elif b != RETURN:
+            self.__ring[(self.__start + self.__length) % RING_SIZE] = b
+            self.__length += 1
+
+
+    def __take(self):
+        '''
+        Copies the command out of the ring and empties it
+        '''
+        start = self.__start
+        end = start + self.__length
+
+        #the command may wrap around the end of the ring
+        if end <= RING_SIZE:
+            line = bytes(self.__view[start:end])
+
+        else:
+            line = bytes(self.__view[start:]) + \
+                bytes(self.__view[:end - RING_SIZE])
+
+        #empty the ring before decoding, so a bad command is dropped whole
+        self.__start = end % RING_SIZE
+        self.__length = 0
+
+        return line.decode()
+
+
     def getLastExecution(self):
         '''
         Just return the time of last execution
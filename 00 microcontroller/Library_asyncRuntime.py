@@ -0,0 +1,200 @@
+# Library_asyncRuntime.py
+# 18. October 2026
+
+'''
+File to run the pi pico as a set of asyncio coroutines: one reading messages
+from the desktop, and one per physical bus executing the tasks for the devices
+on that bus. A slow modbus or I2C transaction then only holds up devices that
+share its bus.
+'''
+
+import asyncio
+
+from time import ticks_us, ticks_diff
+
+from Library_Communicate import myCom
+from Library_ComSet import deviceList, settings
+from Library_taskManager import myTM
+from Library_parser import parser, makeTable
+from Library_scheduler import myScheduler
+from Library_profiler import myProfiler
+
+class asyncRuntime:
+	'''
+	Class to run the asyncio firmware mode
+	'''
+	def __init__(self, devices, taskManager):
+		'''
+		Initialize the class instance
+
+		Attributes
+		----------
+		__devices : dict
+			Dict of connected devices
+
+		__tm : taskManager
+			Task manager holding the FIFO queue of each bus
+
+		__table : dict
+			Dispatch table of the devices (see Library_parser.py), built
+			once here rather than on the first message
+
+		__events : dict
+			asyncio.Event for each bus, set when tasks are waiting
+		'''
+
+		#set attributes
+		self.__devices = devices
+		self.__tm = taskManager
+		self.__table = makeTable(devices)
+		self.__events = {bus: asyncio.Event() for bus in taskManager.getBuses()}
+
+	#function to add tasks to their bus queues
+	def addTask(self, newTask):
+		'''
+		Adds tasks to the task manager and wakes the buses they went to
+
+		Parameters
+		----------
+		newTask : list
+			List of tasks from the parser
+		'''
+		self.__tm.addTask(newTask)
+
+		for task in newTask:
+			self.__events[self.__devices[task["Device"]]["Bus"]].set()
+
+	#function to execute a single task
+	async def doTask(self, task):
+		'''
+		Executes a task, using the async variant of the method if the driver
+		has one (so the bus coroutine yields while waiting on the device).
+		Otherwise the plain method is called holding the device's lock (if
+		it has one), so it waits its turn behind any async transaction that
+		a stream, snapshot or logger read has in progress on the same bus.
+
+		Parameters
+		----------
+		task : dict
+			Task from the parser
+		'''
+		device = self.__devices[task["Device"]]
+		bus = device["Bus"]
+		args, kwargs = task["Args"], task["Kwargs"]
+		lock = getattr(device["Instance"], "lock", None)
+
+		start = ticks_us()
+		myProfiler.watch()
+
+		#prefer the async variant
+		try:
+			if task["FnAsync"] is not None:
+				res = await task["FnAsync"](*args, **kwargs)
+
+			elif lock is None:
+				res = task["Fn"](*args, **kwargs)
+
+			else:
+				async with lock:
+					myProfiler.addWait(ticks_diff(ticks_us(), start))
+					res = task["Fn"](*args, **kwargs)
+
+		#every failed task gets an answer
+		except Exception as e:
+			self.__tm.countDone(bus, failed = True)
+			self.__tm.fail(task, e)
+			return
+
+		finally:
+			self.__tm.profile(task, start)
+
+		self.__tm.countDone(bus)
+
+		#echo any returned reading back to the desktop
+		self.__tm.done(task, res)
+
+	#coroutine to run tasks for one bus
+	async def runBus(self, bus):
+		'''
+		Executes the tasks of one bus in order, waiting when there are none
+
+		Parameters
+		----------
+		bus : str
+			Name of the bus
+		'''
+		event = self.__events[bus]
+
+		while True:
+			await event.wait()
+			event.clear()
+
+			task = self.__tm.popTask(bus)
+
+			while task is not None:
+
+				await self.doTask(task)
+
+				task = self.__tm.popTask(bus)
+
+	#coroutine to read messages
+	async def readComm(self, period):
+		'''
+		Reads and parses messages from the desktop
+
+		Parameters
+		----------
+		period : int
+			Time between reads, in ms
+		'''
+		while True:
+			message_list = myCom.read()
+			command_list = parser(
+				messageList = message_list,
+				deviceList = self.__devices,
+				table = self.__table
+				)
+
+			self.addTask(command_list)
+
+			await asyncio.sleep_ms(period)
+
+	#coroutine to run scheduler jobs (e.g. streaming)
+	async def runScheduler(self):
+		'''
+		Runs jobs registered with the scheduler as they come due
+		'''
+		while True:
+			myScheduler.runPending()
+
+			wait = myScheduler.timeToNext()
+
+			#nothing scheduled; check back in a while
+			if wait is None:
+				wait = 100
+
+			await asyncio.sleep_ms(wait)
+
+	#coroutine to start everything
+	async def main(self):
+		'''
+		Starts a coroutine for each bus and for the scheduler, and reads
+		messages forever
+		'''
+		for bus in self.__events:
+			asyncio.create_task(self.runBus(bus))
+
+		asyncio.create_task(self.runScheduler())
+
+		await self.readComm(int(settings["CommReadOutPeriod"] * 1000))
+
+	#function to run forever
+	def run(self):
+		'''
+		Runs the asyncio event loop
+		'''
+		asyncio.run(self.main())
+
+
+#make an instance of the class (to be imported in main.py)
+myRuntime = asyncRuntime(deviceList, myTM)
@@ -8,7 +8,7 @@ File to read and write to json files
 '''
 
 from json import dump as dump_js, load as load_js
-from os import mkdir
+from os import mkdir, remove, stat
 
 #function to read json file
 def read_file(file_name: str, path: str = ''):
@@ -105,3 +105,86 @@ def write_file(data: dict, file_name: str, path: str) -> None:
 
     return None
 
+#function to append to a binary file
+def append_binary(*data, file_name: str):
+    '''
+    Appends bytes to a binary file (made if it does not exist)
+
+    Parameters
+    ----------
+    data : bytes, bytearray or memoryview
+        One or more blocks of bytes to append, in order
+
+    file_name : str
+        Name of the file
+
+    Returns
+    -------
+    size : int or None
+        Size of the file after writing, or None if it could not be written
+    '''
+
+    #try to append the data
+    try:
+        with open(file_name, 'ab') as outfile:
+            for block in data:
+                outfile.write(block)
+
+        return stat(file_name)[6]
+
+    #print a message if it can't write
+    except OSError as err:
+        print("ERROR, '%s': Could not write data to '%s'. (OSError: %i)" %
+              (append_binary.__name__, file_name, err.errno))
+        return None
+
+#function to read part of a binary file
+def read_binary(file_name: str, offset: int, size: int) -> bytes:
+    '''
+    Reads part of a binary file
+
+    Parameters
+    ----------
+    file_name : str
+        Name of the file
+
+    offset : int
+        Byte to start reading at
+
+    size : int
+        Number of bytes to read
+
+    Returns
+    -------
+    data : bytes
+        The bytes read (fewer at the end of the file; empty if it could not
+        be read)
+    '''
+
+    #try to read the data
+    try:
+        with open(file_name, 'rb') as infile:
+            infile.seek(offset)
+            return infile.read(size)
+
+    #if data cannot be loaded, return nothing
+    except OSError as err:
+        print("ERROR, '%s': Could not load data from '%s'. (OSError: %i)" %
+              (read_binary.__name__, file_name, err.errno))
+        return b''
+
+#function to delete a file
+def remove_file(file_name: str) -> None:
+    '''
+    Deletes a file, if it exists
+
+    Parameters
+    ----------
+    file_name : str
+        Name of the file
+    '''
+    try:
+        remove(file_name)
+
+    except OSError:
+        pass
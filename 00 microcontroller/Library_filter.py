@@ -0,0 +1,219 @@
+# Library_filter.py
+# 18. October 2026
+
+'''
+File to make a ring buffer of samples with simple filters, so a driver can
+oversample an ADC in the background (as a scheduler job) and answer each
+desktop query with one filtered value instead of one noisy raw sample
+
+Filters, by name:
+
+	last		the newest sample
+	mean		boxcar mean of the buffer (or of the newest n samples)
+	median		median of the buffer (or of the newest n samples)
+	ema			exponential moving average, updated on every sample
+
+If the newest sample is older than maxAge (e.g. because the job sampling the
+ADC stopped running), the buffer counts as stale and get() returns None, so
+the driver reads the ADC directly instead.
+'''
+
+from array import array
+from time import ticks_ms, ticks_diff
+
+#filter names
+FILTERS = ("last", "mean", "median", "ema")
+
+#samples older than this many sample periods are stale (but never sooner
+# than STALE_MIN ms, so a slow job holding up the loop does not count)
+STALE_PERIODS = 4
+STALE_MIN = 250
+
+class ringFilter:
+	'''
+	Class to hold the newest samples of a channel in a fixed-size float array
+	'''
+	def __init__(self, size, alpha = 0.1, maxAge = None):
+		'''
+		Initialize the class instance
+
+		Attributes
+		----------
+		buf : array
+			The samples (float32), oldest overwritten first
+
+		size : int
+			Number of samples the buffer holds
+
+		alpha : float
+			Weight of each new sample in the exponential moving average
+
+		count : int
+			Number of samples in the buffer (up to size)
+
+		total : int
+			Number of samples ever added
+
+		ema : float or None
+			Exponential moving average (None until the first sample)
+
+		maxAge : int or None
+			Age (ms) past which the samples are stale (at least STALE_MIN);
+			None if they never are
+
+		time : int
+			ticks_ms of the newest sample
+
+		__next : int
+			Index the next sample goes to
+		'''
+
+		#set attributes
+		self.buf = array('f', bytes(4 * size))
+		self.size = size
+		self.alpha = alpha
+		self.count = 0
+		self.total = 0
+		self.ema = None
+		self.maxAge = None if maxAge is None else max(STALE_MIN, maxAge)
+		self.time = 0
+		self.__next = 0
+
+	#function to add a sample
+	def add(self, value):
+		'''
+		Adds a sample, overwriting the oldest one once the buffer is full
+
+		Parameters
+		----------
+		value : float
+			The sample
+		'''
+		self.buf[self.__next] = value
+		self.__next = (self.__next + 1) % self.size
+
+		if self.count < self.size:
+			self.count += 1
+
+		self.total += 1
+		self.time = ticks_ms()
+
+		if self.ema is None:
+			self.ema = value
+
+		else:
+			self.ema += self.alpha * (value - self.ema)
+
+	#function to clear the buffer
+	def clear(self):
+		'''
+		Drops all samples
+		'''
+		self.count = 0
+		self.ema = None
+		self.__next = 0
+
+	#function to get the newest samples
+	def newest(self, n = None):
+		'''
+		Gets the newest n samples (all of them if None), oldest first
+		'''
+		if n is None or n > self.count:
+			n = self.count
+
+		start = (self.__next - n) % self.size
+
+		if start + n <= self.size:
+			return self.buf[start:start + n]
+
+		return self.buf[start:] + self.buf[:start + n - self.size]
+
+	#function to get the newest sample
+	def last(self, n = None):
+		'''
+		Gets the newest sample
+		'''
+		return self.buf[(self.__next - 1) % self.size]
+
+	#function to get the boxcar mean
+	def mean(self, n = None):
+		'''
+		Gets the mean of the newest n samples (all of them if None)
+		'''
+		samples = self.newest(n)
+
+		return sum(samples) / len(samples)
+
+	#function to get the median
+	def median(self, n = None):
+		'''
+		Gets the median of the newest n samples (all of them if None)
+		'''
+		samples = sorted(self.newest(n))
+		i = len(samples) // 2
+
+		if len(samples) % 2:
+			return samples[i]
+
+		return (samples[i - 1] + samples[i]) / 2
+
+	#function to tell whether the samples are recent
+	def fresh(self):
+		'''
+		Tells whether there are samples and the newest is within maxAge
+		'''
+		if self.count == 0:
+			return False
+
+		return self.maxAge is None or \
+			ticks_diff(ticks_ms(), self.time) <= self.maxAge
+
+	#function to get a filtered value by name
+	def get(self, how = "mean"):
+		'''
+		Gets a filtered value
+
+		Parameters
+		----------
+		how : str
+			Filter name ("last", "mean", "median" or "ema"), optionally
+			followed by the number of newest samples to use, e.g. "mean 10"
+
+		Returns
+		-------
+		value : float or None
+			The filtered value; None if there are no samples yet or they are
+			stale
+
+		Raises
+		------
+		ValueError
+			If the filter is unknown or the number of samples is not a whole
+			number of at least 1
+		'''
+		how = how.split()
+		n = None
+
+		if how[0] not in FILTERS:
+			raise ValueError('Unknown filter: %s. Must be one of %s' % (
+				how[0], ", ".join(FILTERS)
+				))
+
+		if len(how) > 1:
+			try:
+				n = int(how[1])
+
+			except ValueError:
+				n = 0
+
+			if n < 1:
+				raise ValueError('Number of samples must be at least 1, not %s' \
+					% how[1])
+
+		if not self.fresh():
+			return None
+
+		if how[0] == "ema":
+			return self.ema
+
+		return getattr(self, how[0])(n)
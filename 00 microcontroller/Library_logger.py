@@ -0,0 +1,435 @@
+# Library_logger.py
+# 18. October 2026
+
+'''
+File to make a logger class, which records timestamped readings of a set of
+channels into preallocated ring buffers in RAM, so high-rate data is kept even
+while the desktop is busy or disconnected, and streams them to the desktop in
+bulk on request
+
+Each record is a sequence number, a ticks_ms timestamp and one float32 per
+column (nan for a value that could not be read). A channel is one column, or
+one column per element if it reads as a list (e.g. "pidWT1 getMV" is logged as
+"pidWT1 getMV[0]" and "pidWT1 getMV[1]"); the columns are fixed when the
+channels are set, by reading each channel once. A dump is sent as
+
+	$G,<column 1>,<column 2>,...				(header)
+	$L,<sequence>,<ticks_ms>,<value 1>,<value 2>,...	(one per record)
+	$E,<next sequence>						(end; pass it as "since" next time)
+
+The header is $G rather than the stream's $H, so a dump does not change the
+columns of a live stream on the desktop.
+
+Optionally, every quarter of the buffer is also appended to a binary file on
+flash, in chunks of
+
+	<first sequence (uint32)> <records (uint16)> <columns (uint16)>
+	<ticks_ms (uint32) per record> <values (float32) per record and column>
+
+all little endian.
+'''
+
+import asyncio
+import struct
+
+from array import array
+from json import dumps
+from time import ticks_ms
+
+from Library_scheduler import myScheduler
+from Library_snapshot import Snapshot
+from Library_file import append_binary, read_binary, remove_file
+
+#header of each chunk in the flash file
+_CHUNK_HEADER = "<IHH"
+
+#value stored for a reading that is missing or not a number
+_NAN = float("nan")
+
+#function to convert one reading to a float
+def _number(v):
+	try:
+		return float(v)
+
+	except (TypeError, ValueError):
+		return _NAN
+
+class Logger:
+	'''
+	Class to record readings of a set of channels into a RAM ring buffer
+	'''
+
+	#argument types of the public methods (checked by the parser)
+	_signatures = {
+		"start": (("period", float, None),),
+		"setChannels": (("channels", str),),
+		"dump": (("since", int, None),),
+		}
+
+	def __init__(self, devices, channels, period, size, file = None,
+		useAsync = False):
+		'''
+		Initialize the class instance
+
+		Attributes
+		----------
+		channels : list
+			Channels to record, as "device method" strings (from
+			"logChannels" in Library_settings.json)
+
+		period : float
+			Time between records, in seconds (from "loggerPeriod" in
+			Library_settings.json)
+
+		size : int
+			Number of records the ring buffer holds (from "logSize" in
+			Library_settings.json; rounded up to a multiple of 4)
+
+		file : str or None
+			Flash file to append each quarter of the buffer to (from
+			"logFile" in Library_settings.json); None to keep the log in RAM
+			only
+
+		useAsync : bool
+			Whether to record in an asyncio task (asyncio runtime)
+
+		__snapshot : Snapshot
+			Reads the channels (held rather than inherited, so its commands
+			are not the logger's)
+
+		columns : list
+			Name of each column; a channel that reads as a list has one
+			column per element
+
+		widths : list
+			Number of columns of each channel
+
+		width : int
+			Number of columns (floats per record)
+
+		times : array
+			ticks_ms of each record
+
+		data : array
+			float32 values, one row of width per record
+
+		seq : int
+			Sequence number of the next record (records ever taken)
+
+		running : bool
+			Whether the logger is on
+
+		skipped : int
+			Records skipped because the one before had not finished
+
+		spilled : int
+			Bytes written to the flash file since it was last cleared
+		'''
+
+		#set attributes
+		self.__snapshot = Snapshot(devices, channels)
+		self.period = period
+		self.file = file
+		self.useAsync = useAsync
+		self.running = False
+		self.seq = 0
+		self.skipped = 0
+		self.spilled = 0
+
+		#preallocate the buffers (in whole chunks, so no chunk wraps around)
+		self.chunk = max(1, (size + 3) // 4)
+		self.size = 4 * self.chunk
+		self.__configure(channels, self.__snapshot._readValues(channels))
+
+		#whether an async record is still in progress
+		self.__recording = False
+
+	#function to set the channels and their columns
+	def __configure(self, channels, values):
+		'''
+		Sets the channels and their columns from one reading of each (a
+		channel that could not be read is taken as one column), and makes
+		empty buffers for them
+
+		Raises
+		------
+		ValueError
+			If a channel reads as something other than a number or a list
+		'''
+		columns = []
+		widths = []
+
+		for channel, v in zip(channels, values):
+			if isinstance(v, (list, tuple)):
+				columns.extend("%s[%d]" % (channel, k) for k in range(len(v)))
+				widths.append(len(v))
+
+			elif v is None or isinstance(v, (int, float)):
+				columns.append(channel)
+				widths.append(1)
+
+			else:
+				raise ValueError("not a number: %s" % channel)
+
+		self.channels = channels
+		self.columns = columns
+		self.widths = widths
+		self.width = len(columns)
+		self.__allocate()
+
+	#function to make the buffers
+	def __allocate(self):
+		'''
+		Makes empty buffers for the current size and columns
+		'''
+		self.times = array('I', bytes(4 * self.size))
+		self.data = array('f', bytes(4 * self.size * self.width))
+		self.seq = 0
+
+	#function to start logging
+	def start(self, period = None):
+		'''
+		Starts logging, one record per period
+
+		Parameters
+		----------
+		period : str or None
+			Time between records, in seconds; defaults to the current period
+		'''
+		if period is not None:
+			self.period = float(period)
+
+		myScheduler.every(int(self.period * 1000), self._record, name = "logger")
+		self.running = True
+
+		return "logger started"
+
+	#function to stop logging
+	def stop(self):
+		'''
+		Stops logging (the buffer is kept)
+		'''
+		myScheduler.cancel("logger")
+		self.running = False
+
+		return "logger stopped"
+
+	#function to clear the log
+	def clear(self):
+		'''
+		Drops all records, in RAM and on flash
+		'''
+		self.__allocate()
+
+		if self.file is not None:
+			remove_file(self.file)
+			self.spilled = 0
+
+		return "logger cleared"
+
+	#function to set the channels
+	def setChannels(self, channels):
+		'''
+		Sets the channels to record, reading each once to find its columns;
+		clears the buffer, since its rows change length
+
+		Parameters
+		----------
+		channels : str
+			Comma-separated "device method" pairs
+		'''
+		channels = self.__snapshot._channels(channels)
+		self.__configure(channels, self.__snapshot._readValues(channels))
+
+		return "logger columns: %d" % self.width
+
+	#async variant of setChannels
+	async def setChannelsAsync(self, channels):
+		'''
+		Async variant of setChannels (used by the asyncio runtime)
+		'''
+		channels = self.__snapshot._channels(channels)
+		self.__configure(
+			channels,
+			await self.__snapshot._readValuesAsync(channels)
+			)
+
+		return "logger columns: %d" % self.width
+
+	#function to get the state of the logger
+	def status(self):
+		'''
+		Gets the state of the logger
+
+		Returns
+		-------
+		status : str
+			Json of whether it is running, the next sequence number, the
+			oldest sequence number still in RAM, the buffer size, the records
+			skipped and the bytes spilled to flash
+		'''
+		return dumps({
+			"running": self.running,
+			"seq": self.seq,
+			"oldest": max(0, self.seq - self.size),
+			"size": self.size,
+			"skipped": self.skipped,
+			"spilled": self.spilled,
+			})
+
+	#function to take one record
+	def _record(self):
+		'''
+		Reads each channel and stores one record (run by the scheduler)
+		'''
+
+		#in the asyncio runtime, record in a task (one at a time)
+		if self.useAsync:
+			if self.__recording:
+				self.skipped += 1
+
+			else:
+				self.__recording = True
+				asyncio.create_task(self._recordAsync())
+
+			return
+
+		t = ticks_ms()
+		self._store(t, self.__snapshot._readValues(self.channels))
+
+	#async variant of _record
+	async def _recordAsync(self):
+		'''
+		Async variant of _record (used by the asyncio runtime)
+		'''
+		t = ticks_ms()
+
+		try:
+			self._store(
+				t,
+				await self.__snapshot._readValuesAsync(self.channels)
+				)
+
+		finally:
+			self.__recording = False
+
+	#function to store one record
+	def _store(self, t, values):
+		'''
+		Stores one record and spills the last chunk to flash once it is full
+		'''
+		i = self.seq % self.size
+		k = i * self.width
+
+		self.times[i] = t
+
+		#a list-valued channel fills its columns; a reading of the wrong
+		#shape is stored as nan rather than shifting the other columns
+		for v, w in zip(values, self.widths):
+			if w == 1:
+				v = (v,)
+
+			elif not isinstance(v, (list, tuple)) or len(v) != w:
+				v = (None,) * w
+
+			for x in v:
+				self.data[k] = _number(x)
+				k += 1
+
+		self.seq += 1
+
+		if self.file is not None and self.seq % self.chunk == 0:
+			self._spill(self.seq - self.chunk)
+
+	#function to append a chunk to the flash file
+	def _spill(self, first):
+		'''
+		Appends the chunk of records starting at sequence number first to the
+		flash file
+		'''
+		i = first % self.size
+		n = self.width
+
+		size = append_binary(
+			struct.pack(_CHUNK_HEADER, first, self.chunk, n),
+			memoryview(self.times)[i:i + self.chunk],
+			memoryview(self.data)[i * n:(i + self.chunk) * n],
+			file_name = self.file
+			)
+
+		if size is not None:
+			self.spilled = size
+
+	#function to print the header line
+	def _header(self):
+		print("$G," + ",".join(self.columns))
+
+	#function to print one record
+	def _line(self, seq, t, row):
+		print("$L,%d,%d,%s" % (
+			seq,
+			t,
+			",".join("" if v != v else "%.7g" % v for v in row)
+			))
+
+	#function to send the buffer to the desktop
+	def dump(self, since = None):
+		'''
+		Prints every record still in RAM, oldest first
+
+		Parameters
+		----------
+		since : str or None
+			Only print records from this sequence number on (e.g. the one
+			from the end line of the last dump)
+		'''
+		n = self.width
+		end = self.seq
+		first = max(0, end - self.size)
+
+		if since is not None:
+			first = max(first, int(since))
+
+		self._header()
+
+		for seq in range(first, end):
+			i = seq % self.size
+			self._line(seq, self.times[i], self.data[i * n:(i + 1) * n])
+
+		print("$E,%d" % end)
+
+	#function to send the flash file to the desktop
+	def dumpFile(self):
+		'''
+		Prints every record in the flash file, oldest first
+		'''
+		if self.file is None:
+			return "no log file"
+
+		head = struct.calcsize(_CHUNK_HEADER)
+		offset = 0
+		last = 0
+
+		self._header()
+
+		while True:
+			chunk = read_binary(self.file, offset, head)
+
+			if not chunk or len(chunk) < head:
+				break
+
+			first, count, n = struct.unpack(_CHUNK_HEADER, chunk)
+			offset += head
+
+			times = array('I', read_binary(self.file, offset, 4 * count))
+			offset += 4 * count
+
+			data = array('f', read_binary(self.file, offset, 4 * count * n))
+			offset += 4 * count * n
+
+			for k in range(count):
+				self._line(first + k, times[k], data[k * n:(k + 1) * n])
+
+			last = first + count
+
+		print("$E,%d" % last)
@@ -5,20 +5,350 @@
 
 '''
 File to parse a bunch of tasks and messages
+
+A command is "<device> <method> <arguments>". Drivers declare the arguments
+of their methods in a _signatures class attribute, e.g.
+
+	_signatures = {
+		"setFlow": (("flow", float),),
+		"getVoltage": (("pin", int, 0),),
+		}
+
+where each argument is (name, type) or, if it can be left out, (name, type,
+default). Arguments are then coerced to their types here, once, and can be
+given by position or as name=value; if there are more words than arguments
+and the last argument is a str, it takes the rest of the line. Methods
+without a signature get the rest of the line as a single string, as before.
+
+Several commands can go on one line, separated by ";". The commands of a
+tagged line (@<id>) or binary frame are answered together, as one reply with
+a line per command (see batchReply in Library_protocol.py).
 '''
 
+from json import dumps
+from time import ticks_us, ticks_diff
+
+from Library_protocol import say, batchReply, ERROR
+from Library_taskManager import myTM
+from Library_profiler import myProfiler
+from Library_scheduler import myScheduler
+
+#function to build the dispatch table
+def makeTable(deviceList):
+	'''
+	Builds the dispatch table: for each device, the bound method (and its
+	async variant, if any) of every public method, so a command is found with
+	one dict lookup instead of walking dir() for every message; built once
+	at start-up, after the device list is complete, and passed to parser
+
+	Parameters
+	----------
+	deviceList : dict
+		Dict of connected devices
+
+	Returns
+	-------
+	table : dict
+		{device: {method: (method, async variant or None, signature or None)}}
+	'''
+	table = {}
+
+	for device, entry in deviceList.items():
+		obj = entry["Instance"]
+		signatures = getattr(obj, "_signatures", {})
+		methods = {}
+
+		#ignore private attributes and the async variants that the asyncio
+		# runtime calls in place of the plain method
+		for attribute in dir(obj):
+			if attribute.startswith('_') or attribute.endswith('Async'):
+				continue
+
+			fn = getattr(obj, attribute)
+
+			if callable(fn):
+				methods[attribute] = (
+					fn,
+					getattr(obj, attribute + 'Async', None),
+					signatures.get(attribute),
+					)
+
+		table[device] = methods
+
+	return table
+
+#function to make a value the type of an argument
+def coerce(value, kind):
+	'''
+	Converts a word to the type of an argument
+
+	Raises
+	------
+	ValueError
+		If the word is not a valid value of that type
+	'''
+	if kind is bool:
+		if value.lower() in ("1", "true", "on"):
+			return True
+
+		if value.lower() in ("0", "false", "off"):
+			return False
+
+		raise ValueError(value)
+
+	return kind(value)
+
+#function to parse the arguments of a command
+def parseArgs(text, signature):
+	'''
+	Parses the arguments of a command against the signature of its method
+
+	Parameters
+	----------
+	text : str or None
+		Everything after the method name
+
+	signature : tuple or None
+		(name, type) or (name, type, default) for each argument; None to pass
+		the text on as it is
+
+	Returns
+	-------
+	args : tuple
+		Positional arguments, as their types
+
+	kwargs : dict
+		Keyword arguments, as their types
+
+	Raises
+	------
+	ValueError
+		If an argument is missing, unknown or not of its type
+	'''
+
+	#no signature: the rest of the line as one string
+	if signature is None:
+		return ((text,) if text else ()), {}
+
+	names = [arg[0] for arg in signature]
+	words = []
+	named = {}
+
+	#split into positional and name=value arguments
+	for word in (text.split() if text else ()):
+		key, eq, value = word.partition("=")
+
+		if eq and key in names:
+			named[key] = value
+
+		else:
+			words.append(word)
+
+	#a last str argument takes the rest of the line
+	if len(words) > len(signature):
+		if signature[-1][1] is not str or names[-1] in named:
+			raise ValueError('too many arguments (takes %d)' % len(signature))
+
+		words[len(signature) - 1:] = [" ".join(words[len(signature) - 1:])]
+
+	args = []
+	kwargs = {}
+
+	for i, arg in enumerate(signature):
+		name, kind = arg[0], arg[1]
+
+		if i < len(words):
+			if name in named:
+				raise ValueError(f'{name} given twice')
+
+			value = words[i]
+
+		elif name in named:
+			value = named[name]
+
+		elif len(arg) > 2:
+			continue
+
+		else:
+			raise ValueError(f'missing argument {name}')
+
+		#coerce the value
+		try:
+			value = coerce(value, kind)
+
+		except ValueError:
+			raise ValueError(f'{name} must be {kind.__name__}, not {value}')
+
+		if i < len(words):
+			args.append(value)
+
+		else:
+			kwargs[name] = value
+
+	return tuple(args), kwargs
+
+#function to describe a method for help
+def describe(method, signature):
+	'''
+	Describes a method and its arguments, e.g. "getVoltage [pin:int=0]"
+	'''
+	if signature is None:
+		return method
+
+	return " ".join([method] + [
+		f'{arg[0]}:{arg[1].__name__}' if len(arg) == 2 else
+		f'[{arg[0]}:{arg[1].__name__}={arg[2]}]'
+		for arg in signature
+		])
+
+#function to parse a single command
+def parseCommand(message, msgid, deviceList, table):
+	'''
+	Parses a single command, answering the built-in ones straight away
+
+	Parameters
+	----------
+	message : str
+		The command
+
+	msgid : int, str, tuple or None
+		Id to answer with (see Library_protocol.py)
+
+	deviceList : dict
+		Dict of connected devices
+
+	table : dict
+		Dispatch table (see makeTable)
+
+	Returns
+	-------
+	com : dict or None
+		The task to queue, if any
+	'''
+
+	#commands are space delimited; needs to split
+	commands = message.split(" ", 2)
+
+	#print help if needed (message below)
+	if commands[0] == "help":
+		say(msgid, helpmessage)
+
+	#answer a ping (lets the desktop check for tagged replies)
+	elif commands[0] == "ping":
+		say(msgid, "pong")
+
+	#report the task queue metrics (or reset them)
+	elif commands[0] == "queue":
+		if len(commands) > 1 and commands[1] == "reset":
+			myTM.resetStats()
+			say(msgid, "queue stats reset")
+
+		else:
+			say(msgid, dumps(myTM.getStats()))
+
+	#report the accounting of each scheduled job (or reset it)
+	elif commands[0] == "jobs":
+		if len(commands) > 1 and commands[1] == "reset":
+			myScheduler.resetStats()
+			say(msgid, "job stats reset")
+
+		else:
+			say(msgid, dumps(myScheduler.getStats()))
+
+	#report the latency of each device/method and job (or reset them)
+	elif commands[0] == "stats":
+		if len(commands) > 1 and commands[1] == "reset":
+			myProfiler.reset()
+			say(msgid, "stats reset")
+
+		else:
+			say(msgid, myProfiler.table())
+
+	#print device list if needed (message below)
+	elif commands[0] == "deviceList":
+
+		#lists each device name
+		say(msgid, deviceListmessage + "\n".join(
+			f"-\t{device}" for device in deviceList.keys()
+			))
+
+	#otherwise, find the right device for the command
+	elif commands[0] in table:
+
+		#get the methods of that device
+		methods = table[commands[0]]
+		
+		#print list of possible commands for this particular device
+		if len(commands) < 2 or commands[1] == "help":
+			
+			#list each method with its arguments
+			say(msgid, f'\nList of methods of {commands[0]}:\n' + 
+				"\n".join(
+					f"-\t{describe(method, methods[method][2])}"
+					for method in sorted(methods)
+					))
+
+		#execute command if it's in the class instance attribute list
+		elif commands[1] in methods:
+
+			fn, fnAsync, signature = methods[commands[1]]
+
+			#get the arguments, as their types
+			try:
+				args, kwargs = parseArgs(
+					commands[2] if len(commands) == 3 else None,
+					signature
+					)
+
+			except ValueError as e:
+				say(msgid, f'ERROR: {commands[0]} {commands[1]}: {e}', ERROR)
+				return None
+
+			#make the task, with the methods to call (and when it was made, to
+			# time how long it waits in its bus queue)
+			com = {
+				"Device": commands[0],
+				"Method": commands[1],
+				"Fn": fn,
+				"FnAsync": fnAsync,
+				"Args": args,
+				"Kwargs": kwargs,
+				"T": ticks_us(),
+				}
+
+			#and the frame id to reply to
+			if msgid is not None: com["Id"] = msgid
+			
+			return com
+
+		#if device is correct, but method is wrong, print error:
+		else:
+			say(msgid, f'ERROR: Unknown method {commands[1]}. Type "{commands[0]}' \
+				' help" for more information.', ERROR)
+	
+	#finally if device is unknown, print error
+	else:
+		say(msgid, f'ERROR: Unknown device {commands[0]}. ' \
+			' Type "help" for more information.', ERROR)
+
+	return None
+
 #parser function
-def parser(messageList, deviceList):
+def parser(messageList, deviceList, table):
 	'''
 	Function to parse messages and pass them to connected devices
 
 	Parameters
 	----------
 	messageList : list
-		List of possible messages to send
+		List of possible messages to send; typed commands as strings and
+		binary command frames as (id, string)
 
 	deviceList : list
 		List of connected devices
+
+	table : dict
+		Dispatch table of deviceList (see makeTable)
 	'''
 
 	#start with empty list
@@ -26,64 +356,36 @@ def parser(messageList, deviceList):
 
 	#loop through each message
 	for message in messageList:
+		start = ticks_us()
 
-		#commands are space delimited; needs to split
-		commands = message.split(" ", 2)
+		#binary frames carry an id that every reply has to go back with
+		msgid = None
 
-		#print help if needed (message below)
-		if commands[0] == "help":
-			print(helpmessage)
+		if isinstance(message, tuple):
+			msgid, message = message
 
-		#print device list if needed (message below)
-		elif commands[0] == "deviceList":
-			print(deviceListmessage)
+		#and so do tagged typed commands (@<id> command)
+		elif message.startswith("@"):
+			msgid, _, message = message[1:].partition(" ")
 
-			#loops through and prints each device name
-			for device in deviceList.keys():
-				print(f"-\t{device}")
+		#several commands can share a line
+		commands = [c.strip() for c in message.split(";") if c.strip()]
 
-		#otherwise, find the right device for the command
-		elif commands[0] in deviceList.keys():
+		#the commands of a tagged line or frame are answered together
+		batch = None
 
-			#get the intsance of that device
-			obj = deviceList[commands[0]]["Instance"]
+		if msgid is not None and len(commands) > 1:
+			batch = batchReply(msgid, len(commands))
 
-			#get a list of attributes of that class instance
-			# (ignoring doubleunder attributes)
-			methods = [attribute for attribute in dir(obj)
-					   if callable(getattr(obj, attribute))
-					   and attribute.startswith('__') is False
-					   ]
-			
-			#print list of possible commands for this particular device
-			if len(commands) < 2 or commands[1] == "help":
-				
-				print(f'\nList of methods of {commands[0]}:')
-				
-				#loop through each method and print
-				for method in methods:
-					print(f"-\t{method}")
-
-			#execute command if it's in the class instance attribute list
-			elif commands[1] in methods:
-
-				#add to command list
-				com = {"Device": commands[0], "Method": commands[1]}
-
-				#including kwargs if needed
-				if len(commands) == 3: com["kwargs"] = commands[2]
-				
+		for i, command in enumerate(commands):
+			tag = msgid if batch is None else (batch, i)
+
+			com = parseCommand(command, tag, deviceList, table)
+
+			if com is not None:
 				commandlist.append(com)
 
-			#if device is correct, but method is wrong, print error:
-			else:
-				print(f'ERROR: Unknown method {commands[1]}. Type "{commands[0]}' \
-					' help" for more information.')
-		
-		#finally if device is unknown, print error
-		else:
-			print(f'ERROR: Unknown device {commands[0]}. ' \
-				' Type "help" for more information.')
+		myProfiler.record("parse", ticks_diff(ticks_us(), start))
 
 	return commandlist
 
@@ -92,12 +394,28 @@ helpmessage = ('Welcome to the vacuum line double-trap software!\n'
 			   '1. List of commands\n' 
 			   '\t- help (gives this documentation)\n'
 			   '\t- deviceList (lists all the devices)\n'
+			   '\t- ping (answers pong)\n'
+			   '\t- queue (task queue metrics; "queue reset" resets them)\n'
+			   '\t- stats (latency of each command and job; "stats reset")\n'
+			   '\t- jobs (runs, overruns and errors of each scheduled job;'
+			   ' "jobs reset")\n'
 			   # '\t- TaskManager\n'
 			   '\t- device (gives method parameters for device)\n\n'
 			   '2. Examples\n'
 			   '2.1 \tTurn on the onboard LED (simple "hello world" test)\n'
 			   '\tonboardLED on\n'
-			   '\tThis turns on the onboard LED on the Raspberry Pi Pico.'
+			   '\tThis turns on the onboard LED on the Raspberry Pi Pico.\n'
+			   '2.2 \tTag a command to get a tagged reply\n'
+			   '\t@7 pidWT1 getTemp\n'
+			   '\tThis answers "@7 <temperature>".\n'
+			   '2.3 \tGive arguments by position or by name\n'
+			   '\tmfcHeIn setFlow 20\n'
+			   '\tmfcHeIn setFlow flow=20\n'
+			   '\tType "<device> help" to see the arguments of each method.\n'
+			   '2.4 \tSend several commands at once\n'
+			   '\tmfcHeIn setFlow 20; valveHeIn open\n'
+			   '\tA tagged line is answered with one line per command:\n'
+			   '\t"@7+ <first reply>", ..., "@7 <last reply>".'
 			   )
 
 deviceListmessage = ('\nList of active devices.\n'
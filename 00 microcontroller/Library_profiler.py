@@ -0,0 +1,300 @@
+# Library_profiler.py
+# 18. October 2026
+
+'''
+File to make a lightweight profiler, which times the hot paths of the firmware
+with ticks_us: parsing each message, every device/method call (how long it
+waited in its bus queue first, and how much of its run was spent waiting on
+the bus) and every scheduler job. Each name gets fixed counters and a
+histogram of power-of-two bins, so recording never allocates once a name has
+been seen.
+
+The "stats" command prints a table like
+
+	name            count  mean   min    max    p95    queued maxQueued busWait maxBusWait load
+	pidWT1 getTemp  120    30102  29871  31920  31920  8812   40211     27504   29980      7.2%
+
+with times in us; p95 is the upper edge of the histogram bin it falls in
+(capped at max), queued is the time from when a device/method call was
+queued until it started, busWait is the part of its run spent waiting on
+the bus: for the bus lock (while another transaction has it), for the
+inter-frame gap and for the device to reply (or, for the ADC, to convert),
+and load is the share of the time since the last reset spent in that name.
+A job's time includes whatever it runs ("job tasks" runs the queued
+commands). "stats reset" starts over.
+
+Bus drivers report their waits with addWait; they are added up for the call
+in progress (watch/waited), one per asyncio task, so reads of the same bus
+by a stream or logger task are not counted against a command.
+'''
+
+import asyncio
+
+from array import array
+from time import ticks_ms, ticks_diff
+
+#number of histogram bins; bin i holds times from 2**i to 2**(i + 1) us
+BINS = 24
+
+#most names to keep counters for (the rest are counted as "other")
+MAX_NAMES = 48
+
+#field offsets in each name's counters
+_COUNT = 0
+_TOTAL = 1
+_MIN = 2
+_MAX = 3
+_QUEUED = 4
+_MAX_QUEUED = 5
+_BUS = 6
+_MAX_BUS = 7
+_FIELDS = 8
+
+#function to get the asyncio task running (None outside the event loop)
+def _current():
+	try:
+		return asyncio.current_task()
+
+	except (RuntimeError, ValueError):
+		return None
+
+#define profiler class
+class profiler:
+	'''
+	Class to hold per-name latency counters and histograms
+	'''
+	def __init__(self, enabled = True):
+		'''
+		Initialize the class instance
+
+		Attributes
+		----------
+		enabled : bool
+			Whether to record anything (from "profiling" in
+			Library_settings.json)
+
+		__counters : dict
+			List of count, total, min, max, total and max queue time and
+			total and max bus wait (us) for each name (a list, since totals
+			outgrow 32 bits)
+
+		__hists : dict
+			array of BINS histogram counts for each name
+
+		__since : int
+			ticks_ms when the counters were last reset
+
+		__waits : dict
+			Bus wait (us) so far of the call in progress, by asyncio task
+			(None outside the event loop); only calls being watched are in
+			it
+		'''
+
+		#set attributes
+		self.enabled = enabled
+		self.__counters = {}
+		self.__hists = {}
+		self.__since = ticks_ms()
+		self.__waits = {}
+
+	#function to get the counters of a name
+	def __slot(self, name):
+		'''
+		Gets the counters and histogram of a name, making them the first time
+		'''
+		try:
+			return self.__counters[name], self.__hists[name]
+
+		except KeyError:
+			pass
+
+		if len(self.__counters) >= MAX_NAMES:
+			name = "other"
+
+			if name in self.__counters:
+				return self.__counters[name], self.__hists[name]
+
+		counters = [0] * _FIELDS
+		counters[_MIN] = 0x3FFFFFFF
+
+		self.__counters[name] = counters
+		self.__hists[name] = array('I', bytes(4 * BINS))
+
+		return counters, self.__hists[name]
+
+	#function to record one timing
+	def record(self, name, us, queued = 0, busWait = 0):
+		'''
+		Records one timing
+
+		Parameters
+		----------
+		name : str
+			What was timed, e.g. "pidWT1 getTemp"
+
+		us : int
+			How long it took, in us
+
+		queued : int
+			How long it sat in its bus queue before starting, in us
+
+		busWait : int
+			How much of us was spent waiting on the bus, in us
+		'''
+		if not self.enabled:
+			return
+
+		counters, hist = self.__slot(name)
+
+		counters[_COUNT] += 1
+		counters[_TOTAL] += us
+		counters[_QUEUED] += queued
+		counters[_BUS] += busWait
+
+		if us < counters[_MIN]:
+			counters[_MIN] = us
+
+		if us > counters[_MAX]:
+			counters[_MAX] = us
+
+		if queued > counters[_MAX_QUEUED]:
+			counters[_MAX_QUEUED] = queued
+
+		if busWait > counters[_MAX_BUS]:
+			counters[_MAX_BUS] = busWait
+
+		#find the power-of-two bin
+		i = 0
+
+		while us >> (i + 1) and i < BINS - 1:
+			i += 1
+
+		hist[i] += 1
+
+	#function to start adding up the bus waits of a call
+	def watch(self):
+		'''
+		Starts adding up the bus waits of the call the current asyncio task
+		(or, outside the event loop, the firmware) is about to make
+		'''
+		if self.enabled:
+			self.__waits[_current()] = 0
+
+	#function to add a bus wait to the call in progress
+	def addWait(self, us):
+		'''
+		Adds time spent waiting on a bus (for its lock, the inter-frame gap or
+		a reply) to the call being watched, if any
+
+		Parameters
+		----------
+		us : int
+			Time waited, in us
+		'''
+		key = _current()
+
+		if key in self.__waits:
+			self.__waits[key] += us
+
+	#function to get the bus waits of a call
+	def waited(self):
+		'''
+		Stops watching the call of the current asyncio task and gets its bus
+		waits, in us (0 if it was not watched)
+		'''
+		return self.__waits.pop(_current(), 0)
+
+	#function to get the 95th percentile of a name
+	def p95(self, name):
+		'''
+		Gets the upper edge of the histogram bin holding the 95th percentile,
+		capped at the longest time recorded
+		'''
+		counters, hist = self.__counters[name], self.__hists[name]
+		target = (counters[_COUNT] * 95 + 99) // 100
+		seen = 0
+
+		for i in range(BINS):
+			seen += hist[i]
+
+			if seen >= target:
+				return min(1 << (i + 1), counters[_MAX])
+
+		return counters[_MAX]
+
+	#function to get the counters as a dict
+	def getStats(self):
+		'''
+		Gets the counters of each name
+
+		Returns
+		-------
+		stats : dict
+			For each name: count, mean, min, max, p95, mean and max queue
+			time, mean and max bus wait (us) and load (share of the time since the last reset); plus the
+			ms that covers
+		'''
+		ms = max(1, ticks_diff(ticks_ms(), self.__since))
+		stats = {"ms": ms}
+
+		for name, c in self.__counters.items():
+			n = max(1, c[_COUNT])
+
+			stats[name] = {
+				"count": c[_COUNT],
+				"mean": c[_TOTAL] // n,
+				"min": c[_MIN] if c[_COUNT] else 0,
+				"max": c[_MAX],
+				"p95": self.p95(name),
+				"queued": c[_QUEUED] // n,
+				"maxQueued": c[_MAX_QUEUED],
+				"busWait": c[_BUS] // n,
+				"maxBusWait": c[_MAX_BUS],
+				"load": c[_TOTAL] / (ms * 10),
+				}
+
+		return stats
+
+	#function to print the counters as a table
+	def table(self):
+		'''
+		Makes a table of the counters, busiest name first
+		'''
+		stats = self.getStats()
+		ms = stats.pop("ms")
+		names = sorted(stats, key = lambda name: -stats[name]["load"])
+		width = max([len(name) for name in names] + [4])
+		pad = "%-" + str(width) + "s"
+
+		lines = [(pad + "  %6s %8s %8s %8s %8s %8s %9s %8s %10s %6s") % (
+			"name",
+			"count", "mean", "min", "max", "p95", "queued", "maxQueued",
+			"busWait", "maxBusWait", "load"
+			)]
+
+		for name in names:
+			s = stats[name]
+
+			lines.append((pad + "  %6d %8d %8d %8d %8d %8d %9d %8d %10d %5.1f%%") % (
+				name,
+				s["count"], s["mean"], s["min"], s["max"], s["p95"],
+				s["queued"], s["maxQueued"], s["busWait"], s["maxBusWait"],
+				s["load"]
+				))
+
+		lines.append("(times in us over the last %d ms)" % ms)
+
+		return "\n".join(lines)
+
+	#function to reset the counters
+	def reset(self):
+		'''
+		Drops all counters
+		'''
+		self.__counters = {}
+		self.__hists = {}
+		self.__since = ticks_ms()
+
+
+#make an instance of the class
+myProfiler = profiler()
@@ -0,0 +1,358 @@
+# Library_protocol.py
+# 18. October 2026
+
+'''
+File to make the binary framed protocol, which runs alongside the text
+commands. Every frame (in either direction) looks like
+
+	0xA5 | length | id | type | payload (length bytes) | crc16
+
+where the crc16 is the modbus crc (little endian) of length, id, type and
+payload. The desktop sends COMMAND frames holding the same text as a typed
+command; the pico answers each one with a frame carrying the same id, so
+replies can be matched to requests without waiting on line timeouts.
+Readings are sent as packed little-endian float32 values.
+
+A reply longer than 255 bytes (e.g. to help, stats or a batch) is split: MORE
+frames of 255 bytes each, then one frame of the reply's own type with the
+rest, all with the same id. The desktop joins the payloads before decoding.
+
+Anything the pico prints outside of a frame (e.g. from a driver) is still sent
+as text; the desktop skips it while looking for the next 0xA5 with a good crc.
+
+Typed commands can be tagged instead: "@<id> <command>" is answered with
+"@<id> <reply>" (OK if nothing is returned), so the desktop can keep several
+commands in flight and match each reply to its request. The lines of a
+multi-line reply all start with "@<id>+ " except the last one.
+
+The commands of a batched tagged line or frame ("a; b; c") are answered
+together, one line per command in command order: as "@<id>+ " lines and a
+last "@<id> " line, or as a single TEXT frame.
+
+Throughout, msgid is None for untagged typed commands, a str for tagged typed
+commands, an int for binary frames and a (batchReply, index) tuple for the
+commands of a batch.
+'''
+
+import struct
+
+from sys import stdout
+from time import ticks_ms, ticks_diff
+from micropython import const, kbd_intr
+
+from umodbus import const as Const
+
+#frame bytes
+SYNC = const(0xA5)
+HEADER_LENGTH = const(4)
+FRAME_OVERHEAD = const(6)
+
+#frame types (desktop to pico)
+COMMAND = const(0x01)
+
+#frame types (pico to desktop)
+ACK = const(0x80) #done, nothing returned
+VALUES = const(0x81) #float32 values
+TEXT = const(0x82) #text
+MORE = const(0x83) #first part of a payload, continued in the next frame
+ERROR = const(0xFF) #text of the error
+
+#most payload bytes in one frame
+MAX_PAYLOAD = const(255)
+
+#partial frames older than this are dropped (ms)
+FRAME_TIMEOUT = const(200)
+
+#function to calculate the crc16 of some bytes
+def crc16(data):
+	'''
+	Calculates the modbus crc16 of some bytes
+
+	Parameters
+	----------
+	data : bytes or bytearray
+		Bytes to check
+
+	Returns
+	-------
+	crc : int
+		The crc16
+	'''
+	crc = 0xFFFF
+
+	#loop through and convert
+	for char in data:
+		crc = (crc >> 8) ^ Const.CRC16_TABLE[(crc ^ char) & 0xFF]
+
+	return crc
+
+#function to make a frame
+def encode(msgid, ftype, payload = b''):
+	'''
+	Makes a frame
+
+	Parameters
+	----------
+	msgid : int
+		Message id (0 to 255)
+
+	ftype : int
+		Frame type
+
+	payload : bytes
+		Frame payload (up to 255 bytes)
+
+	Returns
+	-------
+	frame : bytes
+		The frame, ready to send
+	'''
+	body = bytes((len(payload), msgid, ftype)) + payload
+
+	return bytes((SYNC,)) + body + struct.pack('<H', crc16(body))
+
+#function to send a frame to the desktop
+def send(msgid, ftype, payload = b''):
+	'''
+	Sends a frame to the desktop; a payload longer than MAX_PAYLOAD goes
+	as MORE frames, then a frame of the given type with the rest
+	'''
+	out = stdout.buffer
+
+	while len(payload) > MAX_PAYLOAD:
+		out.write(encode(msgid, MORE, payload[:MAX_PAYLOAD]))
+		payload = payload[MAX_PAYLOAD:]
+
+	out.write(encode(msgid, ftype, payload))
+
+#function to send the result of a command
+def reply(msgid, res):
+	'''
+	Sends the result of a command: numbers (or lists of numbers) as VALUES,
+	None as ACK and anything else as TEXT (or as a tagged line for tagged
+	typed commands)
+
+	Parameters
+	----------
+	msgid : int or str
+		Id of the command frame, or tag of the typed command
+
+	res : object
+		Whatever the method returned
+	'''
+
+	#tagged typed commands (and batches): one tagged line
+	if isinstance(msgid, (str, tuple)):
+		say(msgid, "OK" if res is None else str(res))
+		return
+
+	if res is None:
+		send(msgid, ACK)
+		return
+
+	if not isinstance(res, (list, tuple)):
+		res = (res,)
+
+	#pack numbers as float32 (unread values go as nan)
+	try:
+		values = [float("nan") if v is None else float(v) for v in res]
+		send(msgid, VALUES, struct.pack('<%df' % len(values), *values))
+
+	except (TypeError, ValueError):
+		send(msgid, TEXT, " ".join(str(v) for v in res).encode())
+
+#function to send an error
+def replyError(msgid, text):
+	'''
+	Sends an error for a command
+	'''
+	say(msgid, "ERROR: " + str(text), ERROR)
+
+#function to answer a message in whichever form it came
+def say(msgid, text, ftype = TEXT):
+	'''
+	Prints text for typed commands (tagging each line if the command was
+	tagged), or sends it as a TEXT (or ERROR) frame for framed ones
+	'''
+	if msgid is None:
+		print(text)
+
+	#part of a batch: held until the whole batch is answered
+	elif isinstance(msgid, tuple):
+		msgid[0].add(msgid[1], text, ftype)
+
+	elif isinstance(msgid, str):
+		lines = text.split("\n")
+
+		for line in lines[:-1]:
+			print("@" + msgid + "+ " + line)
+
+		print("@" + msgid + " " + lines[-1])
+
+	else:
+		send(msgid, ftype, text.encode())
+
+#define batch reply class
+class batchReply:
+	'''
+	Class to collect the replies to the commands of a batch, so they go back
+	as one reply
+	'''
+	def __init__(self, msgid, n):
+		'''
+		Initialize the class instance
+
+		Attributes
+		----------
+		msgid : int or str
+			Id of the frame, or tag of the line, the batch came in
+
+		replies : list
+			Reply of each command (None until it is answered)
+
+		left : int
+			Number of commands not answered yet
+
+		ftype : int
+			Frame type of the reply (ERROR if any command failed)
+		'''
+
+		#set attributes
+		self.msgid = msgid
+		self.replies = [None] * n
+		self.left = n
+		self.ftype = TEXT
+
+	#function to add the reply of one command
+	def add(self, i, text, ftype = TEXT):
+		'''
+		Stores the reply of command i, and sends them all once the last one
+		is in
+		'''
+		self.replies[i] = text
+		self.left -= 1
+
+		if ftype == ERROR:
+			self.ftype = ERROR
+
+		if self.left == 0:
+			say(self.msgid, "\n".join(self.replies), self.ftype)
+
+#define frame decoder class
+class frameDecoder:
+	'''
+	Class to collect incoming bytes into frames
+	'''
+	def __init__(self):
+		'''
+		Initialize the class instance
+
+		Attributes
+		----------
+		__buf : bytearray
+			Bytes of the frame being collected
+
+		__started : int
+			ticks_ms when the frame started
+
+		errors : int
+			Number of frames dropped for a bad crc or a timeout
+		'''
+
+		#set attributes
+		self.__buf = bytearray()
+		self.__started = 0
+		self.errors = 0
+
+	#function to tell whether a frame is being collected
+	def busy(self):
+		'''
+		Tells whether a frame has started but not finished (dropping it if it
+		has timed out)
+		'''
+		if self.__buf and \
+			ticks_diff(ticks_ms(), self.__started) > FRAME_TIMEOUT:
+
+			self.__buf = bytearray()
+			self.errors += 1
+
+		return len(self.__buf) > 0
+
+	#function to add a byte
+	def feed(self, b):
+		'''
+		Adds a byte to the frame being collected
+
+		Parameters
+		----------
+		b : int
+			The byte (the first one must be SYNC)
+
+		Returns
+		-------
+		frame : tuple or None
+			(id, type, payload) once a whole frame with a good crc is in
+		'''
+		buf = self.__buf
+
+		if not buf:
+			self.__started = ticks_ms()
+
+		buf.append(b)
+
+		if len(buf) < HEADER_LENGTH:
+			return None
+
+		n = buf[1] + FRAME_OVERHEAD
+
+		if len(buf) < n:
+			return None
+
+		#whole frame is in; start over for the next one
+		self.__buf = bytearray()
+
+		if crc16(buf[1:n - 2]) != buf[n - 2] | (buf[n - 1] << 8):
+			self.errors += 1
+			return None
+
+		return (buf[2], buf[3], bytes(buf[HEADER_LENGTH:n - 2]))
+
+
+#define protocol class
+class Protocol:
+	'''
+	Class to switch the desktop link between text and binary use
+	'''
+	def __init__(self):
+		'''
+		Initialize the class instance
+
+		Attributes
+		----------
+		binary : bool
+			Whether the desktop has switched to framed commands
+		'''
+
+		#set attributes
+		self.binary = False
+
+	#function to switch on binary use
+	def on(self):
+		'''
+		Switches to binary use: turns off ctrl-c on the usb port, since frames
+		can contain 0x03
+		'''
+		kbd_intr(-1)
+		self.binary = True
+
+		return "binary on"
+
+	#function to switch back to text use
+	def off(self):
+		'''
+		Switches back to text use and turns ctrl-c back on
+		'''
+		kbd_intr(3)
+		self.binary = False
+
+		return "binary off"
@@ -0,0 +1,401 @@
+# Library_scheduler.py
+# 18. October 2026
+
+'''
+File to make a cooperative scheduler, which runs periodic and one-shot jobs at
+their deadlines and sleeps in between (instead of spinning on time())
+'''
+
+from heapq import heappush, heappop
+from time import ticks_ms, ticks_us, ticks_diff, sleep_ms
+
+from Library_profiler import myProfiler
+
+#define job class
+class job:
+	'''
+	Class to hold a single scheduled job and its overrun accounting
+	'''
+	def __init__(self, name, fn, period = None, priority = 0):
+		'''
+		Initialize the class instance
+
+		Attributes
+		----------
+		name : str
+			Name of the job
+
+		fn : function
+			Function to call (no arguments)
+
+		period : int or None
+			Period in ms for periodic jobs; None for one-shot jobs
+
+		priority : int
+			Tie-breaker for jobs due at the same time; lower runs first
+
+		deadline : int
+			Scheduler time (ms) the job is next due
+
+		active : bool
+			False once the job has been cancelled
+
+		queued : bool
+			True while the job is waiting on the heap
+
+		runs : int
+			Number of times the job has run
+
+		overruns : int
+			Number of runs that started a full period late or took longer than
+			a period to finish (periodic jobs only)
+
+		skipped : int
+			Number of periods dropped to catch back up after an overrun
+
+		errors : int
+			Number of runs that raised an exception
+
+		firstError : str or None
+			The first of those exceptions (printed when it happens, so a job
+			that keeps failing is reported once rather than on every run)
+
+		maxLate : int
+			Longest delay between deadline and start, in ms
+
+		maxRun : int
+			Longest run time, in ms
+
+		totalRun : int
+			Total run time, in ms
+		'''
+
+		#set attributes
+		self.name = name
+		self.fn = fn
+		self.period = period
+		self.priority = priority
+		self.deadline = 0
+		self.active = True
+		self.queued = False
+
+		#name in the profiler
+		self.key = "job " + name
+
+		self.resetStats()
+
+	#function to reset the accounting
+	def resetStats(self):
+		'''
+		Resets the overrun accounting of this job
+		'''
+		self.runs = 0
+		self.overruns = 0
+		self.skipped = 0
+		self.errors = 0
+		self.firstError = None
+		self.maxLate = 0
+		self.maxRun = 0
+		self.totalRun = 0
+
+	#function to get the accounting as a dict
+	def getStats(self):
+		'''
+		Gets the overrun accounting of this job
+		'''
+		return {
+			"period": self.period,
+			"runs": self.runs,
+			"overruns": self.overruns,
+			"skipped": self.skipped,
+			"errors": self.errors,
+			"firstError": self.firstError,
+			"maxLate": self.maxLate,
+			"maxRun": self.maxRun,
+			"totalRun": self.totalRun,
+			}
+
+
+#define scheduler class
+class scheduler:
+	'''
+	Class to run jobs in deadline order
+	'''
+	def __init__(self):
+		'''
+		Initialize the class instance
+
+		Attributes
+		----------
+		__queue : list
+			Heap of (deadline, priority, sequence, job) entries
+
+		__jobs : dict
+			Known jobs by name (one-shot jobs stay here between runs so that
+			their accounting carries over)
+
+		__clock : int
+			Scheduler time in ms; unwrapped from ticks_ms so deadlines can be
+			ordered directly in the heap
+
+		__lastTicks : int
+			ticks_ms value when the clock was last updated
+
+		__seq : int
+			Counter to keep jobs with equal deadlines in FIFO order
+		'''
+
+		#set attributes
+		self.__queue = []
+		self.__jobs = {}
+		self.__clock = 0
+		self.__lastTicks = ticks_ms()
+		self.__seq = 0
+
+	#function to get current scheduler time
+	def now(self):
+		'''
+		Gets the current scheduler time, in ms
+		'''
+		t = ticks_ms()
+		self.__clock += ticks_diff(t, self.__lastTicks)
+		self.__lastTicks = t
+
+		return self.__clock
+
+	#function to put a job on the heap
+	def __push(self, j):
+		'''
+		Pushes a job onto the heap at its deadline
+		'''
+		self.__seq += 1
+		j.queued = True
+		heappush(self.__queue, (j.deadline, j.priority, self.__seq, j))
+
+	#function to add a periodic job
+	def every(self, period, fn, name, priority = 0):
+		'''
+		Adds a periodic job, first due one period from now
+
+		Parameters
+		----------
+		period : int
+			Period in ms
+
+		fn : function
+			Function to call (no arguments)
+
+		name : str
+			Name of the job; replaces any job of the same name
+
+		priority : int
+			Tie-breaker for jobs due at the same time; lower runs first
+
+		Returns
+		-------
+		j : job
+			The scheduled job
+		'''
+		self.cancel(name)
+
+		j = job(name, fn, period = max(1, int(period)), priority = priority)
+		j.deadline = self.now() + j.period
+
+		self.__jobs[name] = j
+		self.__push(j)
+
+		return j
+
+	#function to add a one-shot job
+	def after(self, delay, fn, name, priority = 0):
+		'''
+		Adds a one-shot job, due after the given delay. If a one-shot job of the
+		same name is already waiting, it is left as is (so repeated requests
+		coalesce into a single run).
+
+		Parameters
+		----------
+		delay : int
+			Delay in ms (0 to run on the next pass)
+
+		fn : function
+			Function to call (no arguments)
+
+		name : str
+			Name of the job
+
+		priority : int
+			Tie-breaker for jobs due at the same time; lower runs first
+
+		Returns
+		-------
+		j : job
+			The scheduled job
+		'''
+		j = self.__jobs.get(name)
+
+		#coalesce with a waiting one-shot job
+		if j is not None and j.period is None and j.queued:
+			return j
+
+		#re-use an idle one-shot job so its accounting carries over
+		if j is None or j.period is not None:
+			self.cancel(name)
+			j = job(name, fn, period = None, priority = priority)
+			self.__jobs[name] = j
+
+		j.fn = fn
+		j.priority = priority
+		j.deadline = self.now() + max(0, int(delay))
+		self.__push(j)
+
+		return j
+
+	#function to remove a job
+	def cancel(self, name):
+		'''
+		Cancels a job (it is dropped from the heap when it comes due)
+
+		Parameters
+		----------
+		name : str
+			Name of the job
+		'''
+		j = self.__jobs.pop(name, None)
+
+		if j is not None:
+			j.active = False
+
+	#function to check if a job is scheduled
+	def isPending(self, name):
+		'''
+		Tells whether a job of the given name is waiting to run
+		'''
+		j = self.__jobs.get(name)
+
+		return j is not None and j.queued
+
+	#function to get the time until the next deadline
+	def timeToNext(self):
+		'''
+		Gets the time until the next job is due, in ms (None if no jobs)
+		'''
+
+		#drop cancelled jobs from the top of the heap
+		while self.__queue and not self.__queue[0][3].active:
+			heappop(self.__queue)
+
+		if not self.__queue:
+			return None
+
+		return max(0, self.__queue[0][0] - self.now())
+
+	#function to run all jobs that are due
+	def runPending(self):
+		'''
+		Runs every job whose deadline has passed, in deadline order
+		'''
+		now = self.now()
+
+		while self.__queue and self.__queue[0][0] <= now:
+			j = heappop(self.__queue)[3]
+
+			#skip cancelled jobs
+			if not j.active:
+				continue
+
+			j.queued = False
+			self.__runJob(j, now)
+
+			#put periodic jobs back at their next deadline
+			if j.active and j.period is not None:
+				self.__reschedule(j)
+
+			now = self.now()
+
+	#function to run a single job and account for it
+	def __runJob(self, j, now):
+		'''
+		Runs one job and updates its accounting
+		'''
+		late = now - j.deadline
+		start = ticks_ms()
+		startUs = ticks_us()
+
+		try:
+			j.fn()
+
+		except Exception as e:
+			j.errors += 1
+
+			if j.firstError is None:
+				j.firstError = repr(e)
+				print(f'ERROR: {j.key}: {j.firstError}')
+
+		myProfiler.record(j.key, ticks_diff(ticks_us(), startUs))
+		run = ticks_diff(ticks_ms(), start)
+
+		#update accounting
+		j.runs += 1
+		j.totalRun += run
+
+		if late > j.maxLate:
+			j.maxLate = late
+
+		if run > j.maxRun:
+			j.maxRun = run
+
+		if j.period is not None and (late >= j.period or run > j.period):
+			j.overruns += 1
+
+	#function to find the next deadline of a periodic job
+	def __reschedule(self, j):
+		'''
+		Moves a periodic job to its next deadline, dropping missed periods
+		rather than running them back-to-back
+		'''
+		j.deadline += j.period
+		now = self.now()
+
+		if j.deadline <= now:
+			missed = (now - j.deadline) // j.period + 1
+			j.skipped += missed
+			j.deadline += missed * j.period
+
+		self.__push(j)
+
+	#function to get the accounting of all jobs
+	def getStats(self):
+		'''
+		Gets the overrun accounting of all scheduled jobs, by name
+		'''
+		return {name: j.getStats() for name, j in self.__jobs.items()}
+
+	#function to reset the accounting of all jobs
+	def resetStats(self):
+		'''
+		Resets the overrun accounting of all scheduled jobs
+		'''
+		for j in self.__jobs.values():
+			j.resetStats()
+
+	#function to run forever
+	def run(self):
+		'''
+		Runs jobs as they come due and sleeps until the next deadline
+		'''
+		while True:
+			self.runPending()
+
+			wait = self.timeToNext()
+
+			#nothing scheduled; idle politely
+			if wait is None:
+				wait = 100
+
+			if wait > 0:
+				sleep_ms(wait)
+
+
+#make an instance of the class (to be imported in main.py)
+myScheduler = scheduler()
@@ -0,0 +1,269 @@
+# Library_snapshot.py
+# 18. October 2026
+
+'''
+File to make a snapshot class, which reads a set of device/method pairs in one
+pass and returns them to the desktop as a single timestamped record (one line
+of json), instead of one serial round trip per reading
+'''
+
+from json import dumps
+from time import ticks_ms, ticks_us, ticks_diff
+
+from Library_profiler import myProfiler
+
+class Snapshot:
+	'''
+	Class to read a set of channels (device/method pairs) in one pass
+	'''
+
+	#argument types of the public methods (checked by the parser)
+	_signatures = {
+		"read": (("channels", str, None),),
+		"values": (("channels", str, None),),
+		"poll": (("channels", str, None),),
+		}
+
+	def __init__(self, devices, channels):
+		'''
+		Initialize the class instance
+
+		Attributes
+		----------
+		__devices : dict
+			Dict of connected devices
+
+		__methods : dict
+			Bound method for each channel, resolved on first use
+
+		__methodsAsync : dict
+			Bound async variant (or None) for each channel, resolved on first
+			use
+
+		channels : list
+			Default channels to read, as "device method" strings (from
+			"pollChannels" in Library_settings.json)
+		'''
+
+		#set attributes
+		self.__devices = devices
+		self.__methods = {}
+		self.__methodsAsync = {}
+		self.channels = channels
+
+	#function to get the bound method of a channel
+	def _method(self, channel):
+		'''
+		Gets the bound method for a "device method" channel (None if the
+		device or method does not exist)
+		'''
+		try:
+			return self.__methods[channel]
+
+		except KeyError:
+			pass
+
+		#resolve it once and cache it
+		try:
+			device, method = channel.split()
+			fn = getattr(self.__devices[device]["Instance"], method)
+
+		except (ValueError, KeyError, AttributeError):
+			fn = None
+
+		self.__methods[channel] = fn
+
+		return fn
+
+	#function to get the lock of a channel's device
+	def _lock(self, channel):
+		'''
+		Gets the lock of a channel's device (None if it has none)
+		'''
+		try:
+			return getattr(
+				self.__devices[channel.split()[0]]["Instance"],
+				"lock",
+				None
+				)
+
+		except (IndexError, KeyError):
+			return None
+
+	#function to get the async variant of a channel's method
+	def _methodAsync(self, channel):
+		'''
+		Gets the async variant of a channel's method (None if it has none)
+		'''
+		try:
+			return self.__methodsAsync[channel]
+
+		except KeyError:
+			pass
+
+		#resolve it once and cache it
+		try:
+			device, method = channel.split()
+			fn = getattr(self.__devices[device]["Instance"], method + "Async")
+
+		except (ValueError, KeyError, AttributeError):
+			fn = None
+
+		self.__methodsAsync[channel] = fn
+
+		return fn
+
+	#function to parse a list of channels
+	def _channels(self, channels):
+		'''
+		Gets the channels to read: the default list if None, otherwise a
+		comma-separated string of "device method" pairs
+		'''
+		if channels is None:
+			return self.channels
+
+		return [c.strip() for c in channels.split(",") if c.strip()]
+
+	#function to read a list of channels in order
+	def _readValues(self, channels):
+		'''
+		Reads each channel in the list and returns the readings in the same
+		order (None for any that could not be read)
+		'''
+		values = []
+
+		for channel in channels:
+			fn = self._method(channel)
+
+			#a failed read should not lose the rest of the snapshot
+			try:
+				values.append(fn())
+
+			except Exception:
+				values.append(None)
+
+		return values
+
+	#async variant of _readValues
+	async def _readValuesAsync(self, channels):
+		'''
+		Async variant of _readValues (used by the asyncio runtime); uses each
+		driver's async method where it has one, and otherwise calls the plain
+		method holding the device's lock, so reads wait their turn on a
+		shared bus instead of cutting into another transaction
+		'''
+		values = []
+
+		for channel in channels:
+			fnAsync = self._methodAsync(channel)
+			lock = self._lock(channel)
+
+			#a failed read should not lose the rest of the snapshot
+			try:
+				if fnAsync is not None:
+					values.append(await fnAsync())
+
+				elif lock is None:
+					values.append(self._method(channel)())
+
+				else:
+					start = ticks_us()
+
+					async with lock:
+						myProfiler.addWait(ticks_diff(ticks_us(), start))
+						values.append(self._method(channel)())
+
+			except Exception:
+				values.append(None)
+
+		return values
+
+	#function to read each channel
+	def read(self, channels = None):
+		'''
+		Reads each channel and returns the readings
+
+		Parameters
+		----------
+		channels : str or None
+			Comma-separated "device method" pairs; defaults to the configured
+			channel list
+
+		Returns
+		-------
+		data : dict
+			Reading for each channel (None if it could not be read)
+		'''
+		channels = self._channels(channels)
+
+		return dict(zip(channels, self._readValues(channels)))
+
+	#async variant of read
+	async def readAsync(self, channels = None):
+		'''
+		Async variant of read (used by the asyncio runtime)
+		'''
+		channels = self._channels(channels)
+
+		return dict(zip(channels, await self._readValuesAsync(channels)))
+
+	#function to read each channel as a list
+	def values(self, channels = None):
+		'''
+		Reads each channel and returns the readings in channel order (sent as
+		packed floats when asked for in a binary frame)
+
+		Parameters
+		----------
+		channels : str or None
+			Comma-separated "device method" pairs; defaults to the configured
+			channel list
+
+		Returns
+		-------
+		values : list
+			Reading for each channel (None if it could not be read)
+		'''
+		return self._readValues(self._channels(channels))
+
+	#async variant of values
+	async def valuesAsync(self, channels = None):
+		'''
+		Async variant of values (used by the asyncio runtime)
+		'''
+		return await self._readValuesAsync(self._channels(channels))
+
+	#function to take a snapshot as one line of json
+	def poll(self, channels = None):
+		'''
+		Reads each channel and returns a single timestamped record, e.g.
+
+		{"t": 123456, "data": {"pidWT1 getTemp": 21.0, ...}}
+
+		where t is the pico ticks_ms at the start of the snapshot
+
+		Parameters
+		----------
+		channels : str or None
+			Comma-separated "device method" pairs; defaults to the configured
+			channel list
+
+		Returns
+		-------
+		record : str
+			The record as json (sent back under the command's tag or id)
+		'''
+		t = ticks_ms()
+
+		return dumps({"t": t, "data": self.read(channels)})
+
+	#async variant of poll
+	async def pollAsync(self, channels = None):
+		'''
+		Async variant of poll (used by the asyncio runtime)
+		'''
+		t = ticks_ms()
+		channels = self._channels(channels)
+		values = await self._readValuesAsync(channels)
+
+		return dumps({"t": t, "data": dict(zip(channels, values))})
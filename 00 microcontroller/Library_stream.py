@@ -0,0 +1,173 @@
+# Library_stream.py
+# 18. October 2026
+
+'''
+File to make a stream class, which samples a set of channels on its own timer
+and pushes each record to the desktop without being asked (push mode), so the
+desktop can subscribe instead of polling
+
+Records are single comma-separated lines, so they are cheap to send and easy
+to tell apart from command replies:
+
+	$H,<channel 1>,<channel 2>,...				(header, sent on start)
+	$D,<sequence>,<ticks_ms>,<value 1>,<value 2>,...	(one per sample)
+
+A value that could not be read is left empty.
+'''
+
+import asyncio
+
+from time import ticks_ms
+
+from Library_scheduler import myScheduler
+from Library_snapshot import Snapshot
+
+class Stream:
+	'''
+	Class to push readings of a set of channels to the desktop periodically
+	'''
+
+	#argument types of the public methods (checked by the parser)
+	_signatures = {
+		"start": (("period", float, None),),
+		"setChannels": (("channels", str),),
+		}
+
+	def __init__(self, devices, channels, period, useAsync = False):
+		'''
+		Initialize the class instance
+
+		Attributes
+		----------
+		channels : list
+			Channels to sample, as "device method" strings (from
+			"streamChannels" in Library_settings.json)
+
+		period : float
+			Time between samples, in seconds (from "streamPeriod" in
+			Library_settings.json)
+
+		useAsync : bool
+			Whether to sample in an asyncio task (asyncio runtime), so the
+			reads queue on their bus locks instead of blocking the event loop
+
+		__snapshot : Snapshot
+			Reads the channels (held rather than inherited, so its commands
+			are not the stream's)
+
+		running : bool
+			Whether the stream is on
+
+		skipped : int
+			Samples skipped because the one before had not finished
+
+		seq : int
+			Sequence number of the next record (lets the desktop spot drops)
+		'''
+
+		#set attributes
+		self.__snapshot = Snapshot(devices, channels)
+		self.channels = channels
+		self.period = period
+		self.useAsync = useAsync
+		self.running = False
+		self.seq = 0
+		self.skipped = 0
+
+		#whether an async sample is still in progress
+		self.__sampling = False
+
+	#function to start streaming
+	def start(self, period = None):
+		'''
+		Starts streaming; prints the header line, then one record per period
+
+		Parameters
+		----------
+		period : str or None
+			Time between samples, in seconds; defaults to the current period
+		'''
+		if period is not None:
+			self.period = float(period)
+
+		#restart the sequence and tell the desktop what the columns are
+		self.seq = 0
+		print("$H," + ",".join(self.channels))
+
+		myScheduler.every(int(self.period * 1000), self._sample, name = "stream")
+		self.running = True
+
+		return "stream started"
+
+	#function to stop streaming
+	def stop(self):
+		'''
+		Stops streaming
+		'''
+		myScheduler.cancel("stream")
+		self.running = False
+
+		return "stream stopped"
+
+	#function to set the channels
+	def setChannels(self, channels):
+		'''
+		Sets the channels to sample (takes effect on the next start)
+
+		Parameters
+		----------
+		channels : str
+			Comma-separated "device method" pairs
+		'''
+		self.channels = self.__snapshot._channels(channels)
+
+		return "stream channels: %d" % len(self.channels)
+
+	#function to take one sample
+	def _sample(self):
+		'''
+		Reads each channel and prints one record (run by the scheduler)
+		'''
+
+		#in the asyncio runtime, sample in a task (one at a time)
+		if self.useAsync:
+			if self.__sampling:
+				self.skipped += 1
+
+			else:
+				self.__sampling = True
+				asyncio.create_task(self._sampleAsync())
+
+			return
+
+		t = ticks_ms()
+		self._print(t, self.__snapshot._readValues(self.channels))
+
+	#async variant of _sample
+	async def _sampleAsync(self):
+		'''
+		Async variant of _sample (used by the asyncio runtime)
+		'''
+		t = ticks_ms()
+
+		try:
+			self._print(
+				t,
+				await self.__snapshot._readValuesAsync(self.channels)
+				)
+
+		finally:
+			self.__sampling = False
+
+	#function to print one record
+	def _print(self, t, values):
+		'''
+		Prints one record and moves the sequence number on
+		'''
+		print("$D,%d,%d,%s" % (
+			self.seq,
+			t,
+			",".join("" if v is None else str(v) for v in values)
+			))
+
+		self.seq += 1
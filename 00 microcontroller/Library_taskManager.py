@@ -7,14 +7,21 @@
 File to define a bunch of tasks that can be done
 '''
 
-from time import time
-from Library_ComSet import deviceList
+from collections import deque
+from time import time, ticks_ms, ticks_us, ticks_diff
+from Library_ComSet import deviceList, settings
+from Library_protocol import reply, replyError, say, ERROR
+from Library_profiler import myProfiler
+
+#overflow policies
+REJECT = "reject" #refuse the new task
+DROP_OLDEST = "dropOldest" #drop the oldest waiting task to make room
 
 class taskManager:
 	'''
 	Class to manage tasks
 	'''
-	def __init__(self, devices):
+	def __init__(self, devices, size = 32, overflow = REJECT):
 		'''
 		Initialize the class instance
 
@@ -23,8 +30,34 @@ class taskManager:
 		__lastExecuted : float
 			Time the task manager was last executed
 
-		__taskList : list
-			List of tasks to be done
+		__queues : dict
+			Bounded FIFO deque of tasks to be done for each bus
+
+		__stats : dict
+			Queue metrics for each bus (see getStats)
+
+		__since : int
+			ticks_ms when the metrics were last reset
+
+		__untagged : int
+			Number of untagged tasks taken in so far (each gets the next one
+			as its "Seq")
+
+		__turn : int
+			Seq of the untagged task whose answer goes out next
+
+		__held : dict
+			Answers of untagged tasks finished out of turn, by Seq (None for
+			a task with nothing to print)
+
+		size : int
+			Most tasks that can wait on one bus (from "taskQueueSize" in
+			Library_settings.json)
+
+		overflow : str
+			What to do with a task for a full bus (from "taskOverflow" in
+			Library_settings.json): "reject" answers the new task with an
+			error, "dropOldest" drops (and answers) the oldest waiting one
 
 		__devices : list
 			List of connected devices
@@ -39,7 +72,24 @@ class taskManager:
 		#set attributes
 		self.__lastExecuted = time()
 		self.__devices = devices
-		self.__taskList = []
+
+		self.size = size
+		self.overflow = overflow
+
+		#make a FIFO queue for each physical bus (tagged in Library_ComSet)
+		self.__queues = {}
+
+		for device in devices.values():
+			if device["Bus"] not in self.__queues:
+				self.__queues[device["Bus"]] = deque((), size)
+
+		self.resetStats()
+
+		#untagged replies can only be matched to their commands by order, so
+		# their answers go out in the order the tasks came (see __answer)
+		self.__untagged = 0
+		self.__turn = 0
+		self.__held = {}
 
 		self.index = 0
 		self.stateList = dict(  )  # default fillbusy
@@ -47,16 +97,37 @@ class taskManager:
 	#function to get the task list from the class instance
 	def getTaskList(self):
 		'''
-		Gets task list from taskManager instance
+		Gets the list of tasks waiting on all buses
 		'''
-		try:
-			taskList = self.__taskList[0]
+		taskList = []
 
-		except IndexError:
-			taskList = []
+		for queue in self.__queues.values():
+			taskList.extend(queue)
 
 		return taskList
 
+	#function to get the buses with queues
+	def getBuses(self):
+		'''
+		Gets the names of all buses that have a task queue
+		'''
+		return list(self.__queues.keys())
+
+	#function to count waiting tasks
+	def getPending(self, bus = None):
+		'''
+		Gets the number of waiting tasks
+
+		Parameters
+		----------
+		bus : str or None
+			The bus to count; counts all buses if None
+		'''
+		if bus is not None:
+			return len(self.__queues[bus])
+
+		return sum(len(queue) for queue in self.__queues.values())
+
 	#index setter
 	def setIndex(self, index):
 		'''
@@ -79,38 +150,251 @@ class taskManager:
 	#function to add task
 	def addTask(self, newTask):
 		'''
-		Adds a new task to the task list
+		Adds new tasks to the queue of the bus their device sits on, applying
+		the overflow policy to any bus that is full
+
+		Parameters
+		----------
+		newTask : list
+			List of tasks from the parser
+
+		Returns
+		-------
+		added : int
+			Number of tasks queued
+		'''
+		added = 0
+
+		for task in newTask:
+			bus = self.__devices[task["Device"]]["Bus"]
+			queue = self.__queues[bus]
+			stats = self.__stats[bus]
+
+			#number untagged tasks in the order they came
+			if "Id" not in task:
+				task["Seq"] = self.__untagged
+				self.__untagged += 1
+
+			#full: refuse the new task or make room for it
+			if len(queue) >= self.size:
+				if self.overflow == DROP_OLDEST:
+					stats["dropped"] += 1
+					self.refuse(queue.popleft(), bus)
+
+				else:
+					stats["rejected"] += 1
+					self.refuse(task, bus)
+					continue
+
+			queue.append(task)
+			added += 1
+
+			stats["added"] += 1
+			stats["maxDepth"] = max(stats["maxDepth"], len(queue))
+
+		return added
+
+	#function to answer a task that will not be done
+	def refuse(self, task, bus):
+		'''
+		Tells the sender that a task was not queued (or was dropped) because
+		its bus was full
+		'''
+		text = f'ERROR: {bus} queue full, {task["Device"]} ' \
+			f'{task["Method"]} not done'
+
+		if "Id" in task:
+			say(task["Id"], text, ERROR)
+
+		else:
+			self.__answer(task["Seq"], text)
+
+	#function to take the next task off a bus queue
+	def popTask(self, bus):
+		'''
+		Removes and returns the next task for the given bus (None if empty)
+
+		Parameters
+		----------
+		bus : str
+			The bus to take a task from
+		'''
+		queue = self.__queues[bus]
+
+		if len(queue) == 0:
+			return None
+
+		return queue.popleft()
+
+	#function to send the answer of an untagged task in its turn
+	def __answer(self, seq, text):
+		'''
+		Prints the answer of an untagged task once every untagged task before
+		it has been answered, holding it until then. The buses still run
+		independently; only the answers are put back in order, since the
+		desktop matches untagged replies to commands by order. (Text a
+		driver prints itself while running goes out as it is printed.)
+
+		Parameters
+		----------
+		seq : int
+			Seq of the task
+
+		text : str or None
+			Answer to print; None if there is nothing to print
+		'''
+		self.__held[seq] = text
+
+		while self.__turn in self.__held:
+			text = self.__held.pop(self.__turn)
+			self.__turn += 1
+
+			if text is not None:
+				print(text)
+
+	#function to answer a task that was done
+	def done(self, task, res):
+		'''
+		Echoes any returned reading back to the desktop (as a reply frame if
+		the task came in a binary frame, in turn if it was untagged)
+		'''
+		if "Id" in task:
+			reply(task["Id"], res)
+
+		else:
+			self.__answer(task["Seq"], None if res is None else str(res))
+
+	#function to execute a single task
+	def doTask(self, task):
+		'''
+		Executes a single task and echoes any returned reading back to the
+		desktop (as a reply frame if the task came in a binary frame); errors
+		are reported to the desktop instead of being raised
 
 		Parameters
 		----------
-		newTask : str(?)
-			The new task to perform
+		task : dict
+			Task from the parser
 		'''
-		if len(newTask) > 0:
-			self.__taskList.append(newTask[0])
+		stats = self.__stats[self.__devices[task["Device"]]["Bus"]]
+		stats["done"] += 1
+
+		start = ticks_us()
+		myProfiler.watch()
+
+		try:
+			res = task["Fn"](*task["Args"], **task["Kwargs"])
+
+		#every failed task gets an answer
+		except Exception as e:
+			stats["errors"] += 1
+			self.fail(task, e)
+			return
+
+		finally:
+			self.profile(task, start)
+
+		self.done(task, res)
 
 	#function to actually do the tasks
 	def doTasks(self):
 		'''
-		Execute the tasks in the task list
+		Execute one task from each bus that has tasks waiting. Buses are
+		drained independently (round robin), so a backlog on one bus does not
+		hold up devices on the others; the answers of untagged tasks are put
+		back in order as they are sent (see __answer).
+
+		Returns
+		-------
+		pending : bool
+			Whether any tasks are still waiting
 		'''
+		self.__lastExecuted = time()
+
+		#loop through each bus and execute its next task
+		for bus in self.__queues:
+			task = self.popTask(bus)
+
+			if task is not None:
+				self.doTask(task)
+
+		return self.getPending() > 0
+
+
+	#function to report a failed task
+	def fail(self, task, e):
+		'''
+		Tells the sender that a task raised an error
+		'''
+		if "Id" in task:
+			replyError(task["Id"], repr(e))
+
+		else:
+			self.__answer(
+				task["Seq"],
+				f'ERROR: {task["Device"]} {task["Method"]}: {e!r}'
+				)
 
-		#loop through each task and execute
-		for task in self.__taskList:
-			
-			if "kwargs" in task:
-				getattr(
-					self.__devices[task["Device"]]["Instance"], 
-					task["Method"]
-					)(task["kwargs"])
-			else:
-				getattr(
-					self.__devices[task["Device"]]["Instance"],
-					task["Method"]
-					)()
-			
-			self.__taskList = []
+	#function to record how long a task took
+	def profile(self, task, start):
+		'''
+		Records how long a task waited in its bus queue, how long it ran (from
+		ticks_us start) and how much of that it waited on the bus (reported
+		by the drivers since myProfiler.watch)
+		'''
+		myProfiler.record(
+			task["Device"] + " " + task["Method"],
+			ticks_diff(ticks_us(), start),
+			ticks_diff(start, task["T"]),
+			myProfiler.waited()
+			)
 
+	#function to count a task done outside of doTask (asyncio runtime)
+	def countDone(self, bus, failed = False):
+		'''
+		Counts a task done (and whether it failed) in the metrics of its bus
+		'''
+		self.__stats[bus]["done"] += 1
+
+		if failed:
+			self.__stats[bus]["errors"] += 1
+
+	#function to get the queue metrics
+	def getStats(self):
+		'''
+		Gets the queue metrics of each bus
+
+		Returns
+		-------
+		stats : dict
+			For each bus: current depth, deepest it has been, tasks added,
+			done, failed, rejected and dropped; plus the ms the counts cover
+			(so the desktop can work out throughput)
+		'''
+		stats = {"ms": ticks_diff(ticks_ms(), self.__since), "size": self.size}
+
+		for bus, queue in self.__queues.items():
+			stats[bus] = dict(self.__stats[bus], depth = len(queue))
+
+		return stats
+
+	#function to reset the queue metrics
+	def resetStats(self):
+		'''
+		Resets the queue metrics of each bus
+		'''
+		self.__since = ticks_ms()
+		self.__stats = {
+			bus: {
+				"maxDepth": 0,
+				"added": 0,
+				"done": 0,
+				"errors": 0,
+				"rejected": 0,
+				"dropped": 0,
+				}
+			for bus in self.__queues
+			}
 
 	#function to see when manager was last executed
 	def getLastExecution(self):
@@ -121,4 +405,8 @@ class taskManager:
 
 
 #make an instance of the class
-myTM = taskManager(deviceList)
\ No newline at end of file
+myTM = taskManager(
+	deviceList,
+	settings.get("taskQueueSize", 32),
+	settings.get("taskOverflow", REJECT)
+	)
\ No newline at end of file
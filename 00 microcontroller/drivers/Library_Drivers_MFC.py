@@ -7,14 +7,36 @@
 File to make a driver for getting and setting flow of Axetris 2022 MFC.
 '''
 
-from time import sleep, ticks_ms, ticks_diff
+import asyncio
+
+from time import sleep_us, ticks_ms, ticks_us, ticks_diff
 from machine import Pin, UART
 
+from Library_profiler import myProfiler
+
+#reply length (bytes, including the checksum) for each command byte; every
+# reply starts with the command byte and ends with the checksum (taken from
+# how the replies are decoded, not checked against the Axetris datasheet, so
+# a reply that does not fit is printed raw; see MFC._check)
+_REPLY_LENGTH = {
+	0x31: 4, #read flow rate: 0x31, value (2 bytes), checksum
+	0x61: 4, #read variable: 0x61, value (2 bytes), checksum
+	0x62: 2, #write variable: 0x62, checksum
+	}
+
+#time to wait for a whole reply (ms)
+_TIMEOUT = 100
+
 class MFC:
 	'''
 	Makes an MFC class instance
 	'''
 
+	#argument types of the public methods (checked by the parser)
+	_signatures = {
+		"setFlow": (("flow", float),),
+		}
+
 	def __init__(self, **kwargs):
 		'''
 		Initialize the class
@@ -40,6 +62,21 @@ class MFC:
 			The maximum flow rate, in sccm. This is device-specific and
 			determined at the time of purchase.
 
+		lock : asyncio.Lock
+			Held for the whole of each transaction (so a stream sample and a
+			command cannot cut into each other); async transactions take it
+			themselves, and in the asyncio runtime sync ones are called with
+			it held (see Library_asyncRuntime.py)
+
+		errors : int
+			Number of transactions that timed out or failed the checksum
+
+		lastReply : bytes or None
+			Raw bytes of the last reply whose length or checksum did not
+			match _REPLY_LENGTH
+
+		_reported : set
+			Command bytes whose unexpected reply has already been printed
 		'''
 
 		#set attributes
@@ -49,6 +86,17 @@ class MFC:
 		self.pinRx = int(kwargs["pinRx"])
 		self.pinTx = int(kwargs["pinTx"])
 		self.maxFlow = int(kwargs["maxFlow"])
+
+		self.lock = asyncio.Lock()
+		self.errors = 0
+		self.lastReply = None
+		self._reported = set()
+
+		#True while an async transaction is in progress
+		self._asyncBusy = False
+
+		#time per character (start, 8 data, parity and stop bits), in us
+		self._char_us = 11 * 1000000 // self.baud
 		
 		#initialize the uart bus
 		self.initUart()
@@ -57,36 +105,274 @@ class MFC:
 	def getTemp(self):
 		'''
 		Get the current temperature from MFC thermocouple
+
+		Returns
+		-------
+		T_C : float
+			The temperature, in degrees C (echoed to the desktop by the task
+			manager)
 		'''
-		
-		#initialize the uart bus
-		# self.initUart()
 
-		#define command
-		# from Axetris data sheet:
-		#	0x61 = read variable
-		#	0x0F = ADC_temp
-		cmd = [0x61, 0x0F]
+		#send command to read temp and wait for the response
+		i1 = self._query(self._tempCmd())
+
+		return self._tempValue(i1)
+
+	#define function to get flow rate
+	def getFlow(self):
+		'''
+		Get the current flow rate from the MFC, in sccm
+
+		Returns
+		-------
+		Q_sccm : float
+			The flow rate, in sccm (echoed to the desktop by the task manager)
+		'''
+
+		#send command to read flow and wait for the response
+		i1 = self._query(self._flowCmd())
+
+		return self._flowValue(i1)
+
+	#define function to get serial number
+	def getSerialNumber(self):
+		'''
+		Get the serial number of this MFC
+		'''
+
+		#send command to read serial number and wait for the response
+		i1 = self._query(self._serialNumberCmd())
+
+		#print output to browser window
+		print(self.name,'Serial Number:',self._serialNumberValue(i1))
+
+	#define function to set flow rate
+	def setFlow(self, flow: float):
+		'''
+		Set the MFC flow rate, in ccm
+		'''
+
+		#send command to set flow and wait for the response
+		try:
+			i1 = self._query(self._setFlowCmd(flow))
+
+		except OSError:
+			i1 = None
+
+		#print whether or not it worked
+		self._printSetFlow(i1, flow)
+
+	#----------------#
+	# ASYNC VARIANTS #
+	#----------------#
+
+	#async variant of getTemp
+	async def getTempAsync(self):
+		'''
+		Async variant of getTemp (used by the asyncio runtime)
+		'''
+		i1 = await self._queryAsync(self._tempCmd())
+		return self._tempValue(i1)
+
+	#async variant of getFlow
+	async def getFlowAsync(self):
+		'''
+		Async variant of getFlow (used by the asyncio runtime)
+		'''
+		i1 = await self._queryAsync(self._flowCmd())
+		return self._flowValue(i1)
+
+	#async variant of getSerialNumber
+	async def getSerialNumberAsync(self):
+		'''
+		Async variant of getSerialNumber (used by the asyncio runtime)
+		'''
+		i1 = await self._queryAsync(self._serialNumberCmd())
+		print(self.name,'Serial Number:',self._serialNumberValue(i1))
+
+	#async variant of setFlow
+	async def setFlowAsync(self, flow: float):
+		'''
+		Async variant of setFlow (used by the asyncio runtime)
+		'''
+		try:
+			i1 = await self._queryAsync(self._setFlowCmd(flow))
+
+		except OSError:
+			i1 = None
 
-		#calculate checksum by adding up all the values inside the command array
-		chksum = sum(cmd)
+		self._printSetFlow(i1, flow)
 
-		#add checksum to the command array
-		cmd.extend([chksum % 256])
+	#------------------#
+	# HELPER FUNCTIONS #
+	#------------------#
+
+	#function to send a command
+	def _send(self, cmd: list) -> int:
+		'''
+		Flushes any stale bytes, writes a command to the MFC and gets the
+		length of the reply to wait for
+		'''
+
+		#flush the Rx FIFO
+		self.myUart.read()
 
-		#now send command to read temp
 		self.myUart.write(bytearray(cmd))
 
-		#----------------------------------------------------------------------#
-		# USE STATIC RESPONSE
+		return _REPLY_LENGTH[cmd[0]]
+
+	#function to get how long to wait for the rest of the reply
+	def _reply_wait(self, cmd: list, n: int) -> int:
+		'''
+		Gets about how long the missing reply bytes take to arrive, in us
+		(counting the command itself if nothing has arrived yet)
+		'''
+		waiting = self.myUart.any()
+
+		if waiting == 0:
+			return (len(cmd) + n) * self._char_us
+
+		return (n - waiting) * self._char_us
+
+	#function to check a reply
+	def _check(self, cmd: list, n: int, i1: bytes) -> bytes:
+		'''
+		Checks that a reply is whole, answers the command and has a good
+		checksum (sum of all other bytes, mod 256); a reply of any other
+		length is kept in lastReply and printed raw (once per command), so
+		a wrong entry in _REPLY_LENGTH shows up instead of just timing out
+
+		Raises
+		------
+		OSError
+			If the reply is missing, short or corrupt
+		'''
+		i1 = i1 or b''
+
+		valid = len(i1) >= n and i1[0] == cmd[0] and \
+			sum(i1[:n - 1]) % 256 == i1[n - 1]
+
+		if valid and len(i1) == n:
+			return i1
+
+		raw = ' '.join('%02X' % b for b in i1) or 'nothing'
+		self.lastReply = i1
 
-		#statically wait for response and read
-		sleep(0.02) #20 milliseconds
+		if cmd[0] not in self._reported:
+			self._reported.add(cmd[0])
+			print(self.name, 'reply to 0x%02X: %s (expected %d bytes)' % (
+				cmd[0], raw, n))
 
-		i1 = self.myUart.read()
+		if not valid:
+			self.errors += 1
 
-		sleep(0.02) #another 20 milliseconds
-		#----------------------------------------------------------------------#
+			raise OSError(f'{self.name} no valid reply to 0x{cmd[0]:02X}: {raw}')
+
+		return i1[:n]
+
+	#function to send a command and wait for exactly its reply
+	def _query(self, cmd: list) -> bytes:
+		'''
+		Writes a command to the MFC and reads back the response, waiting only
+		until the expected number of bytes is in (or the timeout runs out)
+
+		Parameters
+		----------
+		cmd : list
+			The command bytes to send (including checksum, if any)
+
+		Returns
+		-------
+		i1 : bytes
+			The response bytes
+
+		Raises
+		------
+		OSError
+			If the reply is missing, short or corrupt, or an async
+			transaction is in progress (the caller did not hold the lock)
+		'''
+
+		#a sync transaction can only cut into a suspended async one if it
+		# was called without holding the lock
+		if self._asyncBusy:
+			raise OSError(f'{self.name} sync transaction made without the lock')
+
+		t0 = ticks_us()
+		n = self._send(cmd)
+		start = ticks_ms()
+
+		#wait for the bytes still missing
+		while self.myUart.any() < n and \
+			ticks_diff(ticks_ms(), start) < _TIMEOUT:
+
+			sleep_us(self._reply_wait(cmd, n))
+
+		#time spent waiting on the bus (for the reply)
+		myProfiler.addWait(ticks_diff(ticks_us(), t0))
+
+		#read all that came in, so a longer reply than expected is seen
+		return self._check(cmd, n, self.myUart.read())
+
+	#async variant of _query
+	async def _queryAsync(self, cmd: list) -> bytes:
+		'''
+		Async variant of _query; lets other coroutines run while waiting
+		'''
+
+		t0 = ticks_us()
+
+		async with self.lock:
+			self._asyncBusy = True
+
+			try:
+				n = self._send(cmd)
+				start = ticks_ms()
+
+				#wait for the bytes still missing
+				while self.myUart.any() < n and \
+					ticks_diff(ticks_ms(), start) < _TIMEOUT:
+
+					await asyncio.sleep_ms(
+						(self._reply_wait(cmd, n) + 999) // 1000
+						)
+
+				i1 = self.myUart.read()
+
+			finally:
+				self._asyncBusy = False
+
+		#time spent waiting on the bus (for the lock and the reply)
+		myProfiler.addWait(ticks_diff(ticks_us(), t0))
+
+		return self._check(cmd, n, i1)
+
+	#function to add the checksum to a command
+	def _withChecksum(self, cmd: list) -> list:
+		'''
+		Adds the checksum (sum of all command values, mod 256) to a command
+		'''
+		cmd.extend([sum(cmd) % 256])
+
+		return cmd
+
+	#command to read temperature
+	def _tempCmd(self) -> list:
+		'''
+		Makes the command to read the temperature
+		'''
+
+		#define command
+		# from Axetris data sheet:
+		#	0x61 = read variable
+		#	0x0F = ADC_temp
+		return self._withChecksum([0x61, 0x0F])
+
+	#function to convert temperature response
+	def _tempValue(self, i1: bytes) -> float:
+		'''
+		Converts the temperature response to degrees C
+		'''
 
 		#convert output hex to int
 		k = (i1[1]*256 + i1[2])
@@ -98,37 +384,24 @@ class MFC:
 
 		T_C = (k/c1 - c2)/c3
 
-		#print output to browser window
-		# print(self.name,'temp.:',T_C,'deg. C')
-		print(T_C)
+		return T_C
 
-	#define function to get flow rate
-	def getFlow(self):
+	#command to read flow
+	def _flowCmd(self) -> list:
 		'''
-		Get the current flow rate from the MFC, in sccm
+		Makes the command to read the flow rate
 		'''
 
-		#initialize the uart bus
-		# self.initUart()
-
 		#define command
 		# from Axetris data sheet:
 		#	0x31 = read flow rate
-		cmd = [0x31]
+		return [0x31]
 
-		#now send command to read flow
-		self.myUart.write(bytearray(cmd))
-
-		#----------------------------------------------------------------------#
-		# USE STATIC RESPONSE
-
-		#statically wait for response and read
-		sleep(0.02) #20 milliseconds
-
-		i1 = self.myUart.read()
-
-		sleep(0.02) #another 20 milliseconds
-		#----------------------------------------------------------------------#
+	#function to convert flow response
+	def _flowValue(self, i1: bytes) -> float:
+		'''
+		Converts the flow rate response to sccm
+		'''
 
 		#convert output hex to int
 		k = (i1[1]*256 + i1[2])
@@ -139,61 +412,34 @@ class MFC:
 		
 		Q_sccm = (k/c1)*c2
 
-		#print output to browser window
-		# print(self.name,'flow:',Q_sccm,'sccm')
-		print(Q_sccm)
+		return Q_sccm
 
-	#define function to get serial number
-	def getSerialNumber(self):
+	#command to read serial number
+	def _serialNumberCmd(self) -> list:
 		'''
-		Get the serial number of this MFC
+		Makes the command to read the serial number
 		'''
 
-		#initialize the uart bus
-		# self.initUart()
-
 		#define command
 		# from Axetris data sheet:
 		#	0x61 = read variable
 		#	0x00 = serial number
-		cmd = [0x61, 0x00]
-
-		#calculate checksum by adding up all the values inside the command array
-		chksum = sum(cmd)
-
-		#add checksum to the command array
-		cmd.extend([chksum % 256])
-
-		#now send command to read serial number
-		self.myUart.write(bytearray(cmd))
-
-		#----------------------------------------------------------------------#
-		# USE STATIC RESPONSE
-
-		#statically wait for response and read
-		sleep(0.02) #50 milliseconds
-
-		i1 = self.myUart.read()
+		return self._withChecksum([0x61, 0x00])
 
-		sleep(0.02) #another 20 milliseconds
-		#----------------------------------------------------------------------#
+	#function to convert serial number response
+	def _serialNumberValue(self, i1: bytes) -> int:
+		'''
+		Converts the serial number response to int
+		'''
 
 		#convert output hex to int
-		k = (i1[1]*256 + i1[2])
-
-		#print output to browser window
-		print(self.name,'Serial Number:',k)
+		return (i1[1]*256 + i1[2])
 
-	#define function to set flow rate
-	def setFlow(self, flow: float):
+	#command to set flow
+	def _setFlowCmd(self, flow: float) -> list:
 		'''
-		Set the MFC flow rate, in ccm
+		Makes the command to set the flow rate, in sccm
 		'''
-		
-		#initialize the uart bus
-		# self.initUart()
-
-		#get write command in the correct form
 
 		#calculate flow value in sccm using Axetris data sheet (Sec. 7.2)
 		c1 = 65535
@@ -209,28 +455,16 @@ class MFC:
 		cmd = [0x62, 0x14]
 		cmd.extend(val) #add inputted value to command
 
-		#calculate checksum by adding up all the values inside the command array
-		chksum = sum(cmd)
-
-		#add checksum to the command array
-		cmd.extend([chksum % 256])
-
-		#now send command to set flow
-		self.myUart.write(bytearray(cmd))
-
-		#----------------------------------------------------------------------#
-		# USE STATIC RESPONSE
+		return self._withChecksum(cmd)
 
-		#statically wait for response and read
-		sleep(0.02) #50 milliseconds
-
-		i1 = self.myUart.read()
-
-		sleep(0.02) #another 20 milliseconds
-		#----------------------------------------------------------------------#
+	#function to check set flow response
+	def _printSetFlow(self, i1: bytes, flow: float):
+		'''
+		Prints whether or not the set flow command succeeded
+		'''
 
-		#now check if the sent back request, indicating success
-		if i1 is not None and i1[0] == (0x62):
+		#a checked reply to the write command means success
+		if i1 is not None:
 
 			#decode outputted value
 			# Qset_sccm = str(i1.decode())
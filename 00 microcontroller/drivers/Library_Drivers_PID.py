@@ -6,9 +6,8 @@
 File to make a driver for controlling Autonics PID controller
 '''
 
-from time import sleep
-from machine import Pin
-from umodbus import ModbusRTU
+from time import ticks_ms, ticks_diff
+from umodbus import get_bus
 
 #set global constants (i.e., coil and register values)
 
@@ -29,6 +28,9 @@ _IREG_HEATING_MV = 1004
 _IREG_COOLING_MV = 1005
 _IREG_PER_CH = 6
 
+#a block read of the input registers is reused for this long (ms)
+_BLOCK_MAX_AGE = 100
+
 #holding registers
 
 #MONITORING GROUP
@@ -126,11 +128,167 @@ dict(zip(
 	range(0,22,2)
 	))
 
+#controllers made so far, by (bus, id)
+_controllers = {}
+
+class PIDController:
+	'''
+	Makes a PID controller class instance (all channels of one controller),
+	which reads the input registers of every channel in use in one
+	transaction and hands the values out to each channel's PID instance
+	'''
+
+	def __init__(self, modbus, id):
+		'''
+		Initialize the class
+
+		Attributes
+		----------
+		myModbus : ModbusRTU
+			The modbus connection of the controller
+
+		id : int
+			The RS-485 ID value
+
+		channels : dict
+			PID instance of each channel in use, by channel number
+
+		reads : int
+			Number of block reads made
+		'''
+
+		#set attributes
+		self.myModbus = modbus
+		self.id = id
+		self.channels = {}
+		self.reads = 0
+
+		#ticks_ms of the last block read (None if stale)
+		self.__readAt = None
+
+	#function to add a channel
+	def addChannel(self, pid):
+		'''
+		Adds the PID instance of a channel
+		'''
+		self.channels[pid.ch] = pid
+
+	#function to get the block of registers to read
+	def _block(self):
+		'''
+		Gets the first address and number of input registers spanning every
+		channel in use
+		'''
+		first = min(self.channels)
+		last = max(self.channels)
+
+		return (
+			_IREG_CURRENT_TEMP + _IREG_PER_CH * (first - 1),
+			_IREG_PER_CH * (last - first + 1)
+			)
+
+	#function to hand the values out to the channels
+	def _decode(self, regs):
+		'''
+		Sets the current temperature, setpoint and heating/cooling MV of each
+		channel from a block read
+		'''
+		first = min(self.channels)
+
+		for ch, pid in self.channels.items():
+			i = _IREG_PER_CH * (ch - first)
+
+			T = regs[i]
+			setT = regs[i + _IREG_CURRENT_SET_TEMP - _IREG_CURRENT_TEMP]
+
+			#if decimals, divide by 10
+			if pid.decimal:
+				T /= 10
+				setT /= 10
+
+			pid.T = T
+			pid.setT = setT
+
+			#MV is in 0.1 %
+			pid.heatingMV = regs[i + _IREG_HEATING_MV - _IREG_CURRENT_TEMP] / 10
+			pid.coolingMV = regs[i + _IREG_COOLING_MV - _IREG_CURRENT_TEMP] / 10
+
+		self.reads += 1
+
+	#function to tell whether the last block read can be reused
+	def _fresh(self, maxAge):
+		'''
+		Tells whether the last block read is less than maxAge ms old
+		'''
+		return self.__readAt is not None and \
+			ticks_diff(ticks_ms(), self.__readAt) < maxAge
+
+	#function to read all channels
+	def refresh(self, maxAge = _BLOCK_MAX_AGE):
+		'''
+		Reads all channels in one transaction, unless the last read is less
+		than maxAge ms old
+
+		Parameters
+		----------
+		maxAge : int
+			Age in ms up to which the last read is reused
+		'''
+
+		if self._fresh(maxAge):
+			return
+
+		addr, count = self._block()
+
+		self._decode(self.myModbus.read_input_registers(
+			self.id, 
+			addr, 
+			count, 
+			signed = True
+			))
+
+		self.__readAt = ticks_ms()
+
+	#async variant of refresh
+	async def refreshAsync(self, maxAge = _BLOCK_MAX_AGE):
+		'''
+		Async variant of refresh (used by the asyncio runtime)
+		'''
+
+		if self._fresh(maxAge):
+			return
+
+		addr, count = self._block()
+
+		self._decode(await self.myModbus.read_input_registers_async(
+			self.id, 
+			addr, 
+			count, 
+			signed = True
+			))
+
+		self.__readAt = ticks_ms()
+
+	#function to force the next read
+	def invalidate(self):
+		'''
+		Makes the next refresh read the controller (e.g. after a setpoint
+		write)
+		'''
+		self.__readAt = None
+
+
 class PID:
 	'''
 	Makes a PID class instance (controls a single channel)
 	'''
 
+	#argument types of the public methods (checked by the parser)
+	_signatures = {
+		"setTemp": (("T", float),),
+		"setRampRate": (("R", float),),
+		}
+
 	def __init__(
 		self, 
 		decimal: bool = True, 
@@ -176,6 +334,17 @@ class PID:
 
 		TUnit : str
 			The temperature units to use, either "C" or "F". Defaults to "C".
+
+		controller : PIDController
+			Reads all channels of this controller at once; shared by every PID
+			instance with the same bus and id
+
+		lock : asyncio.Lock
+			Lock of the modbus bus (held for the whole of each transaction;
+			in the asyncio runtime, sync methods are called with it held)
+
+		T, setT, heatingMV, coolingMV : float
+			Values from the last block read of the controller
 		'''
 
 		#set attributes
@@ -193,29 +362,39 @@ class PID:
 		self.tUnit = tUnit
 		self.TUnit = TUnit
 
-		#save ModbusRTU attribute
-		self.myModbus = ModbusRTU(
+		#save ModbusRTU attribute (one per bus, shared by every channel and
+		# controller on it)
+		self.myModbus = get_bus(
 			self.bus, #given ID value
+			self.pinTx, #UART0 Tx (on LIP board from Philip)
+			self.pinRx, #UART0 Rx (on LIP board from Philip)
 			baudrate = self.baud, #should be 9600, from Autonics manual
-			tx = Pin(self.pinTx), #UART0 Tx (on LIP board from Philip)
-			rx = Pin(self.pinRx), #UART0 Rx (on LIP board from Philip)
 			bits = 8, #8 bits per character(from Autonics manual)
 			parity = None, #no partiy (from Autonics manual)
 			stop = 2, #number of stop bits (from Autonics manual)
 			)
 
-		#flag initial run status
-		self.__flagRunning = not self.myModbus.read_coils(
-			self.id,
-			_COIL_RUN_STOP + _COIL_PER_CH * (self.ch - 1),
-			1
-			)[0]
+		self.lock = self.myModbus.lock
+
+		#share one controller per bus and id, which reads all channels at once
+		self.controller = _controllers.get((self.bus, self.id))
+
+		if self.controller is None:
+			self.controller = PIDController(self.myModbus, self.id)
+			_controllers[(self.bus, self.id)] = self.controller
+
+		self.controller.addChannel(self)
 
-		#setup units
-		self._setup_units()
+		self.T = None
+		self.setT = None
+		self.heatingMV = None
+		self.coolingMV = None
 
-		#initialize sensor type
-		self._set_sensor()
+		#run status is read the first time it is needed (see _running)
+		self.__flagRunning = None
+
+		#setup units and sensor type (writing only what differs)
+		self._configure()
 
 	#define function to autotune
 	def autoTune(self):
@@ -224,7 +403,7 @@ class PID:
 		'''
 		
 		#if running, raise error
-		if not self.__flagRunning:
+		if not self._running():
 			raise AttributeError(
 				f'{self.name} must be running to auto tune; start run first!'
 				)
@@ -265,7 +444,7 @@ class PID:
 		'''
 
 		#if running, raise error
-		if not self.__flagRunning:
+		if not self._running():
 			raise AttributeError(
 				f'{self.name} is not running, cannot be autotuning'
 				)
@@ -296,27 +475,17 @@ class PID:
 	def getTemp(self):
 		'''
 		Gets the current temperature, in whatever units are stored in the PID
-		'''
-
-		#get the register address
-		addr = _IREG_CURRENT_TEMP + _IREG_PER_CH * (self.ch - 1)
 
-		#read the register
-		T = self.myModbus.read_input_registers(
-			self.id, 
-			addr, 
-			1, 
-			signed = True
-			)[0]
-
-		#sleep a few ms
-		sleep(0.005)
+		Returns
+		-------
+		T : float
+			The current temperature (echoed to the desktop by the task manager)
+		'''
 
-		#if decimals, divide by 10
-		if self.decimal:
-			T /= 10
+		#read all channels of the controller (or reuse a recent read)
+		self.controller.refresh()
 
-		print(T)
+		return self.T
 
 	#define a function to get the setpoint temperature
 	def getSetTemp(self):
@@ -324,25 +493,26 @@ class PID:
 		Gets the setpint temperature, in whatever units are stored in the PID
 		'''
 
-		#get the register address
-		addr = _IREG_CURRENT_SET_TEMP + _IREG_PER_CH * (self.ch - 1)
+		#read all channels of the controller (or reuse a recent read)
+		self.controller.refresh()
 
-		#read the register
-		T = self.myModbus.read_input_registers(
-			self.id, 
-			addr, 
-			1, 
-			signed = True
-			)[0]
+		print(self.name, 'setpoint T:', self.setT, self.TUnit)
 
-		#sleep a few ms
-		sleep(0.005)
+	#define a function to get the heating and cooling MV
+	def getMV(self):
+		'''
+		Gets the heating and cooling manipulated values, in %
 
-		#if decimals, divide by 10
-		if self.decimal:
-			T /= 10
+		Returns
+		-------
+		MV : list
+			[heating MV, cooling MV]
+		'''
+
+		#read all channels of the controller (or reuse a recent read)
+		self.controller.refresh()
 
-		print(self.name, 'setpoint T:', T, self.TUnit)
+		return [self.heatingMV, self.coolingMV]
 
 	#define function to set temperature
 	def setTemp(self, T: int):
@@ -374,8 +544,8 @@ class PID:
 			value,
 			signed = True)
 		
-		#sleep a few ms
-		sleep(0.005)
+		#the next read has to show the new setpoint
+		self.controller.invalidate()
 
 		#raise error if failed
 		if not success:
@@ -402,9 +572,6 @@ class PID:
 			signed = True
 			)[0]
 
-		#sleep a few ms
-		sleep(0.005)
-
 		#if decimals, divide by 10 (I THINK I NEED TO DO THIS??)
 		if self.decimal:
 			R /= 10
@@ -440,9 +607,6 @@ class PID:
 			value,
 			signed = True)
 
-		#sleep a few ms
-		sleep(0.005)
-
 		#raise error if failed
 		if not success:
 			raise ValueError(f'{self.name} write to register failed')
@@ -465,7 +629,7 @@ class PID:
 		addr = _COIL_RUN_STOP + _COIL_PER_CH * (self.ch - 1)
 
 		#if not running, start run
-		if not self.__flagRunning:
+		if not self._running():
 
 			#write to coil to start run
 			success = self.myModbus.write_single_coil(
@@ -503,7 +667,7 @@ class PID:
 		addr = _COIL_RUN_STOP + _COIL_PER_CH * (self.ch - 1)
 
 		#if running, stop run
-		if self.__flagRunning:
+		if self._running():
 
 			#write to coil to start run
 			success = self.myModbus.write_single_coil(
@@ -552,10 +716,230 @@ class PID:
 
 		print(self.name,'Hardware and software versions:',versions)
 
-	#function to set thing sup and make sure units are correct
-	def _setup_units(self):
+	#----------------#
+	# ASYNC VARIANTS #
+	#----------------#
+
+	#async variant of getTemp
+	async def getTempAsync(self):
+		'''
+		Async variant of getTemp (used by the asyncio runtime)
+		'''
+
+		#read all channels of the controller (or reuse a recent read)
+		await self.controller.refreshAsync()
+
+		return self.T
+
+	#async variant of getSetTemp
+	async def getSetTempAsync(self):
+		'''
+		Async variant of getSetTemp (used by the asyncio runtime)
+		'''
+
+		#read all channels of the controller (or reuse a recent read)
+		await self.controller.refreshAsync()
+
+		print(self.name, 'setpoint T:', self.setT, self.TUnit)
+
+	#async variant of getMV
+	async def getMVAsync(self):
+		'''
+		Async variant of getMV (used by the asyncio runtime)
+		'''
+
+		#read all channels of the controller (or reuse a recent read)
+		await self.controller.refreshAsync()
+
+		return [self.heatingMV, self.coolingMV]
+
+	#async variant of setTemp
+	async def setTempAsync(self, T: int):
+		'''
+		Async variant of setTemp (used by the asyncio runtime)
+		'''
+
+		#get the right address
+		addr = _HREG_CURRENT_SET_TEMP + _HREG_PER_CH * (self.ch - 1)
+
+		#get the value in right format
+		if self.decimal:
+			value = int(T)*10
+
+		else:
+			value = int(T)
+
+		#write to register to set setpoint T
+		success = await self.myModbus.write_single_register_async(
+			self.id, 
+			addr, 
+			value,
+			signed = True)
+		
+		#the next read has to show the new setpoint
+		self.controller.invalidate()
+
+		#raise error if failed
+		if not success:
+			raise ValueError(f'{self.name} write to register failed')
+
+		else:
+			#print success message
+			print(self.name, 'setpoint T set to:', T, self.TUnit)
+
+	#async variant of getRampRate
+	async def getRampRateAsync(self):
+		'''
+		Async variant of getRampRate (used by the asyncio runtime)
+		'''
+
+		#get the register address
+		addr = _HREG_RAMP_UP_RATE + _HREG_PER_CH * (self.ch - 1)
+
+		#read the register
+		R = (await self.myModbus.read_holding_registers_async(
+			self.id, 
+			addr, 
+			1, 
+			signed = True
+			))[0]
+
+		#if decimals, divide by 10
+		if self.decimal:
+			R /= 10
+
+		print(self.name, 'ramp rate:', R, self.TUnit, 'per', self.tUnit)
+
+	#async variant of setRampRate
+	async def setRampRateAsync(self, R: int):
+		'''
+		Async variant of setRampRate (used by the asyncio runtime)
+		'''
+
+		#get the right address
+		addr = _HREG_RAMP_UP_RATE + _HREG_PER_CH * (self.ch - 1)
+
+		#get the value in right format
+		if self.decimal:
+			value = int(R)*10
+
+		else:
+			value = int(R)
+
+		#write to register to set setpoint T
+		success = await self.myModbus.write_single_register_async(
+			self.id, 
+			addr, 
+			value,
+			signed = True)
+
+		#raise error if failed
+		if not success:
+			raise ValueError(f'{self.name} write to register failed')
+
+		else:
+			#print success message
+			print(
+				self.name, 'ramp rate set to:', R, self.TUnit, 'per', self.tUnit
+				)
+
+	#function to get the run status
+	def _running(self):
 		'''
-		Sets up the time and temperature units for the PID controller
+		Tells whether the channel is running, reading the run/stop coil the
+		first time it is asked
+		'''
+
+		if self.__flagRunning is None:
+			self.__flagRunning = not self.myModbus.read_coils(
+				self.id,
+				_COIL_RUN_STOP + _COIL_PER_CH * (self.ch - 1),
+				1
+				)[0]
+
+		return self.__flagRunning
+
+	#function to write one or more contiguous holding registers
+	def _write_registers(self, addr, values):
+		'''
+		Writes contiguous holding registers, in one transaction
+		'''
+
+		if len(values) == 1:
+			success = self.myModbus.write_single_register(
+				self.id,
+				addr,
+				values[0],
+				signed = False
+				)
+
+		else:
+			success = self.myModbus.write_multiple_registers(
+				self.id,
+				addr,
+				values,
+				signed = False
+				)
+
+		#raise error if failed
+		if not success:
+			raise ValueError(
+				f'{self.name} write to register failed'
+				)
+
+	#function to make the unit and sensor registers match the object
+	def _configure(self):
+		'''
+		Reads the ramp time unit, sensor type and temperature unit registers
+		and writes only those that differ from the object's settings (sensor
+		type and temperature unit are next to each other, so they go in one
+		write). Saves boot time, and saves the controller's memory from a
+		rewrite of the same values on every boot.
+		'''
+		tRegVal, TRegVal = self._unit_values()
+		sensor = self._sensor_value()
+
+		#ramp time unit
+		addr = _HREG_RAMP_TIME_UNIT + _HREG_PER_CH * (self.ch - 1)
+
+		current = self.myModbus.read_holding_registers(
+			self.id,
+			addr,
+			1,
+			signed = False
+			)
+
+		if current[0] != tRegVal:
+			self._write_registers(addr, [tRegVal])
+
+		#sensor type and temperature unit
+		addr = _HREG_INPUT_TYPE + _HREG_PER_CH * (self.ch - 1)
+		wanted = [sensor, TRegVal]
+
+		current = self.myModbus.read_holding_registers(
+			self.id,
+			addr,
+			2,
+			signed = False
+			)
+
+		differ = [i for i in range(2) if current[i] != wanted[i]]
+
+		if differ:
+			self._write_registers(
+				addr + differ[0], 
+				wanted[differ[0]:differ[-1] + 1]
+				)
+
+	#function to make sure units are correct and get their register values
+	def _unit_values(self):
+		'''
+		Checks the time and temperature units for the PID controller
+
+		Returns
+		-------
+		regVals : tuple
+			Register values of the ramp time unit and the temperature unit
 		'''
 
 		#make sure attributes are correct, and get appropriate register value
@@ -587,30 +971,17 @@ class PID:
 				f'{self.name} temp unit must be "C" or "F"'
 				)
 
-		#get the corresponding register numbers
-		tRegAddr = _HREG_RAMP_TIME_UNIT + _HREG_PER_CH * (self.ch - 1)
-		TRegAddr = _HREG_TEMP_UNIT + _HREG_PER_CH * (self.ch - 1)
-
-		#now write the holding registers
-		for addr, value in zip([tRegAddr, TRegAddr],[tRegVal, TRegVal]):
-
-			success = self.myModbus.write_single_register(
-				self.id,
-				addr,
-				value,
-				signed = False
-				)
-
-			#raise error if failed
-			if not success:
-				raise ValueError(
-					f'{self.name} write to register failed'
-					)
+		return tRegVal, TRegVal
 
-	#function to set sensor type
-	def _set_sensor(self):
+	#function to get the sensor type register value
+	def _sensor_value(self):
 		'''
-		Sets the sensor type (thermocouple or pT100) and sig figs
+		Checks the sensor type (thermocouple or pT100) and sig figs
+
+		Returns
+		-------
+		value : int
+			Register value of the sensor type
 		'''
 
 		#make sure sensor type is allowed
@@ -628,18 +999,4 @@ class PID:
 				f'{self.name} type {self.type} cannot print degree decimals'
 				)
 
-		#write value to register and check read-back
-		addr = _HREG_INPUT_TYPE + _HREG_PER_CH * (self.ch - 1)
-
-		success = self.myModbus.write_single_register(
-			self.id,
-			addr,
-			value,
-			signed = False
-			)
-
-		#raise error if failed
-		if not success:
-			raise ValueError(
-				f'{self.name} write to register failed'
-				)
+		return value
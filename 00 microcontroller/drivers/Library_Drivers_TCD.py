@@ -6,10 +6,31 @@
 File to make a driver for reading LIP custom-built TCD.
 '''
 
+from machine import I2C
+
+from Library_scheduler import myScheduler
+from Library_filter import ringFilter, STALE_PERIODS
+
+#MCP3422 conversions per second at each resolution
+_RATES = {
+	12: 240,
+	14: 60,
+	16: 15,
+	18: 3.75,
+	}
+
+#ready bit of the config byte (cleared when a new conversion is in)
+_NOT_READY = 0x80
+
 class TCD:
 	'''
 	Makes a TCD class instance
 	'''
+
+	#argument types of the public methods (checked by the parser)
+	_signatures = {
+		"getSignal": (("how", str, None),),
+		}
 	
 	def __init__(self, i2c: I2C, **kwargs):
 		'''
@@ -36,6 +57,15 @@ class TCD:
 		
 		gain : int
 			The signal gain to use. Can be: 1, 2, 4, or 8. Defaults to 1.
+
+		oversample : int
+			Number of signals to keep in a ring buffer, sampled in the
+			background as each conversion comes in; 0 (default) reads one
+			sample per query instead
+
+		filter : str
+			Filter applied to the buffer when no filter is asked for (see
+			Library_filter.py); defaults to "mean"
 		'''
 		
 		#set attributes
@@ -76,22 +106,96 @@ class TCD:
 		
 		#now write this to the ADC
 		self.i2c.writeto(self.adr, bytes([val]))
+
+		#define the size of the bytearray to read into (depends on bits), with
+		# the config byte (holding the ready bit) at the end
+		if self.bits > 15:
+			self._res = bytearray(4)
+		
+		else:
+			self._res = bytearray(3)
+
+		#oversample in the background
+		self.oversample = int(kwargs.get("oversample", 0))
+		self.filter = kwargs.get("filter", "mean")
+		self.samples = None
+
+		if self.oversample > 0:
+
+			#if sampling stops, read directly once the samples are a few
+			# conversions old
+			self.samples = ringFilter(
+				self.oversample,
+				maxAge = int(STALE_PERIODS * 1000 / _RATES[self.bits])
+				)
+
+			#check twice per conversion so none are missed
+			myScheduler.every(
+				max(1, int(500 / _RATES[self.bits])),
+				self._sample,
+				name = self.name + " sample"
+				)
 	
 	#define function to read output
-	def getSignal(self):
+	def getSignal(self, how = None):
 		'''
-		Reads TCD signal and prints the result, in microvolts.
+		Reads TCD signal, in microvolts.
+
+		Parameters
+		----------
+		how : str or None
+			Filter to apply to the oversampled signals, e.g. "median" or
+			"mean 10" (see Library_filter.py); defaults to the configured
+			filter. Ignored if the TCD is not oversampled.
+
+		Returns
+		-------
+		sig_uv : float
+			The signal, in microvolts (echoed to the desktop by the task
+			manager)
+		'''
+		sig_uv = self._filtered(how)
+
+		if sig_uv is None:
+			sig_uv = self._signal(self._read())
+
+		return sig_uv
+
+	#function to take one background sample
+	def _sample(self):
+		'''
+		Adds the signal to the ring buffer if a new conversion is in (run by
+		the scheduler)
+		'''
+		res = self._read()
+
+		if not res[-1] & _NOT_READY:
+			self.samples.add(self._signal(res))
+
+	#function to get the filtered signal
+	def _filtered(self, how: str) -> float:
+		'''
+		Gets the filtered signal, or None if there are no recent samples
+		'''
+		if self.samples is None:
+			return None
+
+		return self.samples.get(how or self.filter)
+
+	#function to read the ADC output
+	def _read(self) -> bytearray:
+		'''
+		Reads the output bytes and the config byte
+		'''
+		self.i2c.readfrom_into(self.adr, self._res)
+
+		return self._res
+
+	#function to convert the output bytes to a signal
+	def _signal(self, res: bytearray) -> float:
+		'''
+		Converts the output bytes to the signal, in microvolts
 		'''
-		
-		#first define the size of the bytearray to write to (depends on bits)
-		if self.bits > 15:
-			res = bytearray(3)
-		
-		else:
-			res = bytearray(2)
-		
-		#read current value and write into res
-		self.i2c.readfrom_into(self.adr, res)
 		
 		#now parse result (depends on bits)
 		# This was taken from Lukas' code, assumign it's written in the MCP3442 
@@ -144,5 +248,5 @@ class TCD:
 		else:
 			raise ValueError('Invalid bits: {self.bits}. Must be 12, 14, 16, 18')
 		
-		print(sig_uv)
+		return sig_uv
 
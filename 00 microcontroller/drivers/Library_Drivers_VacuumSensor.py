@@ -7,12 +7,17 @@ File to make a driver for reading Pfeiffer Pirani vacuum gauge (goes through an
 analog to digitcal converter)
 '''
 
+import asyncio
 import struct
-import time
 
+from time import sleep_us, ticks_us, ticks_diff
 from machine import I2C
 from micropython import const
 
+from Library_scheduler import myScheduler
+from Library_filter import ringFilter, STALE_PERIODS
+from Library_profiler import myProfiler
+
 #set global voltage divider resistors (in connector gland)
 _R1 = 5.6 #kO
 _R2 = 3.3 #kO
@@ -58,6 +63,12 @@ _ADS1115_CONFIG_DR = {
 _DATA_RATE = 128
 _SINGLE = 0x0100
 
+#conversions can run up to 10% slow (internal oscillator tolerance)
+_RATE_TOLERANCE = 1.1
+
+#round-robin values older than this many scan cycles are read directly
+_SCAN_MAX_AGE = 4
+
 
 class VacuumSensor:
 	'''
@@ -67,6 +78,12 @@ class VacuumSensor:
 	Channel 1 = vacuum
 	'''
 
+	#argument types of the public methods (checked by the parser)
+	_signatures = {
+		"getVacuum": (("how", str, None),),
+		"getVoltage": (("pin", int, 0),),
+		}
+
 	def __init__(self, i2c: I2C, **kwargs):
 		'''
 		Initializes the class
@@ -85,6 +102,25 @@ class VacuumSensor:
 		gain : int
 			The signal gain to use. Can be: 2/3 (enter: 23), 1, 2, 4, 8, or 16. 
 			Defaults to 1.
+
+		mode : str
+			ADC conversion mode, "single" (default) or "continuous"
+
+		dataRate : int
+			Samples per second: 8, 16, 32, 64, 128 (default), 250, 475 or 860
+
+		channels : list
+			Pins to cycle through in continuous mode, e.g. [0, 1]; defaults
+			to [0] (the vacuum gauge)
+
+		oversample : int
+			Number of gauge voltages to keep in a ring buffer, sampled in the
+			background (as fast as the ADC converts in continuous mode); 0
+			(default) reads one sample per query instead
+
+		filter : str
+			Filter applied to the buffer when no filter is asked for (see
+			Library_filter.py); defaults to "mean"
 		'''
 
 		#set attributes
@@ -93,18 +129,148 @@ class VacuumSensor:
 		#make and initialize an ADS1115 class instance
 		self.ads = ADS1115(i2c, **kwargs)
 
+		#lock of the ADC (held for the whole of each transaction, see
+		# ADS1115.read)
+		self.lock = self.ads.lock
+
 		#make analog in instances for each channel
 		# vac = 2
 		self.vacuumChannel = AnalogIn(self.ads, self.ads.P0)
 
+		#cycle through several channels in the background
+		if self.ads.scanning:
+			myScheduler.every(
+				self.ads.scanPeriod(),
+				self.ads.scan,
+				name = self.name + " scan"
+				)
+
+		#oversample the gauge in the background
+		self.oversample = int(kwargs.get("oversample", 0))
+		self.filter = kwargs.get("filter", "mean")
+		self.samples = None
+
+		#whether a sample is waiting for an async read to finish
+		self.__waiting = False
+
+		if self.oversample > 0:
+
+			#one sample per new conversion; single shot conversions block,
+			# so leave time for everything else in between
+			period = self.ads.scanPeriod()
+
+			if self.ads.scanning:
+				period *= len(self.ads.channels)
+
+			elif not self.ads.continuous:
+				period *= 10
+
+			#if sampling stops, read directly once the samples go stale
+			self.samples = ringFilter(
+				self.oversample,
+				maxAge = STALE_PERIODS * period
+				)
+
+			myScheduler.every(period, self._sample, name = self.name + " sample")
+
 	#function to get vacuum
-	def getVacuum(self):
+	def getVacuum(self, how = None):
 		'''
 		Gets the current vacuum, in mbar
+
+		Parameters
+		----------
+		how : str or None
+			Filter to apply to the oversampled voltages, e.g. "median" or
+			"mean 10" (see Library_filter.py); defaults to the configured
+			filter. Ignored if the gauge is not oversampled.
+
+		Returns
+		-------
+		P : float
+			The pressure, in mbar (echoed to the desktop by the task manager)
 		'''
 		
 		#get voltage as float
-		V = self.vacuumChannel.voltage
+		V = self._filtered(how)
+
+		if V is None:
+			V = self.vacuumChannel.voltage
+
+		return self._pressure(V)
+
+	#async variant of getVacuum
+	async def getVacuumAsync(self, how = None):
+		'''
+		Async variant of getVacuum (used by the asyncio runtime)
+		'''
+		V = self._filtered(how)
+
+		if V is None:
+			V = await self.vacuumChannel.voltageAsync()
+
+		return self._pressure(V)
+
+	#function to take one background sample
+	def _sample(self):
+		'''
+		Adds the gauge voltage to the ring buffer (run by the scheduler)
+		'''
+
+		#an async read has the ADC (asyncio runtime), so queue behind it
+		if self.lock.locked():
+			if not self.__waiting:
+				self.__waiting = True
+				asyncio.create_task(self._sampleAsync())
+
+			return
+
+		self.samples.add(self.vacuumChannel.voltage)
+
+	#async variant of _sample
+	async def _sampleAsync(self):
+		'''
+		Adds the gauge voltage to the ring buffer once the ADC is free
+		'''
+		try:
+			self.samples.add(await self.vacuumChannel.voltageAsync())
+
+		finally:
+			self.__waiting = False
+
+	#function to get the filtered voltage
+	def _filtered(self, how: str) -> float:
+		'''
+		Gets the filtered gauge voltage, or None if there are no recent
+		samples
+		'''
+		if self.samples is None:
+			return None
+
+		return self.samples.get(how or self.filter)
+
+	#function to get the voltage on any pin
+	def getVoltage(self, pin = 0):
+		'''
+		Gets the voltage on an ADC pin, in volts
+
+		Parameters
+		----------
+		pin : int
+			The pin to read, ranges from 0 to 3 (0 is the vacuum gauge)
+
+		Returns
+		-------
+		V : float
+			The voltage on the pin
+		'''
+		return AnalogIn(self.ads, int(pin)).voltage
+
+	#function to convert voltage to pressure
+	def _pressure(self, V: float) -> float:
+		'''
+		Converts the ADC voltage to pressure, in mbar
+		'''
 
 		#get V back to original value (used resistance voltage divider for ADC)
 		U = V * ((_R1 + _R2)/_R2)
@@ -113,8 +279,7 @@ class VacuumSensor:
 		C = 5.5
 		P = 10**(U - C)
 
-		#print result
-		print(P)
+		return P
 
 
 class AnalogIn:
@@ -122,7 +287,7 @@ class AnalogIn:
 	Class for reading the analog input values
 	'''
 
-	def __init__(self, ads: ADS1115, pin: int):
+	def __init__(self, ads: 'ADS1115', pin: int):
 		'''
 		Initializes the AnalogIn class
 
@@ -171,6 +336,15 @@ class AnalogIn:
 
 		return V
 
+	#async variant of voltage
+	async def voltageAsync(self) -> float:
+		'''
+		Async variant of the voltage property (used by the asyncio runtime)
+		'''
+		val = await self._ads.readAsync(self._pin) << (16 - self._ads.bits)
+
+		return val * _ADS1X15_PGA_RANGE[self._ads.gain] / 32767
+
 
 class ADS1115:
 	'''
@@ -191,12 +365,27 @@ class ADS1115:
 
 		gain : int
 			The signal gain to use. Can be: 2/3, 1, 2, 4, 8, or 16. 
+
+		mode : str
+			"single" (default) starts a conversion for every read and waits
+			for it; "continuous" keeps converting, so a read only fetches the
+			latest result
+
+		dataRate : int
+			Samples per second: 8, 16, 32, 64, 128 (default), 250, 475 or 860
+
+		channels : list
+			Pins to cycle through (round-robin) in continuous mode; defaults
+			to [0]
 		'''
 
 		#set attributes
 		self.adr = int(kwargs["adr"], 0)
 		self.i2c = i2c
 		self.gain = int(kwargs["gain"])
+		self.dataRate = int(kwargs.get("dataRate", _DATA_RATE))
+		self.continuous = kwargs.get("mode", "single") == "continuous"
+		self.channels = [int(c) for c in kwargs.get("channels", [0])]
 
 		#set the pin integers
 		self.P0 = 0
@@ -211,10 +400,41 @@ class ADS1115:
 		self.buf = bytearray(3)
 		self.singlebyte = bytearray(1)
 
-	#function to take a reading
-	def read(self, pin: int) -> int:
+		#time one conversion takes, in us
+		self._conv_us = int(1000000 * _RATE_TOLERANCE / self.dataRate)
+
+		#register the pointer is set to (None until the first transaction)
+		self._pointer = None
+
+		#pin being converted in continuous mode, and when it was selected
+		self._mux = None
+		self._selected = 0
+
+		#latest round-robin value of each pin, and when it was read
+		self.latest = [None] * 4
+		self.latestTime = [0] * 4
+
+		#only cycle through pins in continuous mode
+		self.scanning = self.continuous and len(self.channels) > 1
+
+		#held for the whole of each transaction; async reads take it
+		# themselves, and in the asyncio runtime sync ones are called with it
+		# held (see Library_asyncRuntime.py)
+		self.lock = asyncio.Lock()
+
+		#True while an async read is in progress, and whether a scan step is
+		# waiting for one to finish
+		self._asyncBusy = False
+		self._scanWaiting = False
+
+		#start converting straight away
+		if self.continuous:
+			self._select(self.channels[0])
+
+	#function to make the config register value
+	def _config(self, pin: int) -> int:
 		'''
-		Takes a reading on the given pin
+		Makes the config register value for reading a pin
 
 		Parameters
 		----------
@@ -223,39 +443,223 @@ class ADS1115:
 
 		Returns
 		-------
-		val : int
-			The resulting value
+		config : int
+			The config register value
 		'''
 
 		#not differential, so add 0x04 (from adafruit library)
 		pin = pin + 0x04
 
 		#set configuration state (copying from adafruit library)
-		config = _ADS1X15_CONFIG_OS_SINGLE
-		config |= (pin & 0x07) << _ADS1X15_CONFIG_MUX_OFFSET
+		config = (pin & 0x07) << _ADS1X15_CONFIG_MUX_OFFSET
 		config |= _ADS1X15_CONFIG_GAIN[self.gain]
-		config |= _SINGLE
-		config |= _ADS1115_CONFIG_DR[_DATA_RATE]
+		config |= _ADS1115_CONFIG_DR[self.dataRate]
 		config |= _ADS1X15_CONFIG_COMP_QUE_DISABLE
 
-		#write to register and wait
-		self._write_register(_ADS1X15_POINTER_CONFIG, config)
-		
-		#check if busy and, if so, wait
-		while not self._read_register(_ADS1X15_POINTER_CONFIG) & 0X8000:
-			pass
+		#start a single conversion
+		if not self.continuous:
+			config |= _ADS1X15_CONFIG_OS_SINGLE | _SINGLE
+
+		return config
+
+	#function to select the pin converted in continuous mode
+	def _select(self, pin: int):
+		'''
+		Points the continuous conversions at a pin (if they are not already)
+		'''
+		if self._mux != pin:
+			self._write_register(_ADS1X15_POINTER_CONFIG, self._config(pin))
+			self._mux = pin
+			self._selected = ticks_us()
+
+	#function to get the time until a conversion is in
+	def _remaining(self) -> int:
+		'''
+		Gets the time until the first conversion on the selected pin is in, in
+		us (0 once it is)
+		'''
+		return max(0, self._conv_us - ticks_diff(ticks_us(), self._selected))
+
+	#function to get the round-robin period
+	def scanPeriod(self) -> int:
+		'''
+		Gets the time between scan steps (one conversion), in ms
+		'''
+		return max(1, (self._conv_us + 999) // 1000)
+
+	#function to take one round-robin step
+	def scan(self):
+		'''
+		Stores the conversion of the selected pin and moves on to the next pin
+		in the channel list (run every scanPeriod by the scheduler)
+		'''
+
+		#conversion not in yet
+		if self._remaining() > 0:
+			return
+
+		#an async read has the ADC (asyncio runtime), so queue behind it
+		if self.lock.locked():
+			if not self._scanWaiting:
+				self._scanWaiting = True
+				asyncio.create_task(self._scanAsync())
+
+			return
+
+		self._step()
+
+	#async variant of scan
+	async def _scanAsync(self):
+		'''
+		Takes the round-robin step once the ADC is free
+		'''
+		try:
+			async with self.lock:
+				if self._remaining() == 0:
+					self._step()
+
+		finally:
+			self._scanWaiting = False
+
+	#function to store a conversion and select the next pin
+	def _step(self):
+		'''
+		Stores the conversion of the selected pin and selects the next one
+		'''
+		self.latest[self._mux] = self._conversion()
+		self.latestTime[self._mux] = ticks_us()
+
+		#(a direct read may have moved off the channel list)
+		if self._mux in self.channels:
+			i = self.channels.index(self._mux) + 1
+
+		else:
+			i = 0
+
+		self._select(self.channels[i % len(self.channels)])
+
+	#function to get a recent round-robin value
+	def _scanned(self, pin: int):
+		'''
+		Gets the latest round-robin value of a pin, or None if the pin is not
+		being scanned or the value is stale
+		'''
+		if not self.scanning or self.latest[pin] is None:
+			return None
+
+		maxAge = _SCAN_MAX_AGE * len(self.channels) * self.scanPeriod() * 1000
+
+		if ticks_diff(ticks_us(), self.latestTime[pin]) > maxAge:
+			return None
+
+		return self.latest[pin]
+
+	#function to take a reading
+	def read(self, pin: int) -> int:
+		'''
+		Takes a reading on the given pin. In continuous mode, this is a single
+		fetch of the conversion register once the first conversion is in.
+
+		Parameters
+		----------
+		pin : int
+			The pin to read, ranges from 0 to 3
+
+		Returns
+		-------
+		val : int
+			The resulting value
+		'''
+
+		#a sync read can only cut into a suspended async one if it was called
+		# without holding the lock
+		if self._asyncBusy:
+			raise OSError(
+				f'ADS1115 0x{self.adr:02X} sync read made without the lock'
+				)
+
+		val = self._scanned(pin)
 
-		#alternatively, just wait 0.015 seconds
-		#time.sleep(0.015)
+		if val is not None:
+			return val
 
-		#read back result
-		res = self._read_register(_ADS1X15_POINTER_CONVERSION)
+		start = ticks_us()
 
-		#convert to voltage and return
-		val = self._conversion_value(res)
+		if self.continuous:
+			self._select(pin)
+			sleep_us(self._remaining())
+
+		else:
+			#write to register and wait out the conversion
+			self._write_register(_ADS1X15_POINTER_CONFIG, self._config(pin))
+			sleep_us(self._conv_us)
+			
+			#check if still busy and, if so, wait
+			while not self._read_register(_ADS1X15_POINTER_CONFIG) & 0X8000:
+				sleep_us(self._conv_us // 10)
+
+		#time spent waiting on the bus (for the conversion)
+		myProfiler.addWait(ticks_diff(ticks_us(), start))
+
+		return self._conversion()
+
+	#async variant of read
+	async def readAsync(self, pin: int) -> int:
+		'''
+		Async variant of read; lets other coroutines run during the conversion
+		'''
+		val = self._scanned(pin)
+
+		if val is not None:
+			return val
+
+		start = ticks_us()
+
+		async with self.lock:
+			self._asyncBusy = True
+
+			try:
+				val = await self._convertAsync(pin)
+
+			finally:
+				self._asyncBusy = False
+
+		#time spent waiting on the bus (for the lock and the conversion)
+		myProfiler.addWait(ticks_diff(ticks_us(), start))
 
 		return val
 
+	#function to convert a pin without blocking other coroutines
+	async def _convertAsync(self, pin: int) -> int:
+		'''
+		Converts a pin and reads the result, sleeping via asyncio while the
+		ADC converts (the lock is held by readAsync)
+		'''
+		if self.continuous:
+			self._select(pin)
+			await asyncio.sleep_ms((self._remaining() + 999) // 1000)
+
+			return self._conversion()
+
+		#write to register and wait out the conversion
+		self._write_register(_ADS1X15_POINTER_CONFIG, self._config(pin))
+		await asyncio.sleep_ms(self.scanPeriod())
+		
+		#check if still busy and, if so, wait
+		while not self._read_register(_ADS1X15_POINTER_CONFIG) & 0X8000:
+			await asyncio.sleep_ms(1)
+
+		return self._conversion()
+
+	#function to read the conversion register
+	def _conversion(self) -> int:
+		'''
+		Reads the latest conversion result
+		'''
+		return self._conversion_value(
+			self._read_register(_ADS1X15_POINTER_CONVERSION)
+			)
+
 	#helper function to read into the register
 	def _read_register(self, reg: int) -> int:
 		'''
@@ -272,12 +676,11 @@ class ADS1115:
 			The readback value
 		'''
 
-		#set the byte
-		self.singlebyte[0] = reg
-
-		#write it to the thermocouple board
-		self.i2c.writeto(self.adr, self.singlebyte)
-		time.sleep(0.008)
+		#set the pointer (only if it has moved)
+		if self._pointer != reg:
+			self.singlebyte[0] = reg
+			self.i2c.writeto(self.adr, self.singlebyte)
+			self._pointer = reg
 
 		#read back result and return
 		self.i2c.readfrom_into(self.adr, self.buf)
@@ -305,6 +708,7 @@ class ADS1115:
 
 		#then write
 		self.i2c.writeto(self.adr, self.buf)
+		self._pointer = reg
 
 
 	#conversion function
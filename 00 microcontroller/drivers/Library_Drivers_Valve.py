@@ -61,8 +61,13 @@ class Valve:
 
 		0 = closed
 		1 = open
+
+		Returns
+		-------
+		pos : int
+			The position (echoed to the desktop by the task manager)
 		'''
 
 		sleep(0.001)
 
-		print(self.valve.value())
+		return self.valve.value()
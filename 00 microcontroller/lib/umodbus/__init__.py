@@ -11,4 +11,4 @@ __version__ = '0.0.1'
 __author__ = 'Jordon D. Hemingway'
 
 #import classes
-from . serial import ModbusRTU
\ No newline at end of file
+from . serial import ModbusRTU, get_bus
\ No newline at end of file
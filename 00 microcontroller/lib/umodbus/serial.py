@@ -7,11 +7,66 @@ Jordon D Hemingway
 '''
 
 from machine import Pin, UART
+import asyncio
 import struct
 import time
 
 from . import const
 
+#shared bus instances and their settings, by UART id
+_buses = {}
+
+#called with the time (us) each transaction spent waiting on the bus: for the
+# lock, the inter-frame gap and the reply (set by the firmware's profiler)
+wait_hook = None
+
+#function to get the shared instance of a bus
+def get_bus(bus: int, pinTx: int, pinRx: int, **kwargs):
+	'''
+	Gets the one ModbusRTU instance of a UART bus, making it on first use, so
+	every device on the bus shares its UART (and its lock)
+
+	Parameters
+	----------
+	bus : int
+		The UART bus to use for communication
+
+	pinTx : int
+		The UART Tx pin number
+
+	pinRx : int
+		The UART Rx pin number
+
+	kwargs : dict
+		Any other ModbusRTU settings (baudrate, bits, stop, parity, timeout)
+
+	Returns
+	-------
+	modbus : ModbusRTU
+		The shared instance
+
+	Raises
+	------
+	ValueError
+		If the bus is already in use with different settings
+	'''
+	settings = (pinTx, pinRx, sorted(kwargs.items()))
+
+	#make it the first time
+	if bus not in _buses:
+		modbus = ModbusRTU(bus, tx = Pin(pinTx), rx = Pin(pinRx), **kwargs)
+		_buses[bus] = (modbus, settings)
+
+		return modbus
+
+	modbus, known = _buses[bus]
+
+	#devices on one bus have to agree on how it is set up
+	if known != settings:
+		raise ValueError(f'UART{bus} is already set up with other settings')
+
+	return modbus
+
 #make the modbus RTU serial class
 class ModbusRTU(object):
 	'''
@@ -27,6 +82,7 @@ class ModbusRTU(object):
 		bits: int = 8,
 		stop: int = 8,
 		parity: int = None,
+		timeout: int = 2000,
 		):
 		'''
 		Initializes the class
@@ -53,6 +109,9 @@ class ModbusRTU(object):
 
 		parity : None or int
 			The parity to use, defaults to None
+
+		timeout : int
+			Time to wait for a response, in ms, defaults to 2000
 		'''
 
 		#initialize the uart bus connection
@@ -66,6 +125,33 @@ class ModbusRTU(object):
 			parity = parity,
 			)
 
+		#time per character (start, data, parity and stop bits), in us
+		self._char_us = (1 + bits + (parity is not None) + stop) * \
+			1000000 // baudrate
+
+		#modbus 3.5 character inter-frame gap; fixed above 19200 baud
+		if baudrate > 19200:
+			self._t35_us = 1750
+
+		else:
+			self._t35_us = 7 * self._char_us // 2
+
+		self._timeout_ms = timeout
+
+		#held for the whole of each transaction; waiting coroutines queue on
+		# it in order. Async transactions take it themselves; in the asyncio
+		# runtime, sync ones are called with it held (see
+		# Library_asyncRuntime.py), so they wait their turn too
+		self.lock = asyncio.Lock()
+
+		#True while an async transaction is in progress (it may be suspended
+		# partway through, waiting for the reply)
+		self._async_busy = False
+
+		#ticks_us when the bus last went quiet (end of last frame sent or
+		# received)
+		self._idle_since = time.ticks_us()
+
 	#define function to read coils
 	def read_coils(
 		self, 
@@ -520,6 +606,177 @@ class ModbusRTU(object):
 
 		return op_status
 
+	#----------------#
+	# ASYNC VARIANTS #
+	#----------------#
+
+	#define async function to read coils
+	async def read_coils_async(
+		self, 
+		slave_id: int, 
+		starting_addr: int, 
+		count: int) -> list:
+		'''
+		Async variant of read_coils; yields to other coroutines while waiting
+		for the slave to respond
+		'''
+
+		#first check coil count is okay
+		if not (1 <= count <= 2000):
+			raise ValueError('invalid number of coils')
+
+		#the get modbus_pdu
+		modbus_pdu = struct.pack(
+			'>BHH', 
+			const.READ_COILS, 
+			starting_addr, 
+			count
+			)
+
+		#get response data
+		resp_data = await self._send_receive_async(modbus_pdu, slave_id, True)
+
+		#convert byte to boolean string and drop empty bits
+		coil_value = self._bytes_to_bool(resp_data)
+
+		return coil_value[:count]
+
+	#define async function to read input registers
+	async def read_input_registers_async(
+		self, 
+		slave_id: int, 
+		starting_addr: int, 
+		count: int,
+		signed: bool = True) -> list:
+		'''
+		Async variant of read_input_registers; yields to other coroutines while
+		waiting for the slave to respond
+		'''
+
+		#first check register count is okay
+		if not (1 <= count <= 125):
+			raise ValueError('invalid number of input registers')
+
+		#get the modbus pdu
+		modbus_pdu = struct.pack(
+			'>BHH', 
+			const.READ_INPUT_REGISTERS,
+			starting_addr,
+			count
+			)
+
+		#get response data
+		resp_data = await self._send_receive_async(modbus_pdu, slave_id, True)
+
+		return self._to_short(resp_data, signed = signed)
+
+	#define async function to read holding resgisters
+	async def read_holding_registers_async(
+		self, 
+		slave_id: int, 
+		starting_addr: int, 
+		count: int,
+		signed: bool = True) -> list:
+		'''
+		Async variant of read_holding_registers; yields to other coroutines 
+		while waiting for the slave to respond
+		'''
+
+		#first check register count is okay
+		if not (1 <= count <= 125):
+			raise ValueError('invalid number of holding registers')
+
+		#get the modbus pdu
+		modbus_pdu = struct.pack(
+			'>BHH', 
+			const.READ_HOLDING_REGISTERS,
+			starting_addr,
+			count
+			)
+
+		#get response data
+		resp_data = await self._send_receive_async(modbus_pdu, slave_id, True)
+
+		return self._to_short(resp_data, signed = signed)
+
+	#define async function to write single coil
+	async def write_single_coil_async(
+		self, 
+		slave_id: int, 
+		output_addr: int, 
+		output_value: bool) -> bool:
+		'''
+		Async variant of write_single_coil; yields to other coroutines while
+		waiting for the slave to respond
+		'''
+
+		#check if value is okay and get to hex
+		if output_value is False:
+			val = 0x0000
+
+		elif output_value is True:
+			val = 0xFF00
+
+		else:
+			raise ValueError('illegal coil value')
+
+		#get the modbus pdu
+		modbus_pdu = struct.pack(
+			'>BHH',
+			const.WRITE_SINGLE_COIL, 
+			output_addr, 
+			val
+			)
+
+		#get response data
+		resp_data = await self._send_receive_async(modbus_pdu, slave_id, False)
+
+		#confirm response data checks out
+		return self._validate_resp_data(
+			resp_data,
+			const.WRITE_SINGLE_COIL,
+			output_addr,
+			value = val,
+			count = None,
+			signed = False
+			)
+
+	#define async function to write single holding register
+	async def write_single_register_async(
+		self, 
+		slave_id: int, 
+		output_addr: int, 
+		output_value: int,
+		signed: bool = True) -> bool:
+		'''
+		Async variant of write_single_register; yields to other coroutines 
+		while waiting for the slave to respond
+		'''
+
+		#get right format
+		fmt = 'h' if signed else 'H'
+
+		#get the modbus pdu
+		modbus_pdu = struct.pack(
+			'>BH'+fmt,
+			const.WRITE_SINGLE_REGISTER, 
+			output_addr, 
+			output_value
+			)
+
+		#get response data
+		resp_data = await self._send_receive_async(modbus_pdu, slave_id, False)
+
+		#confirm response data checks out
+		return self._validate_resp_data(
+			resp_data,
+			const.WRITE_SINGLE_REGISTER,
+			output_addr,
+			value = output_value,
+			count = None,
+			signed = signed
+			)
+
 	#------------------#
 	# HELPER FUNCTIONS #
 	#------------------#
@@ -575,6 +832,38 @@ class ModbusRTU(object):
 
 		return crc16
 
+	#function to get the length of a response from its first bytes
+	def _expected_len(self, resp: bytearray) -> int:
+		'''
+		Works out the full length of a response from its function code (and
+		byte count, for reads)
+
+		Parameters
+		----------
+		resp : bytearray
+			Array of response bytes received so far
+
+		Returns
+		-------
+		expected_len : int or None
+			Length of the whole response, or None if too few bytes are in to
+			tell
+		'''
+
+		if len(resp) < 2:
+			return None
+
+		if resp[1] >= const.ERROR_BIAS:
+			return const.ERROR_RESP_LEN
+		
+		if (const.READ_COILS <= resp[1] <= const.READ_INPUT_REGISTERS):
+			if len(resp) < 3:
+				return None
+
+			return const.RESPONSE_HDR_LENGTH + 1 + resp[2] + const.CRC_LENGTH
+		
+		return const.FIXED_RESP_LEN
+
 	#function to decide whether or not to exit read loop
 	def _exit_read(self, resp: bytearray) -> bool:
 		'''
@@ -590,25 +879,70 @@ class ModbusRTU(object):
 		exit : bool
 			Yes or no to exit
 		'''
+		expected_len = self._expected_len(resp)
 
-		if resp[1] >= const.ERROR_BIAS:
-			if len(resp) < const.ERROR_RESP_LEN:
-				return False
-		
-		elif (const.READ_COILS <= resp[1] <= const.READ_INPUT_REGISTERS):
-			expected_len = const.RESPONSE_HDR_LENGTH + 1 + resp[2] + const.CRC_LENGTH
-			if len(resp) < expected_len:
-				return False
-		
-		elif len(resp) < const.FIXED_RESP_LEN:
-			return False
+		return expected_len is not None and len(resp) >= expected_len
+
+	#function to get how long to wait before the next uart poll
+	def _read_wait(self, resp: bytearray, backoff: int) -> int:
+		'''
+		Gets how long to wait before looking at the uart again: about as long
+		as the missing bytes take to arrive if the length is known, or the
+		current backoff otherwise
+
+		Parameters
+		----------
+		resp : bytearray
+			Array of response bytes received so far
+
+		backoff : int
+			Current backoff, in us
+
+		Returns
+		-------
+		wait : int
+			Time to wait, in us
+		'''
+		expected_len = self._expected_len(resp)
+
+		if expected_len is None:
+			return backoff
+
+		return max(self._char_us, (expected_len - len(resp)) * self._char_us)
+
+	#function to wait out the inter-frame gap before sending
+	def _wait_gap(self):
+		'''
+		Waits until the bus has been quiet for 3.5 characters
+
+		Returns
+		-------
+		waited : int
+			Time waited, in us
+		'''
+		quiet = time.ticks_diff(time.ticks_us(), self._idle_since)
 
-		return True
+		if quiet < self._t35_us:
+			time.sleep_us(self._t35_us - quiet)
+
+			return self._t35_us - quiet
+
+		return 0
+
+	#function to report time spent waiting on the bus
+	def _report_wait(self, us: int):
+		'''
+		Hands the time a transaction waited on the bus to wait_hook, if set
+		'''
+		if wait_hook is not None:
+			wait_hook(us)
 
 	#function to read from uart
 	def _uart_read(self) -> bytearray:
 		'''
-		Reads from the uart bus
+		Reads from the uart bus until the whole response is in (its length is
+		known from the function code), the slave goes quiet for 3.5 characters
+		partway through a response, or the timeout runs out
 
 		Returns
 		-------
@@ -618,20 +952,77 @@ class ModbusRTU(object):
 
 		#pre-define
 		resp = bytearray()
+		start = time.ticks_ms()
+		last = time.ticks_us()
+		backoff = self._char_us
 
 		#loop through and read
-		for x in range(1, 40):
+		while time.ticks_diff(time.ticks_ms(), start) < self._timeout_ms:
 
 			#append if anything to read
 			if self._uart.any():
 				resp.extend(self._uart.read())
+				last = time.ticks_us()
 
 				# variable length function codes may require multiple reads
 				if self._exit_read(resp):
 					break
 
-			#sleep before next iteration
-			time.sleep(0.05)
+			#a gap inside a response ends it
+			elif resp and \
+				time.ticks_diff(time.ticks_us(), last) > self._t35_us:
+				break
+
+			#wait for the missing bytes, backing off while there are none
+			time.sleep_us(self._read_wait(resp, backoff))
+			backoff = min(2 * backoff, 8000)
+
+		self._idle_since = time.ticks_us()
+
+		return resp
+
+	#function to read from uart without blocking other coroutines
+	async def _uart_read_async(self) -> bytearray:
+		'''
+		Async variant of _uart_read; sleeps via asyncio between polls (so
+		waits are rounded up to whole ms)
+
+		Returns
+		-------
+		resp : bytearray
+			Array of bytes read from the slave
+		'''
+
+		#pre-define
+		resp = bytearray()
+		start = time.ticks_ms()
+		last = time.ticks_us()
+		backoff = self._char_us
+
+		#loop through and read
+		while time.ticks_diff(time.ticks_ms(), start) < self._timeout_ms:
+
+			#append if anything to read
+			if self._uart.any():
+				resp.extend(self._uart.read())
+				last = time.ticks_us()
+
+				# variable length function codes may require multiple reads
+				if self._exit_read(resp):
+					break
+
+			#a gap inside a response ends it
+			elif resp and \
+				time.ticks_diff(time.ticks_us(), last) > self._t35_us:
+				break
+
+			#let other coroutines run while waiting for the missing bytes
+			await asyncio.sleep_ms(
+				(self._read_wait(resp, backoff) + 999) // 1000
+				)
+			backoff = min(2 * backoff, 8000)
+
+		self._idle_since = time.ticks_us()
 
 		return resp
 
@@ -647,6 +1038,11 @@ class ModbusRTU(object):
 
 		slave_id : int
 			The ID value of the slave device
+
+		Returns
+		-------
+		waited : int
+			Time spent waiting out the inter-frame gap, in us
 		'''
 		
 		#define byte array
@@ -658,8 +1054,18 @@ class ModbusRTU(object):
 		crc = self._calculate_crc16(serial_pdu)
 		serial_pdu.extend(crc)
 
-		#now write to uart
+		#keep the 3.5 character gap since the last frame
+		waited = self._wait_gap()
+
+		#now write to uart (write returns before the bytes are out, so the
+		# bus goes quiet once they have been clocked out)
 		self._uart.write(serial_pdu)
+		self._idle_since = time.ticks_add(
+			time.ticks_us(),
+			len(serial_pdu) * self._char_us
+			)
+
+		return waited
 
 	#define send-receive helper function
 	def _send_receive(
@@ -686,20 +1092,64 @@ class ModbusRTU(object):
 		res : bytearray
 			Bytearray of resulting data
 		'''
+
+		#a sync transaction can only cut into a suspended async one if it was
+		# called without holding the bus lock
+		if self._async_busy:
+			raise OSError('modbus sync transaction made without the bus lock')
 		
 		#flush the Rx FIFO
 		self._uart.read()
 
 		#send data
-		self._send(modbus_pdu, slave_id)
+		waited = self._send(modbus_pdu, slave_id)
 
 		#readback data
-		res = self._validate_resp_hdr(
-			self._uart_read(),
-			slave_id,
-			modbus_pdu[0],
-			ct
-			)
+		start = time.ticks_us()
+		resp = self._uart_read()
+		self._report_wait(waited + time.ticks_diff(time.ticks_us(), start))
+
+		res = self._validate_resp_hdr(resp, slave_id, modbus_pdu[0], ct)
+
+		return res
+
+	#define async send-receive helper function
+	async def _send_receive_async(
+		self, 
+		modbus_pdu: bytes, 
+		slave_id: int, 
+		ct: bool) -> bytearray:
+		'''
+		Async variant of _send_receive; holds the bus lock throughout, so
+		transactions from different coroutines go one after the other
+		'''
+
+		start = time.ticks_us()
+
+		async with self.lock:
+			self._async_busy = True
+
+			#time spent waiting for the lock
+			waited = time.ticks_diff(time.ticks_us(), start)
+
+			try:
+				#flush the Rx FIFO
+				self._uart.read()
+
+				#send data
+				waited += self._send(modbus_pdu, slave_id)
+
+				#readback data
+				start = time.ticks_us()
+				resp = await self._uart_read_async()
+				waited += time.ticks_diff(time.ticks_us(), start)
+
+			finally:
+				self._async_busy = False
+
+		self._report_wait(waited)
+
+		res = self._validate_resp_hdr(resp, slave_id, modbus_pdu[0], ct)
 
 		return res
 
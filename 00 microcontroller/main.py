@@ -11,28 +11,49 @@ def main():
     available devices.
     '''
 
-    from time import time
+    from Library_ComSet import settings
+
+    #run as asyncio coroutines if asked to (see Library_asyncRuntime.py)
+    if settings.get("runtime") == "asyncio":
+        from Library_asyncRuntime import myRuntime
+        myRuntime.run()
+        return
 
     from Library_Communicate import myCom
-    from Library_ComSet import deviceList, settings
+    from Library_ComSet import deviceList
     from Library_taskManager import myTM
-    from Library_parser import parser
+    from Library_parser import parser, makeTable
+    from Library_scheduler import myScheduler
 
-    while True:
+    #periods are stored in seconds; the scheduler works in ms
+    commPeriod = int(settings["CommReadOutPeriod"] * 1000)
+    tmPeriod = int(settings["TMPeriod"] * 1000)
 
-        if time() >= myCom.getLastExecution() + settings["CommReadOutPeriod"]:
-            message_list = myCom.read()
-            command_list = parser(messageList=message_list, deviceList=deviceList)
-            myTM.addTask(command_list)
+    #build the dispatch table once, now that every device is in the list
+    table = makeTable(deviceList)
+
+    #job to execute the queued tasks (each task reports its own errors)
+    def doTasks():
+        myTM.doTasks()
 
-        if time() >= myTM.getLastExecution() + settings["TMPeriod"]:
+        #come back on the next pass until every bus queue is drained
+        if myTM.getPending() > 0:
+            myScheduler.after(0, doTasks, name="tasks")
 
-            #add some error handling!
-            try:
-                myTM.doTasks()
+    #job to read and parse incoming messages
+    def readComm():
+        message_list = myCom.read()
+        command_list = parser(messageList=message_list, deviceList=deviceList,
+                              table=table)
+
+        #only wake the task manager when there is something to do
+        if len(command_list) > 0:
+            myTM.addTask(command_list)
+            myScheduler.after(tmPeriod, doTasks, name="tasks")
 
-            except:
-                pass
+    #poll for messages periodically and sleep until the next deadline
+    myScheduler.every(commPeriod, readComm, name="comm")
+    myScheduler.run()
 
 if __name__ == "__main__":
 
@@ -0,0 +1,201 @@
+# machine.py (simulation)
+
+'''
+Stand-in for the MicroPython "machine" module when running the firmware under
+CPython. Pins, UARTs and I2C buses are wired to the behavioral models in
+models.py instead of real hardware.
+'''
+
+from models import uartPorts, i2cBuses
+
+class Pin:
+	'''
+	Simulated GPIO pin
+	'''
+
+	IN = 0
+	OUT = 1
+	OPEN_DRAIN = 2
+	PULL_UP = 1
+	PULL_DOWN = 2
+
+	#pin levels are shared between all instances on the same pin number
+	_levels = {}
+
+	def __init__(self, id, mode = -1, pull = -1, value = None):
+		'''
+		Initialize the pin
+		'''
+		self.id = id
+		self.mode = mode
+
+		if value is not None:
+			Pin._levels[id] = int(bool(value))
+
+		else:
+			Pin._levels.setdefault(id, 0)
+
+	def value(self, x = None):
+		'''
+		Gets or sets the pin level
+		'''
+		if x is None:
+			return Pin._levels[self.id]
+
+		Pin._levels[self.id] = int(bool(x))
+
+	def __call__(self, x = None):
+		return self.value(x)
+
+	def high(self):
+		self.value(1)
+
+	def low(self):
+		self.value(0)
+
+	def on(self):
+		self.value(1)
+
+	def off(self):
+		self.value(0)
+
+	def toggle(self):
+		self.value(1 - self.value())
+
+	def __repr__(self):
+		return 'Pin(%s)' % self.id
+
+
+class UART:
+	'''
+	Simulated UART; bytes written go to the model attached to the bus id and
+	its replies show up in the receive buffer after a realistic delay
+	'''
+
+	def __init__(self, id, baudrate = 115200, bits = 8, parity = None, 
+		stop = 1, tx = None, rx = None, timeout = 0, timeout_char = 0, 
+		**kwargs):
+		'''
+		Initialize the UART
+		'''
+		self.id = id
+		self.baudrate = baudrate
+		self.bits = bits
+		self.parity = parity
+		self.stop = stop
+		self.timeout = timeout
+		self.timeout_char = timeout_char
+
+		#get the port (raises if nothing is wired to this bus)
+		try:
+			self._port = uartPorts[id]
+
+		except KeyError:
+			raise ValueError('UART(%s) does not exist' % id)
+
+		#re-initializing a uart on the pico flushes its rx fifo
+		self._port.configure(self)
+
+	def init(self, baudrate = None, **kwargs):
+		'''
+		Re-initialize the UART
+		'''
+		if baudrate is not None:
+			self.baudrate = baudrate
+
+		for k, v in kwargs.items():
+			setattr(self, k, v)
+
+		self._port.configure(self)
+
+	def write(self, buf):
+		'''
+		Writes bytes to the attached model
+		'''
+		return self._port.write(bytes(buf))
+
+	def any(self):
+		'''
+		Number of bytes waiting in the receive buffer
+		'''
+		return self._port.any()
+
+	def read(self, nbytes = None):
+		'''
+		Reads from the receive buffer; honours the uart timeout
+		'''
+		return self._port.read(nbytes, self.timeout)
+
+	def readinto(self, buf, nbytes = None):
+		'''
+		Reads into a buffer; returns the number of bytes read or None
+		'''
+		n = len(buf) if nbytes is None else nbytes
+		data = self.read(n)
+
+		if data is None:
+			return None
+
+		buf[0:len(data)] = data
+		return len(data)
+
+	def flush(self):
+		pass
+
+	def txdone(self):
+		return True
+
+
+class I2C:
+	'''
+	Simulated I2C bus
+	'''
+
+	def __init__(self, id, scl = None, sda = None, freq = 400000, **kwargs):
+		'''
+		Initialize the bus
+		'''
+		self.id = id
+		self.freq = freq
+
+		try:
+			self._devices = i2cBuses[id]
+
+		except KeyError:
+			raise ValueError('I2C(%s) does not exist' % id)
+
+	def _device(self, addr):
+		'''
+		Gets the model at the address (EIO if nothing answers, like the pico)
+		'''
+		try:
+			return self._devices[addr]
+
+		except KeyError:
+			raise OSError(5)
+
+	def scan(self):
+		return sorted(self._devices)
+
+	def writeto(self, addr, buf, stop = True):
+		self._device(addr).write(bytes(buf), self.freq)
+		return 1
+
+	def readfrom_into(self, addr, buf, stop = True):
+		data = self._device(addr).read(len(buf), self.freq)
+		buf[0:len(buf)] = data
+
+	def readfrom(self, addr, nbytes, stop = True):
+		return self._device(addr).read(nbytes, self.freq)
+
+
+def freq(*args):
+	return 125000000
+
+
+def reset():
+	raise SystemExit
+
+
+def unique_id():
+	return b'\x00\x00\x00\x00\x00\x00\x00\x01'
@@ -0,0 +1,18 @@
+# micropython.py (simulation)
+
+'''
+Stand-in for the MicroPython "micropython" module when running the firmware
+under CPython
+'''
+
+#const() is a compile-time hint on the pico; here it is just the identity
+def const(value):
+	return value
+
+#keyboard interrupt character (ignored here)
+def kbd_intr(chr):
+	pass
+
+#memory info (ignored here)
+def mem_info(*args):
+	pass
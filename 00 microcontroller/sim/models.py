@@ -0,0 +1,525 @@
+# models.py (simulation)
+
+'''
+Behavioral models of the hardware on the vacuum line controller board, used by
+the simulated machine module. Each model answers the same wire protocol as the
+real device, with response latencies taken from the data sheets.
+'''
+
+import math
+import random
+import struct
+import time
+
+#------------------#
+# HELPER FUNCTIONS #
+#------------------#
+
+#function to get a monotonic time in seconds
+def _now():
+	return time.monotonic()
+
+#modbus crc16 (same polynomial as the table in umodbus/const.py)
+def _crc16(data):
+	crc = 0xFFFF
+
+	for char in data:
+		crc ^= char
+
+		for _ in range(8):
+			if crc & 1:
+				crc = (crc >> 1) ^ 0xA001
+
+			else:
+				crc >>= 1
+
+	return struct.pack('<H', crc)
+
+#function to sleep for the time a transfer takes on the wire
+def _wire(nbytes, bitsPerByte, rate):
+	time.sleep(nbytes * bitsPerByte / rate)
+
+
+#------------#
+# UART PORTS #
+#------------#
+
+class UARTPort:
+	'''
+	One physical UART on the pico, with a receive buffer that is filled by the
+	model attached to it
+	'''
+
+	def __init__(self, model):
+		'''
+		Initialize the port
+
+		Parameters
+		----------
+		model : object
+			Model with a respond(request) method returning (latency, reply)
+		'''
+		self.model = model
+		self.baudrate = 9600
+		self.charBits = 10
+		self._rx = []
+
+	def configure(self, uart):
+		'''
+		Re-configures the port (flushes the receive buffer, like the pico)
+		'''
+		self.baudrate = uart.baudrate
+		self.charBits = 1 + uart.bits + (uart.parity is not None) + uart.stop
+		self._rx = []
+		self.model.inits += 1
+
+	def write(self, data):
+		'''
+		Sends a request to the model and queues the reply
+		'''
+		charTime = self.charBits / self.baudrate
+		txDone = _now() + len(data) * charTime
+
+		latency, reply = self.model.respond(data)
+
+		#queue each reply byte with its arrival time
+		t = txDone + latency
+
+		for b in reply:
+			t += charTime
+			self._rx.append((t, b))
+
+		return len(data)
+
+	def any(self):
+		'''
+		Bytes that have arrived so far
+		'''
+		now = _now()
+		n = 0
+
+		for t, b in self._rx:
+			if t > now:
+				break
+			n += 1
+
+		return n
+
+	def read(self, nbytes, timeout):
+		'''
+		Reads arrived bytes, waiting up to timeout ms for the first one
+		'''
+		deadline = _now() + timeout / 1000
+
+		while self.any() == 0 and _now() < deadline:
+			time.sleep(0.0002)
+
+		n = self.any()
+
+		if nbytes is not None:
+			n = min(n, nbytes)
+
+		if n == 0:
+			return None
+
+		data = bytes(b for t, b in self._rx[:n])
+		del self._rx[:n]
+
+		return data
+
+
+class AutonicsPID:
+	'''
+	Model of one Autonics TM-series multi-channel PID controller (a modbus RTU
+	slave)
+	'''
+
+	def __init__(self, id, channels = 4, ambient = 21.0):
+		'''
+		Initialize the controller
+		'''
+		self.id = id
+		self.channels = channels
+		self.coils = {}
+		self.hregs = {}
+		self.temps = {}
+		self.updated = _now()
+
+		for ch in range(1, channels + 1):
+			#channels start stopped (run/stop coil is True for stop)
+			self.coils[2 * (ch - 1)] = True
+			self.coils[2 * (ch - 1) + 1] = False
+			self.hregs[1000 * (ch - 1)] = int(ambient * 10)
+			self.hregs[1000 * (ch - 1) + 115] = 10
+			self.temps[ch] = ambient
+
+	def _update(self):
+		'''
+		Relaxes running channels towards their setpoint
+		'''
+		now = _now()
+		dt = now - self.updated
+		self.updated = now
+
+		for ch in self.temps:
+			if not self.coils[2 * (ch - 1)]:
+				sv = self.hregs[1000 * (ch - 1)] / 10
+				self.temps[ch] += (sv - self.temps[ch]) * (1 - math.exp(-dt / 30))
+
+	def _ireg(self, addr):
+		'''
+		Gets an input register value
+		'''
+		if addr == 102:
+			return 0x0100
+
+		if addr == 103:
+			return 0x0105
+
+		ch = (addr - 1000) // 6 + 1
+		k = (addr - 1000) % 6
+
+		if addr < 1000 or ch > self.channels:
+			raise KeyError(addr)
+
+		if k == 0:
+			return int(round(self.temps[ch] * 10 + random.gauss(0, 0.5)))
+
+		if k == 3:
+			return self.hregs[1000 * (ch - 1)]
+
+		return 0
+
+	def handle(self, pdu):
+		'''
+		Handles a request pdu and returns the response pdu
+		'''
+		self._update()
+
+		fc = pdu[0]
+
+		try:
+			if fc == 0x01:
+				addr, count = struct.unpack('>HH', pdu[1:5])
+				bits = [self.coils[addr + i] for i in range(count)]
+				data = bytearray((count + 7) // 8)
+
+				for i, b in enumerate(bits):
+					data[i // 8] |= int(b) << (i % 8)
+
+				return bytes([fc, len(data)]) + bytes(data)
+
+			if fc in (0x03, 0x04):
+				addr, count = struct.unpack('>HH', pdu[1:5])
+
+				if fc == 0x03:
+					vals = [self.hregs.get(addr + i, 0) for i in range(count)]
+
+				else:
+					vals = [self._ireg(addr + i) for i in range(count)]
+
+				data = b''.join(struct.pack('>H', v & 0xFFFF) for v in vals)
+
+				return bytes([fc, len(data)]) + data
+
+			if fc == 0x05:
+				addr, val = struct.unpack('>HH', pdu[1:5])
+				self.coils[addr] = (val == 0xFF00)
+
+				return bytes(pdu[:5])
+
+			if fc == 0x06:
+				addr, val = struct.unpack('>Hh', pdu[1:5])
+				self.hregs[addr] = val
+
+				return bytes(pdu[:5])
+
+			if fc == 0x10:
+				addr, count, nb = struct.unpack('>HHB', pdu[1:6])
+				vals = struct.unpack('>' + 'h' * count, pdu[6:6 + nb])
+
+				for i, v in enumerate(vals):
+					self.hregs[addr + i] = v
+
+				return bytes(pdu[:5])
+
+		except KeyError:
+			#illegal data address
+			return bytes([fc | 0x80, 0x02])
+
+		#illegal function
+		return bytes([fc | 0x80, 0x01])
+
+
+class ModbusBus:
+	'''
+	Model of an RS-485 bus with modbus RTU slaves on it
+	'''
+
+	#the Autonics controllers answer a few ms after the request
+	responseTime = 0.004
+
+	def __init__(self, slaves):
+		'''
+		Initialize the bus
+		'''
+		self.slaves = {s.id: s for s in slaves}
+		self.inits = 0
+		self.requests = 0
+
+	def respond(self, request):
+		'''
+		Answers a complete modbus RTU request frame
+		'''
+		self.requests += 1
+
+		#nobody answers a corrupted or unaddressed frame
+		if len(request) < 4 or _crc16(request[:-2]) != request[-2:]:
+			return 0, b''
+
+		slave = self.slaves.get(request[0])
+
+		if slave is None:
+			return 0, b''
+
+		frame = bytes([slave.id]) + slave.handle(request[1:-2])
+
+		return self.responseTime, frame + _crc16(frame)
+
+
+class AxetrisMFC:
+	'''
+	Model of an Axetris MFC 2022 mass flow controller on its own UART
+	'''
+
+	#the MFC answers within a couple of ms
+	responseTime = 0.002
+
+	def __init__(self, serialNumber = 2207, temp = 24.0):
+		'''
+		Initialize the MFC
+		'''
+		self.serialNumber = serialNumber
+		self.temp = temp
+		self.setpoint = 0
+		self.flow = 0.
+		self.updated = _now()
+		self.inits = 0
+		self.requests = 0
+
+	@staticmethod
+	def _reply(cmd, value = None):
+		'''
+		Builds a reply frame: command byte, optional 16 bit value, checksum
+		'''
+		frame = bytes([cmd])
+
+		if value is not None:
+			frame += int(value).to_bytes(2, 'big')
+
+		return frame + bytes([sum(frame) % 256])
+
+	def respond(self, request):
+		'''
+		Answers a command frame
+		'''
+		self.requests += 1
+
+		#relax flow towards the setpoint (setpoint in 1/65535 of full scale)
+		now = _now()
+		dt = now - self.updated
+		self.updated = now
+		target = self.setpoint / 65535 * 10000
+		self.flow += (target - self.flow) * (1 - math.exp(-dt / 0.5))
+
+		cmd = request[0]
+
+		#checksum covers all but the last byte of multi-byte commands
+		if len(request) > 1 and sum(request[:-1]) % 256 != request[-1]:
+			return 0, b''
+
+		if cmd == 0x31:
+			flow = max(0, self.flow + random.gauss(0, 2))
+			return self.responseTime, self._reply(cmd, flow)
+
+		if cmd == 0x61 and len(request) == 3:
+			if request[1] == 0x0F:
+				k = (self.temp * 0.01 + 1 / 6) * 65535
+				return self.responseTime, self._reply(cmd, k)
+
+			if request[1] == 0x00:
+				return self.responseTime, self._reply(cmd, self.serialNumber)
+
+		if cmd == 0x62 and len(request) == 5 and request[1] == 0x14:
+			self.setpoint = int.from_bytes(request[2:4], 'big')
+			return self.responseTime, self._reply(cmd)
+
+		return 0, b''
+
+
+#-----------#
+# I2C MODEL #
+#-----------#
+
+class ADS1115:
+	'''
+	Model of an ADS1115 16 bit ADC with a Pfeiffer Pirani gauge (through the
+	voltage divider in the connector gland) on AIN0
+	'''
+
+	_RATES = (8, 16, 32, 64, 128, 250, 475, 860)
+	_RANGES = (6.144, 4.096, 2.048, 1.024, 0.512, 0.256, 0.256, 0.256)
+
+	def __init__(self, pressure = 2e-2):
+		'''
+		Initialize the ADC
+		'''
+		self.pressure = pressure
+		self.pointer = 0
+		self.config = 0x8583
+		self.conversion = 0
+		self.started = _now()
+		self.transactions = 0
+
+	def _input(self, mux):
+		'''
+		Voltage on the selected input
+		'''
+		if mux == 4:
+			p = self.pressure * (1 + random.gauss(0, 0.01))
+			return (math.log10(p) + 5.5) * 3.3 / (5.6 + 3.3)
+
+		return 0.
+
+	def _convert(self):
+		'''
+		Returns a fresh conversion result for the current config
+		'''
+		mux = (self.config >> 12) & 0x07
+		fs = self._RANGES[(self.config >> 9) & 0x07]
+		code = int(self._input(mux) / fs * 32767)
+
+		return max(-32768, min(32767, code))
+
+	def _period(self):
+		return 1 / self._RATES[(self.config >> 5) & 0x07]
+
+	def _busy(self):
+		'''
+		Tells whether a conversion is in progress
+		'''
+		return _now() - self.started < self._period()
+
+	def write(self, data, freq):
+		'''
+		Handles a write transaction (pointer, or pointer plus register)
+		'''
+		_wire(len(data) + 1, 9, freq)
+		self.transactions += 1
+
+		self.pointer = data[0] & 0x03
+
+		if len(data) == 3 and self.pointer == 1:
+			self.config = (data[1] << 8) | data[2]
+			self.started = _now()
+
+			#clear the os bit while a single shot conversion is running
+			if self.config & 0x0100:
+				self.config &= 0x7FFF
+
+	def read(self, n, freq):
+		'''
+		Handles a read transaction on the current pointer
+		'''
+		_wire(n + 1, 9, freq)
+		self.transactions += 1
+
+		single = self.config & 0x0100
+
+		if single and not self.config & 0x8000 and not self._busy():
+			self.config |= 0x8000
+			self.conversion = self._convert()
+
+		elif not single and not self._busy():
+			self.conversion = self._convert()
+			self.started += self._period() * int(
+				(_now() - self.started) / self._period()
+				)
+
+		if self.pointer == 1:
+			value = self.config
+
+		else:
+			value = self.conversion & 0xFFFF
+
+		data = bytes([value >> 8, value & 0xFF])
+
+		return (data + bytes(n))[:n]
+
+
+class MCP3422:
+	'''
+	Model of the MCP3422 18 bit ADC on the LIP-built TCD
+	'''
+
+	_LSB = {0: 1000, 1: 250, 2: 62.5, 3: 15.625}
+	_RATES = {0: 240, 1: 60, 2: 15, 3: 3.75}
+
+	def __init__(self, signal = 1500.):
+		'''
+		Initialize the ADC (signal in microvolts)
+		'''
+		self.signal = signal
+		self.config = 0x90
+		self.transactions = 0
+		self.lastRead = _now()
+
+	def write(self, data, freq):
+		_wire(len(data) + 1, 9, freq)
+		self.transactions += 1
+		self.config = data[-1]
+
+	def read(self, n, freq):
+		_wire(n + 1, 9, freq)
+		self.transactions += 1
+
+		res = (self.config >> 2) & 0x03
+		code = int((self.signal + random.gauss(0, 20)) / self._LSB[res])
+		code = max(0, code)
+
+		if res == 3:
+			data = bytes([(code >> 16) & 0x01, (code >> 8) & 0xFF, code & 0xFF])
+
+		else:
+			data = bytes([(code >> 8) & 0x7F, code & 0xFF])
+
+		#ready bit is clear if a conversion finished since the last read
+		now = _now()
+		ready = now - self.lastRead >= 1 / self._RATES[res]
+		config = self.config & 0x7F if ready else self.config | 0x80
+
+		if ready:
+			self.lastRead = now
+
+		return (data + bytes([config, config]))[:n]
+
+
+#--------#
+# WIRING #
+#--------#
+
+#the LIP controller board: five PID channels on UART0 (controllers 1 and 2),
+# the MFC on UART1, and the two ADCs on I2C1
+pidControllers = [AutonicsPID(1), AutonicsPID(2)]
+mfc = AxetrisMFC()
+ads1115 = ADS1115()
+mcp3422 = MCP3422()
+
+uartPorts = {
+	0: UARTPort(ModbusBus(pidControllers)),
+	1: UARTPort(mfc),
+	}
+
+i2cBuses = {
+	1: {0x48: ads1115, 0x69: mcp3422},
+	}
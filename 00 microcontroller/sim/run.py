@@ -0,0 +1,129 @@
+# run.py (simulation)
+
+'''
+Runs the pico firmware unmodified under CPython, with the simulated machine
+and micropython modules in place of the real ones. Talk to it on stdin/stdout
+exactly as over the pico's USB serial port, e.g.
+
+	python sim/run.py
+
+Only the "machine" and "micropython" modules and a few MicroPython-only
+functions (time.ticks_*, time.sleep_ms/us and asyncio.sleep_ms) are replaced;
+the firmware and drivers run as they are. The hardware on the board is modelled
+in models.py.
+'''
+
+import asyncio
+import os
+import sys
+import time
+
+#paths: the simulation modules shadow the MicroPython-only ones
+simpth = os.path.dirname(os.path.abspath(__file__))
+fwpth = os.path.dirname(simpth)
+
+#-----------------------------#
+# MICROPYTHON TIME FUNCTIONS  #
+#-----------------------------#
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_HALF = _TICKS_PERIOD // 2
+
+def ticks_ms():
+	return int(time.monotonic_ns() // 1000000) % _TICKS_PERIOD
+
+def ticks_us():
+	return int(time.monotonic_ns() // 1000) % _TICKS_PERIOD
+
+def ticks_add(ticks, delta):
+	return (ticks + delta) % _TICKS_PERIOD
+
+def ticks_diff(ticks1, ticks2):
+	return ((ticks1 - ticks2 + _TICKS_HALF) % _TICKS_PERIOD) - _TICKS_HALF
+
+def sleep_ms(ms):
+	time.sleep(max(0, ms) / 1000)
+
+def sleep_us(us):
+	time.sleep(max(0, us) / 1000000)
+
+async def _async_sleep_ms(ms):
+	await asyncio.sleep(max(0, ms) / 1000)
+
+
+#---------------#
+# RAW USB STDIN #
+#---------------#
+
+class _RawBuffer:
+	'''
+	Unbuffered binary stdin with MicroPython's readinto(buf, nbytes), which
+	blocks until it has nbytes (as the pico's USB serial port does)
+	'''
+
+	def __init__(self, fd):
+		self.raw = open(fd, 'rb', buffering = 0, closefd = False)
+
+	def fileno(self):
+		return self.raw.fileno()
+
+	def read(self, n = -1):
+		return self.raw.read(n)
+
+	def readinto(self, buf, nbytes = None):
+		view = memoryview(buf)[:len(buf) if nbytes is None else nbytes]
+		got = 0
+
+		while got < len(view):
+			n = self.raw.readinto(view[got:])
+
+			if not n:
+				break
+
+			got += n
+
+		return got
+
+class _RawStdin:
+	'''
+	Unbuffered stdin, so select() sees exactly what read() will return (as
+	with the pico's USB serial port)
+	'''
+
+	def __init__(self, fd):
+		self.buffer = _RawBuffer(fd)
+
+	def fileno(self):
+		return self.buffer.fileno()
+
+	def read(self, n = -1):
+		return self.buffer.read(n).decode('utf-8', 'replace')
+
+	def readinto(self, buf, nbytes = None):
+		return self.buffer.readinto(buf, nbytes)
+
+
+#function to set up the environment
+def setup():
+	'''
+	Installs the MicroPython shims and the simulated hardware
+	'''
+	for name in ('ticks_ms', 'ticks_us', 'ticks_add', 'ticks_diff', 
+		'sleep_ms', 'sleep_us'):
+		setattr(time, name, globals()[name])
+
+	asyncio.sleep_ms = _async_sleep_ms
+
+	sys.path[0:0] = [simpth, fwpth, os.path.join(fwpth, 'lib')]
+	os.chdir(fwpth)
+
+	sys.stdin = _RawStdin(sys.stdin.fileno())
+	sys.stdout.reconfigure(line_buffering = True)
+
+
+if __name__ == '__main__':
+
+	setup()
+
+	from main import main
+	main()
@@ -1,6 +1,6 @@
 import numpy as np
 
-import csv
+import json
 import re
 import serial
 import time
@@ -8,8 +8,6 @@ import traceback
 import sys
 import os
 
-from datetime import datetime
-import time
 from time import sleep
 
 from typing import List
@@ -18,6 +16,7 @@ from PyQt5.uic import loadUi
 from PyQt5.QtCore import (
 	QTimer, 
 	QObject, 
+	QThread,
 	QThreadPool,
 	QRunnable, 
 	pyqtSignal,
@@ -26,6 +25,12 @@ from PyQt5.QtCore import (
 
 from PyQt5.QtGui import QIcon
 
+import protocol
+
+from console import Console
+
+from timeseries import TimeSeries
+
 #testing with pyqtgraph
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtCore, QtWidgets, QtGui
@@ -85,6 +90,12 @@ class WidgetMain(QMainWindow):
 		# DIALOG #
 		#========#
 
+		#readback console (capped, with the full history in a log file)
+		self.console = Console(
+			self.readbackBrowser,
+			os.path.join(current_path, 'logs')
+			)
+
 		#clickable buttons
 		self.clearButton.clicked.connect(self.clearDialog)
 		self.disconnectButton.clicked.connect(self.disconnect)
@@ -93,6 +104,7 @@ class WidgetMain(QMainWindow):
 		#connect either by hitting 'connect' or by pressing enter
 		self.connectButton.clicked.connect(self.connect)
 		self.portInput.returnPressed.connect(self.connect)
+		self.baudInput.returnPressed.connect(self.connect)
 
 		#send command either by hitting 'send' or pressing enter
 		self.sendButton.clicked.connect(self.sendCom)
@@ -103,6 +115,11 @@ class WidgetMain(QMainWindow):
 		self.connected = False
 		self.devList = None #make none until connected
 
+		#link speed (set in the baud box when connecting); the pico's own usb
+		# port runs at full usb speed whatever this says, but a usb-uart
+		# adapter in between is held to it
+		self.baudrate = int(self.baudInput.text())
+
 		#===============#
 		# CONFIGURATION #
 		#===============#
@@ -160,6 +177,33 @@ class WidgetMain(QMainWindow):
 		#set the main tab default to "command line"
 		self.mainTabs.setCurrentIndex(0)
 
+		# CONFIGURATION READOUTS #
+		#-------------------------#
+
+		#command to read each readout, and the function that parses its reply
+		self.pollParsers = {
+
+			# FLOW ON/OFF VALVES
+			'valveHeIn getPos': 'updateCheckboxHeIn',
+
+			# SWITCHING VALVES (NOTE: do all through L valve; R is slave)
+			'valveSwitchingLeft getPos': 'updateLabelDTrapping',
+
+			# FLOW RATES
+			'mfcHeIn getFlow': 'updateLabelHeFlow',
+
+			# TEMPERATURES
+			'pidColdFinger getTemp': 'updateLabelCFTemp',
+			'pidDT_R getTemp': 'updateLabelDTRTemp',
+			'pidDT_L getTemp': 'updateLabelDTLTemp',
+			'pidWT1 getTemp': 'updateLabelWT1Temp',
+			'pidWT2 getTemp': 'updateLabelWT2Temp',
+
+			# PASSIVE SENSORS
+			'vacuumSensor getVacuum': 'updateLabelCFVacuum',
+			'tcdGC getSignal': 'updateLabelTCDSignal',
+		}
+
 		# CONFIGURATION LOG TIMERS #
 		#--------------------------#
 
@@ -171,6 +215,30 @@ class WidgetMain(QMainWindow):
 		self.configTimer.setInterval(self.j)
 		self.configTimer.timeout.connect(self.updateConfig)
 
+		# CONFIGURATION STREAM #
+		#----------------------#
+
+		#how readouts are taken, if the firmware supports it: 'stream' (pushed
+		# by the pico), 'binary' (polled with binary frames) or 'text'
+		self.readoutMode = 'stream'
+
+		#if streaming, readouts are pushed at this period (in seconds) 
+		# instead of polled with the config timer
+		self.streamPeriod = 0.1
+		self.streaming = False
+
+		#if the firmware tags its replies, a reader thread takes every line
+		# and routes each reply to its parse function by id, so several
+		# commands can be in flight at once (see sendTagged)
+		self.linkReader = None
+		self.pending = {}
+		self.requestTimeout = 2.0 #seconds
+
+		#if binary, commands and replies go as frames (see protocol.py)
+		self.binary = False
+		self.frameReader = None
+		self.msgid = 0
+
 		#=================#
 		# REAL-TIME PLOTS #
 		#=================#
@@ -208,6 +276,14 @@ class WidgetMain(QMainWindow):
 		self.l.setSpacing(0)
 		self.l.setContentsMargins(0, 0, 0, 0)
 
+		#only draw what is in view, and let pyqtgraph thin out anything still
+		# denser than the pixels (keeping peaks)
+		self.plt.setClipToView(True)
+		self.plt.setDownsampling(auto = True, mode = 'peak')
+
+		#redraw from the right pyramid level when the user pans or zooms
+		self.plt.getViewBox().sigXRangeChanged.connect(self.viewChanged)
+
 
 		#add empty plots to fill later
 		self.plotters = {
@@ -276,14 +352,9 @@ class WidgetMain(QMainWindow):
 		# PLOTTER DATA STORAGE #
 		#----------------------#
 
-		#make empty list for each plotter to add data into
-		for p in self.plotters:
-
-			#add empty list
-			self.plotters[p]['data'] = np.array([])
-
-		#also make empty list for timestamps
-		self.plotTimeStamps = np.array([])
+		#make one store for the timestamps and every plotter's data (grows
+		# in place, see timeseries.py)
+		self.plotData = TimeSeries(self.plotters)
 
 		# PLOT INITIAL STATES #
 		#---------------------#
@@ -331,6 +402,10 @@ class WidgetMain(QMainWindow):
 			if e == QMessageBox.Ok:
 				event.ignore()
 
+		else:
+			#flush and close the console log
+			self.console.close()
+
 	#function to print to dialog browser
 	def print(self, text):
 		'''
@@ -345,21 +420,11 @@ class WidgetMain(QMainWindow):
 		#make sure it's not None (implying not connected)
 		if text is not None:
 
-			#get the existing text
-			t = self.readbackBrowser.toPlainText()
-
-			#add a timestamp
-			now = datetime.now()
-			s = now.strftime("%Y %m %d %H:%M:%S")
-			
-			#add to existing text
-			t += "\n" + s + "\t" + text
-			
-			#send updated text to browser
-			self.readbackBrowser.setPlainText(t)
+			#append with a timestamp (and log to file)
+			self.console.write(text)
 
 	#function for communicating with raspberry pi
-	def read_write(self, cmd, parse = 'print'):
+	def read_write(self, cmd, parse = 'print', timeout = None):
 		'''
 		Basic method by which commands are sent to and read from the raspberry
 		pi pico controller
@@ -372,6 +437,10 @@ class WidgetMain(QMainWindow):
 		parse: string
 			Tells the function how to parse the returned data; must be a string
 			of an attribute of the main window. Defaults to print to browser.
+
+		timeout: float or None
+			Time to wait for the reply, in seconds, for commands that take
+			longer than the connection timeout. Defaults to None.
 		'''
 
 		if self.connected:
@@ -379,8 +448,17 @@ class WidgetMain(QMainWindow):
 			#convert parse string to attribute
 			parseAttr = getattr(self, parse)
 
+			#with tagged replies, just send; the reply finds its way back
+			if self.linkReader is not None:
+				self.sendTagged(cmd, parseAttr, timeout)
+				return
+
 			#link the worker to the execute function
-			w = Worker(self.executeReadWrite, cmd)
+			if self.binary:
+				w = Worker(self.executeRequest, cmd, timeout = timeout)
+
+			else:
+				w = Worker(self.executeReadWrite, cmd, timeout = timeout)
 			w.signals.result.connect(parseAttr)
 
 			#start the thread
@@ -390,7 +468,7 @@ class WidgetMain(QMainWindow):
 			self.print('Not connected')
 
 	#read-write execution function to be called when making the worker
-	def executeReadWrite(self, cmd):
+	def executeReadWrite(self, cmd, timeout = None):
 		'''
 		Executer function sent to the threadpool worker
 
@@ -398,6 +476,10 @@ class WidgetMain(QMainWindow):
 		----------
 		cmd: str
 			String of the command text
+
+		timeout: float or None
+			Time to wait for the reply, in seconds; defaults to the connection
+			timeout
 		'''
 
 		#encode the message and send it to the connection (write)
@@ -406,15 +488,100 @@ class WidgetMain(QMainWindow):
 		self.connection.write(mw)
 
 		#now get the returned message and return it
-		mrt = self.connection.readline().decode("utf-8")
+		if timeout is not None:
+			t0 = self.connection.timeout
+			self.connection.timeout = timeout
+
+			try:
+				mrt = self.connection.readline().decode("utf-8")
+
+			finally:
+				self.connection.timeout = t0
+
+		else:
+			mrt = self.connection.readline().decode("utf-8")
+
 		mr = str(mrt)[0:-2] #remove final \n
 		
 		#return for setting readouts
 		return mr
 
+	#function to send a tagged command
+	def sendTagged(self, cmd, parseAttr, timeout = None):
+		'''
+		Sends a command tagged with an id ("@<id> cmd") and remembers which
+		function parses its reply; the link reader hands back the reply
+		("@<id> reply") to updateReply
+
+		Parameters
+		----------
+		cmd: str
+			String of the command text
+
+		parseAttr: function
+			Function to call with the reply
+
+		timeout: float or None
+			Time to wait for the reply, in seconds; defaults to 
+			self.requestTimeout
+		'''
+		now = time.time()
+
+		#forget requests whose replies never came
+		for msgid in [i for i, p in self.pending.items() if p[1] < now]:
+			del self.pending[msgid]
+
+		if timeout is None:
+			timeout = self.requestTimeout
+
+		#ids just need to differ from the requests still in flight
+		self.msgid = (self.msgid + 1) % 256
+		self.pending[self.msgid] = (parseAttr, now + timeout)
+
+		self.connection.write('@{} {}\n'.format(self.msgid, cmd).encode())
+
+	#function to route a tagged reply
+	def updateReply(self, msgid, text):
+		'''
+		Sends a tagged reply to the parse function of its request (late
+		replies, whose requests have timed out, are dropped)
+		'''
+		p = self.pending.pop(msgid, None)
+
+		if p is not None and p[1] >= time.time():
+			p[0](text)
+
+	#request execution function to be called when making the worker (binary)
+	def executeRequest(self, cmd, timeout = None):
+		'''
+		Executer function sent to the threadpool worker; sends the command in a
+		binary frame and waits for the reply frame with the same id
+
+		Parameters
+		----------
+		cmd: str
+			String of the command text
+
+		timeout: float or None
+			Time to wait for the reply, in seconds; defaults to the connection
+			timeout
+		'''
+
+		#ids just need to differ from the last few requests
+		self.msgid = (self.msgid + 1) % 256
+
+		self.connection.write(
+			protocol.encode(self.msgid, protocol.COMMAND, cmd.encode())
+			)
+
+		if timeout is None:
+			timeout = self.connection.timeout
+
+		return self.frameReader.readReply(self.msgid, timeout)
+
 	#function for communicating with raspberry pi (when sending from dialog)
 	# allows for reading multi-line commands
-	def read_write_multiline(self, cmd, parse = 'print'):
+	def read_write_multiline(self, cmd, parse = 'print', timeout = None):
 		'''
 		Method by which commands are sent to and read from the raspberry
 		pi pico controller and multi-line commands are read
@@ -427,6 +594,10 @@ class WidgetMain(QMainWindow):
 		parse: string
 			Tells the function how to parse the returned data; must be a string
 			of an attribute of the main window. Defaults to print to browser.
+
+		timeout: float or None
+			Time to wait for the reply, in seconds, for tagged or binary
+			commands. Defaults to None.
 		'''
 
 		if self.connected:
@@ -434,8 +605,18 @@ class WidgetMain(QMainWindow):
 			#convert parse string to attribute
 			parseAttr = getattr(self, parse)
 
-			#link the worker to the execute function
-			w = Worker(self.executeReadWriteMultiline, cmd)
+			#with tagged replies, just send; the reply finds its way back
+			if self.linkReader is not None:
+				self.sendTagged(cmd, parseAttr, timeout)
+				return
+
+			#link the worker to the execute function (a binary reply already
+			# holds all the lines)
+			if self.binary:
+				w = Worker(self.executeRequest, cmd, timeout = timeout)
+
+			else:
+				w = Worker(self.executeReadWriteMultiline, cmd)
 			w.signals.result.connect(parseAttr)
 
 			#start the thread
@@ -477,7 +658,7 @@ class WidgetMain(QMainWindow):
 		'''
 		Clears the readback browser
 		'''
-		self.readbackBrowser.clear()
+		self.console.clear()
 
 	#function to connect to raspberry pi
 	def connect(self):
@@ -491,14 +672,24 @@ class WidgetMain(QMainWindow):
 			#get the port and print it to the browser
 			port = self.portInput.text()
 
+			#get the link speed
+			try:
+				self.baudrate = int(self.baudInput.text())
+
+			except ValueError:
+				self.print('Baud rate must be a whole number, not {}'.format(
+					self.baudInput.text()))
+				return
+
 			#print that we're now connecting
-			self.print('Connecting to port: {}'.format(port))
+			self.print('Connecting to port: {} at {} baud'.format(
+				port, self.baudrate))
 
 			#now try connecting
 			try:
 				self.connection = serial.Serial(
 					port = port,
-					baudrate = 9600, #value from Philip
+					baudrate = self.baudrate,
 					bytesize = 8, #value from Philip
 					timeout = 0.25 #much shorter timeout
 					)
@@ -515,8 +706,22 @@ class WidgetMain(QMainWindow):
 				#get device list and store as attribute
 				self.devList = self.getDevList()
 
-				#start reading temps and flow rates to print to config panel
-				self.configTimer.start()
+				#route replies by id if the firmware tags them
+				if self.readoutMode != 'binary' and \
+					self.executeReadWrite('@0 ping') == '@0 pong':
+					self.startLinkReader()
+
+				#start reading temps and flow rates to print to config panel;
+				# subscribe to the firmware stream if it has one, otherwise poll
+				if self.readoutMode == 'stream' and 'stream' in self.devList:
+					self.startStream()
+
+				else:
+					if self.readoutMode == 'binary' and \
+						'protocol' in self.devList:
+						self.startBinary()
+
+					self.configTimer.start()
 
 			except Exception as e:
 
@@ -545,13 +750,18 @@ class WidgetMain(QMainWindow):
 			#now try disconnecting
 			try:
 
-				#stop timers, wait for threads to finish, and clear
+				#stop timers and stream, wait for threads to finish, and clear
 				self.configTimer.stop()
+				self.stopStream()
 				self.stopPlot()
 
 				self.threadpool.clear()
 				time.sleep(1.5*self.j/1000) #get to seconds
 
+				#hand the firmware back to typed commands
+				self.stopBinary()
+				self.stopLinkReader()
+
 				#close the connection
 				self.connection.close()
 
@@ -577,7 +787,8 @@ class WidgetMain(QMainWindow):
 	#function to save dialog browser contents
 	def saveDialog(self):
 		'''
-		Save the browser window to a .txt file 
+		Save the whole session's dialog (from the console log) to a .txt
+		file
 		'''
 
 		#bring up query for file name
@@ -585,10 +796,7 @@ class WidgetMain(QMainWindow):
 
 		#save the field if file name was not blank
 		if path[0] != '':
-			with open(path[0], 'w') as outfile:
-
-				#save the data
-				outfile.write(self.readbackBrowser.toPlainText())
+			self.console.save(path[0])
 
 	#function to load an existing dialog browser text
 	def loadDialog(self):
@@ -624,77 +832,164 @@ class WidgetMain(QMainWindow):
 		Updates the real-time display values using workers in a threadpool
 		'''
 
-		#read_write and parse to update text
+		#read everything as one frame of packed floats if binary
+		if self.binary:
+			self.read_write(
+				'snapshot values ' + ', '.join(self.pollParsers),
+				parse = 'updateSnapshotValues',
+				timeout = self.j/1000 #a snapshot takes up to one update
+				)
+
+		#read everything in one round trip if the firmware takes snapshots
+		elif self.devList is not None and 'snapshot' in self.devList:
+			self.read_write(
+				'snapshot poll',
+				parse = 'updateSnapshot',
+				timeout = self.j/1000 #a snapshot takes up to one update
+				)
 
-		# FLOW ON/OFF VALVES
+		#otherwise read_write each readout and parse to update text
+		else:
+			for cmd, parse in self.pollParsers.items():
+				self.read_write(cmd, parse = parse)
 
-		# He gas on/off valve
-		self.read_write(
-			'valveHeIn getPos',
-			parse = 'updateCheckboxHeIn'
-			)
+	#function to parse a snapshot record
+	def updateSnapshot(self, s):
+		'''
+		Updates all readouts from a single snapshot record, which looks like
+		{"t": <pico ms>, "data": {"<device> <method>": <value>, ...}}
+		'''
 
-		# SWITCHING VALVES
+		try:
+			data = json.loads(s)['data']
 
-		# DT switching valves (NOTE: do all through L valve; R is slave)
-		self.read_write(
-			'valveSwitchingLeft getPos',
-			parse = 'updateLabelDTrapping'
-			)
+		#catch error if returns something else
+		except (ValueError, KeyError, TypeError):
+			return
 
-		# FLOW RATES
+		self.updateReadouts(data)
 
-		#He flow
-		self.read_write(
-			'mfcHeIn getFlow',
-			parse = 'updateLabelHeFlow'
-			)
+	#function to parse a binary snapshot
+	def updateSnapshotValues(self, values):
+		'''
+		Updates all readouts from the values of a binary snapshot, which come in
+		the order of self.pollParsers (nan if the firmware could not read one)
+		'''
 
-		# TEMPERATURES
+		#catch error if returns something else
+		if not isinstance(values, list) or len(values) != len(self.pollParsers):
+			return
 
-		#CF temp
-		self.read_write(
-			'pidColdFinger getTemp',
-			parse = 'updateLabelCFTemp'
-			)
+		self.updateReadouts({
+			cmd: None if np.isnan(v) else v
+			for cmd, v in zip(self.pollParsers, values)
+			})
 
-		#DT_R temp
-		self.read_write(
-			'pidDT_R getTemp',
-			parse = 'updateLabelDTRTemp'
-			)
+	#function to send readings to their label update functions
+	def updateReadouts(self, data):
+		'''
+		Updates the readouts from a dict of {"<device> <method>": <value>}
+		'''
 
-		#DT_L temp
-		self.read_write(
-			'pidDT_L getTemp',
-			parse = 'updateLabelDTLTemp'
-			)
+		#send each reading to its label update function
+		for cmd, value in data.items():
 
-		#WT1 temp
-		self.read_write(
-			'pidWT1 getTemp',
-			parse = 'updateLabelWT1Temp'
-			)
+			#skip readings the firmware could not take
+			if value is None or cmd not in self.pollParsers:
+				continue
 
-		#WT2 temp
-		self.read_write(
-			'pidWT2 getTemp',
-			parse = 'updateLabelWT2Temp'
-			)
+			getattr(self, self.pollParsers[cmd])(str(value))
 
-		# PASSIVE SENSORS
+	# BINARY FUNCTIONS #
+	#------------------#
+	#function to switch the link to binary frames
+	def startBinary(self):
+		'''
+		Asks the firmware to take binary frames (as a typed command, since the
+		reply is plain text) and starts sending every command as a frame
+		'''
+		self.print(self.executeReadWrite('protocol on'))
 
-		#cold finger vacuum
-		self.read_write(
-			'vacuumSensor getVacuum',
-			parse = 'updateLabelCFVacuum'
-			)
+		self.frameReader = protocol.FrameReader(self.connection)
+		self.binary = True
 
-		#TCD signal
-		self.read_write(
-			'tcdGC getSignal',
-			parse = 'updateLabelTCDSignal',
-			)
+	#function to switch the link back to text
+	def stopBinary(self):
+		'''
+		Switches the firmware back to typed commands (which turns ctrl-c back
+		on)
+		'''
+
+		if self.binary:
+			self.print(self.executeRequest('protocol off'))
+			self.binary = False
+
+	# LINK READER FUNCTIONS #
+	#-----------------------#
+	#function to start reading every line in a thread
+	def startLinkReader(self):
+		'''
+		Starts the thread that reads every line from the firmware and routes
+		tagged replies, stream records and any other text
+		'''
+		self.linkReader = LinkReader(self.connection)
+		self.linkReader.reply.connect(self.updateReply)
+		self.linkReader.record.connect(self.updateStream)
+		self.linkReader.line.connect(self.print)
+		self.linkReader.start()
+
+	#function to stop the reader thread
+	def stopLinkReader(self):
+		'''
+		Stops the reader thread and forgets any requests still in flight
+		'''
+
+		if self.linkReader is not None:
+
+			#let the reader finish its current line
+			self.linkReader.stop()
+			self.linkReader.wait()
+			self.linkReader = None
+
+			self.pending.clear()
+
+	# STREAM FUNCTIONS #
+	#------------------#
+	#function to subscribe to the firmware stream
+	def startStream(self):
+		'''
+		Asks the firmware to push the readouts at self.streamPeriod
+		'''
+
+		#start reading before asking, so the header line is not missed
+		if self.linkReader is None:
+			self.startLinkReader()
+
+		self.streaming = True
+
+		self.read_write('stream setChannels ' + ', '.join(self.pollParsers))
+		self.read_write('stream start {}'.format(self.streamPeriod))
+
+	#function to unsubscribe from the firmware stream
+	def stopStream(self):
+		'''
+		Asks the firmware to stop streaming
+		'''
+
+		if self.streaming:
+			self.read_write('stream stop')
+			self.streaming = False
+
+	#function to parse a stream record
+	def updateStream(self, record):
+		'''
+		Updates all readouts (and the plots, if plotting) from a stream record
+		'''
+		self.updateReadouts(record['data'])
+
+		#each record is one plot point
+		if self.plotting:
+			self.updatePlots()
 
 	#label update helper functions
 	def updateCheckboxHeIn(self, p):
@@ -1036,8 +1331,10 @@ class WidgetMain(QMainWindow):
 		if self.connected:
 			if not self.plotting:
 
-				#start plot timer
-				self.plotTimer.start()
+				#start plot timer (stream records add points when streaming)
+				if not self.streaming:
+					self.plotTimer.start()
+
 				self.plotting = True
 
 			else:
@@ -1071,14 +1368,8 @@ class WidgetMain(QMainWindow):
 		Clears the current plot log
 		'''
 
-		#make each plotter data into an empty list
-		for p in self.plotters:
-
-			#add empty list
-			self.plotters[p]['data'] = np.array([])
-
-		#make timestamp list empty also
-		self.plotTimeStamps = np.array([])
+		#empty the plot data store
+		self.plotData.clear()
 
 		if self.connected:
 			#then update the plots to be nothing
@@ -1098,30 +1389,7 @@ class WidgetMain(QMainWindow):
 
 		#save the field if file name was not blank
 		if path[0] != '':
-			with open(path[0], 'w', newline='') as outfile:
-
-				#make a csv writer
-				writer = csv.writer(outfile, delimiter=',')
-
-				#make list of headers and of data to save
-				headers = []
-				data = []
-
-				#first add timestamps to data and header
-				headers.append('date_time')
-				data.append(self.plotTimeStamps)
-
-				#now loop through each ploter and get data and name; append
-				for p in self.plotters:
-					headers.append(self.plotters[p]['name'])
-					data.append(self.plotters[p]['data'])
-
-				#write headers to csv
-				writer.writerow(headers)
-
-				#finally, loop through each row and save
-				for row in zip(*data):
-					writer.writerow(row)
+			self.savePlotFromString(path[0])
 
 	#function to save logged plot data from a path string (for sequences)
 	def savePlotFromString(self, path):
@@ -1131,30 +1399,13 @@ class WidgetMain(QMainWindow):
 
 		#save the field if file name was not blank
 		if path != '':
-			with open(path, 'w', newline='') as outfile:
-
-				#make a csv writer
-				writer = csv.writer(outfile, delimiter=',')
-
-				#make list of headers and of data to save
-				headers = []
-				data = []
-
-				#first add timestamps to data and header
-				headers.append('date_time')
-				data.append(self.plotTimeStamps)
 
-				#now loop through each ploter and get data and name; append
-				for p in self.plotters:
-					headers.append(self.plotters[p]['name'])
-					data.append(self.plotters[p]['data'])
-
-				#write headers to csv
-				writer.writerow(headers)
-
-				#finally, loop through each row and save
-				for row in zip(*data):
-					writer.writerow(row)
+			#one row per point, headed by the plotter names
+			self.plotData.write(
+				path,
+				headers = ['date_time'] + \
+					[self.plotters[p]['name'] for p in self.plotters]
+				)
 
 	#function to load existing plot data
 	def loadPlot(self):
@@ -1172,30 +1423,50 @@ class WidgetMain(QMainWindow):
 		Updates all plots with new data
 		'''
 
-		#first, get timestamp
-		t = np.append(self.plotTimeStamps, time.time())
-		self.plotTimeStamps = t
+		#add the newest value of each plotter device as one point
+		self.plotData.append(
+			time.time(),
+			[getattr(self, self.plotters[p]['attr']) for p in self.plotters]
+			)
 
-		#next, get data for each connected plotter device
-		# and append to data list
-		for p in self.plotters:
+		self.drawPlots()
 
-			#get attribute values
-			res = getattr(
-				self,
-				self.plotters[p]['attr']
-				)
+	#function to draw the plots
+	def drawPlots(self):
+		'''
+		Draws each plotter with only as many points as the view needs (see
+		TimeSeries.decimated), so redraws stay fast on long runs
+		'''
+		vb = self.plt.getViewBox()
+
+		#whole run while the x axis follows the data, else just the view
+		if vb.autoRangeEnabled()[0]:
+			x0, x1 = -np.inf, np.inf
+
+		else:
+			x0, x1 = vb.viewRange()[0]
 
-			#update data with new point
-			d = np.append(self.plotters[p]['data'], res)
-			self.plotters[p]['data'] = d
+		width = max(100, int(vb.width()))
+
+		#values not read yet are nan and left as gaps
+		for p in self.plotters:
+			x, y = self.plotData.decimated(p, x0, x1, width)
 
-			#finally, update plots
 			self.plotters[p]['instance'].setData(
-				y = self.plotters[p]['data'], 
-				x = self.plotTimeStamps
+				x = x,
+				y = y,
+				connect = 'finite'
 				)
 
+	#function to redraw after a pan or zoom
+	def viewChanged(self, *args):
+		'''
+		Redraws for the new x range (not while auto-ranging, since then the
+		whole run is drawn already)
+		'''
+		if not self.plt.getViewBox().autoRangeEnabled()[0]:
+			self.drawPlots()
+
 	#==================#
 	# HELPER FUNCTIONS #
 	#==================#
@@ -1322,6 +1593,156 @@ class WorkerSignals(QObject):
 	result = pyqtSignal(object)
 
 
+#class for reading every line from the firmware
+class LinkReader(QThread):
+	'''
+	Thread that reads every line from the connection. Tagged replies look like
+
+	@<id> <reply>				(last or only line)
+	@<id>+ <reply line>			(earlier lines of a multi-line reply)
+
+	(a batched command, "a; b; c", comes back the same way, one line per
+	command)
+
+	and stream records look like
+
+	$H,<device> <method>,...				(header, sent on stream start)
+	$D,<sequence>,<pico ms>,<value>,...		(one per sample; empty if unread)
+
+	Supported signals are:
+
+	reply:
+		int id and str text of a whole tagged reply
+
+	record:
+		dict with "seq", "t" and "data" ({"<device> <method>": <value>})
+
+	line:
+		str of any other line (e.g. printed by a driver)
+	'''
+
+	reply = pyqtSignal(int, str)
+	record = pyqtSignal(object)
+	line = pyqtSignal(str)
+
+	def __init__(self, connection):
+		'''
+		Initializes the class
+
+		Parameters
+		----------
+		connection : serial.Serial
+			Open connection to the raspberry pi pico
+		'''
+
+		#init superclass
+		super(LinkReader, self).__init__()
+
+		self.connection = connection
+		self.channels = []
+		self.partial = {}
+		self.running = True
+
+	#function to stop the thread
+	def stop(self):
+		'''
+		Stops reading after the current line
+		'''
+		self.running = False
+
+	#make the runner function
+	def run(self):
+		'''
+		Reads and sorts lines until stopped
+		'''
+		buf = bytearray()
+
+		while self.running:
+
+			#take everything waiting in one read (waits for at least one byte,
+			# up to the connection timeout)
+			try:
+				buf += self.connection.read(max(1, self.connection.in_waiting))
+
+			except Exception:
+				traceback.print_exc()
+				break
+
+			#sort each whole line
+			i = buf.find(b'\n')
+
+			while i >= 0:
+				l = buf[:i].decode("utf-8", "replace").rstrip('\r')
+				del buf[:i + 1]
+
+				if l:
+					self.sortLine(l)
+
+				i = buf.find(b'\n')
+
+	#function to sort a line
+	def sortLine(self, l):
+		'''
+		Routes one line to the matching signal
+		'''
+
+		#tagged reply: route by id
+		if l.startswith('@'):
+			self.parseReply(l)
+
+		#header: remember the column names
+		elif l.startswith('$H,'):
+			self.channels = l.split(',')[1:]
+
+		#data: convert to a record
+		elif l.startswith('$D,'):
+			self.parseRecord(l)
+
+		else:
+			self.line.emit(l)
+
+	#function to collect a tagged reply
+	def parseReply(self, l):
+		'''
+		Collects the lines of a tagged reply and emits it once whole
+		'''
+		tag, _, text = l[1:].partition(' ')
+
+		try:
+			msgid = int(tag.rstrip('+'))
+
+		#not one of ours
+		except ValueError:
+			self.line.emit(l)
+			return
+
+		#more lines to come
+		if tag.endswith('+'):
+			self.partial.setdefault(msgid, []).append(text)
+			return
+
+		lines = self.partial.pop(msgid, []) + [text]
+		self.reply.emit(msgid, '\n'.join(lines))
+
+	#function to convert a data line to a record
+	def parseRecord(self, l):
+		'''
+		Converts a "$D" line to a record and emits it
+		'''
+		f = l.split(',')
+
+		#drop lines that do not match the header (e.g. cut short)
+		if len(f) != len(self.channels) + 3:
+			return
+
+		data = {}
+
+		for c, v in zip(self.channels, f[3:]):
+			data[c] = v if v != '' else None
+
+		self.record.emit({'seq': int(f[1]), 't': int(f[2]), 'data': data})
+
+
 #class for bringing up a dialog box to take user-defined inputs
 class InputDialog(QDialog):
 	'''
@@ -0,0 +1,631 @@
+'''
+Benchmark of the desktop <-> pico command path: sends scripted workloads over
+the real serial link (or to the simulated firmware on a pty) and measures the
+round trip of each command, from writing it to reading its reply.
+
+Workloads
+---------
+ping		built-in ping, one at a time (link and parser overhead only)
+poll		each readout channel as its own command, one at a time (what the
+			GUI's text mode does every second)
+snapshot	all readout channels in one snapshot command, one at a time
+binary		the same snapshot in a binary frame, one at a time
+burst		bursts of commands sent all at once (as when the GUI queues
+			several method steps), to measure commands/s and dropped replies
+stream		pushed stream records for a while, to measure the record rate,
+			gaps in the sequence and arrival jitter
+
+For each workload, the latencies (p50/p95/p99/mean/max, in ms), commands/s and
+dropped replies (no reply within the timeout, or an error reply) are printed
+and saved to a json file, together with the firmware's own queue and latency
+stats, so runs can be compared across changes:
+
+	python benchmark.py --sim --out before.json
+	python benchmark.py --sim --out after.json --compare before.json
+	python benchmark.py --port /dev/tty.usbmodem101
+'''
+
+import argparse
+import fcntl
+import json
+import os
+import pty
+import select
+import struct
+import subprocess
+import sys
+import termios
+import threading
+import time
+import tty
+
+from datetime import datetime
+
+import protocol
+
+#path to the pico firmware (for the simulator)
+basedir = os.path.dirname(os.path.abspath(__file__))
+fwdir = os.path.join(basedir, '..', '..', '00 microcontroller')
+
+#readout channels, as the GUI polls them
+POLL_CHANNELS = [
+	'valveHeIn getPos',
+	'valveSwitchingLeft getPos',
+	'mfcHeIn getFlow',
+	'pidColdFinger getTemp',
+	'pidDT_R getTemp',
+	'pidDT_L getTemp',
+	'pidWT1 getTemp',
+	'pidWT2 getTemp',
+	'vacuumSensor getVacuum',
+	'tcdGC getSignal',
+	]
+
+#commands sent in each burst (a mix of buses)
+BURST_COMMANDS = [
+	'onboardLED on',
+	'valveHeIn getPos',
+	'mfcHeIn getFlow',
+	'vacuumSensor getVacuum',
+	'pidWT1 getTemp',
+	'onboardLED off',
+	'tcdGC getSignal',
+	'valveSwitchingLeft getPos',
+	]
+
+#class for the simulated firmware on a pty
+class SimLink():
+	'''
+	Runs the simulated firmware (00 microcontroller/sim/run.py) with a pty as
+	its USB serial port, and reads and writes the other end like a
+	serial.Serial
+	'''
+
+	def __init__(self, timeout = 0.1):
+		'''
+		Starts the simulator
+
+		Parameters
+		----------
+		timeout : float
+			Time a read waits for the first byte, in seconds
+		'''
+		self.timeout = timeout
+		self.master, slave = pty.openpty()
+		tty.setraw(slave)
+
+		self.process = subprocess.Popen(
+			[sys.executable, os.path.join(fwdir, 'sim', 'run.py')],
+			stdin = slave,
+			stdout = slave,
+			stderr = subprocess.DEVNULL,
+			)
+
+		os.close(slave)
+		self.port = 'simulator (pid %d)' % self.process.pid
+
+	@property
+	def in_waiting(self):
+		'''
+		Number of bytes waiting to be read
+		'''
+		buf = fcntl.ioctl(self.master, termios.FIONREAD, b'\0\0\0\0')
+
+		return struct.unpack('i', buf)[0]
+
+	def read(self, n = 1):
+		'''
+		Reads up to n bytes, waiting up to the timeout for the first one
+		'''
+		ready, _, _ = select.select([self.master], [], [], self.timeout)
+
+		if not ready:
+			return b''
+
+		try:
+			return os.read(self.master, n)
+
+		#the simulator has gone
+		except OSError:
+			return b''
+
+	def write(self, data):
+		'''
+		Writes bytes to the firmware
+		'''
+		return os.write(self.master, data)
+
+	def close(self):
+		'''
+		Stops the simulator
+		'''
+		self.process.kill()
+		self.process.wait()
+		os.close(self.master)
+
+#function to open the real serial link
+def serialLink(port, baudrate):
+	'''
+	Opens the serial connection to the pico (as the GUI does)
+	'''
+	import serial
+
+	link = serial.Serial(
+		port = port,
+		baudrate = baudrate,
+		bytesize = 8,
+		timeout = 0.1
+		)
+	link.port_name = port
+
+	return link
+
+#class to route replies
+class Reader(threading.Thread):
+	'''
+	Reads lines from the link in the background and hands tagged replies
+	("@<id> reply", with "@<id>+ line" for earlier lines) and stream records
+	("$D,...") to whoever is waiting for them
+	'''
+
+	def __init__(self, link):
+		'''
+		Initializes the reader
+
+		Parameters
+		----------
+		link : SimLink or serial.Serial
+			Open connection to the pico
+		'''
+		super().__init__(daemon = True)
+		self.link = link
+		self.running = True
+		self.lock = threading.Lock()
+		self.pending = {}
+		self.replies = {}
+		self.partial = {}
+		self.records = []
+		self.arrived = threading.Condition(self.lock)
+
+	def run(self):
+		'''
+		Reads and sorts lines until stopped
+		'''
+		buf = b''
+
+		while self.running:
+			buf += self.link.read(max(1, self.link.in_waiting))
+
+			while b'\n' in buf:
+				line, buf = buf.split(b'\n', 1)
+				self.sort(line.decode('utf-8', 'replace').strip(), time.perf_counter())
+
+	def sort(self, line, t):
+		'''
+		Sorts one line
+		'''
+		if line.startswith('$D,'):
+			with self.lock:
+				self.records.append((t, line))
+
+			return
+
+		if not line.startswith('@'):
+			return
+
+		tag, _, text = line[1:].partition(' ')
+
+		with self.lock:
+
+			#earlier lines of a multi-line reply
+			if tag.endswith('+'):
+				self.partial.setdefault(tag[:-1], []).append(text)
+				return
+
+			lines = self.partial.pop(tag, []) + [text]
+			self.replies[tag] = (t, '\n'.join(lines))
+			self.arrived.notify_all()
+
+	def stop(self):
+		'''
+		Stops reading (after the current read times out)
+		'''
+		self.running = False
+		self.join()
+
+#class to run the workloads
+class Benchmark():
+	'''
+	Runs workloads over a link and collects the results
+	'''
+
+	def __init__(self, link, timeout = 2.0):
+		'''
+		Initializes the benchmark
+
+		Parameters
+		----------
+		link : SimLink or serial.Serial
+			Open connection to the pico
+
+		timeout : float
+			Time to wait for each reply, in seconds; replies that take longer
+			count as dropped
+		'''
+		self.link = link
+		self.timeout = timeout
+		self.reader = None
+		self.msgid = 0
+
+	#function to start and stop the line reader
+	def startReader(self):
+		self.reader = Reader(self.link)
+		self.reader.start()
+
+	def stopReader(self):
+		if self.reader is not None:
+			self.reader.stop()
+			self.reader = None
+
+	#function to get a new tag
+	def nextTag(self):
+		self.msgid += 1
+
+		return str(self.msgid)
+
+	#function to send tagged commands
+	def send(self, cmds):
+		'''
+		Sends tagged commands in one write
+
+		Returns
+		-------
+		sent : list
+			(tag, send time) of each command
+		'''
+		tags = [self.nextTag() for _ in cmds]
+		data = ''.join('@%s %s\n' % (tag, cmd) for tag, cmd in zip(tags, cmds))
+
+		t = time.perf_counter()
+		self.link.write(data.encode())
+
+		return [(tag, t) for tag in tags]
+
+	#function to wait for replies
+	def collect(self, sent):
+		'''
+		Waits for the replies to sent commands
+
+		Returns
+		-------
+		latencies : list
+			Round trip of each answered command, in seconds
+
+		dropped : int
+			Commands with no reply in time, or an error reply
+		'''
+		reader = self.reader
+		deadline = time.perf_counter() + self.timeout
+		latencies = []
+		dropped = 0
+
+		with reader.lock:
+			for tag, t in sent:
+				while tag not in reader.replies:
+					left = deadline - time.perf_counter()
+
+					if left <= 0 or not reader.arrived.wait(left):
+						break
+
+				reply = reader.replies.pop(tag, None)
+
+				if reply is None or reply[1].startswith('ERROR'):
+					dropped += 1
+
+				else:
+					latencies.append(reply[0] - t)
+
+		return latencies, dropped
+
+	#function to send one command and wait for its reply
+	def query(self, cmd):
+		'''
+		Sends one command and gets its reply text (None if it never came)
+		'''
+		tag, t = self.send([cmd])[0]
+
+		with self.reader.lock:
+			self.reader.arrived.wait_for(
+				lambda: tag in self.reader.replies, self.timeout
+				)
+			reply = self.reader.replies.pop(tag, None)
+
+		return None if reply is None else reply[1]
+
+	#function to wait for the firmware to boot
+	def waitReady(self, timeout = 30.0):
+		'''
+		Pings until the firmware answers (the simulator takes a moment to
+		boot); raises RuntimeError if it never does
+		'''
+		end = time.time() + timeout
+
+		while time.time() < end:
+			if self.query('ping') == 'pong':
+				return
+
+		raise RuntimeError('no answer from the firmware')
+
+	#function to run sequential commands
+	def sequential(self, cmds, n):
+		'''
+		Sends commands one at a time (the next once the last is answered),
+		cycling through cmds until n have been sent
+		'''
+		latencies = []
+		dropped = 0
+		start = time.perf_counter()
+
+		for i in range(n):
+			lat, drop = self.collect(self.send([cmds[i % len(cmds)]]))
+			latencies += lat
+			dropped += drop
+
+		return summarize(latencies, dropped, n, time.perf_counter() - start)
+
+	#WORKLOADS#
+
+	def ping(self, n):
+		return self.sequential(['ping'], n)
+
+	def poll(self, n):
+		return self.sequential(POLL_CHANNELS, n)
+
+	def snapshot(self, n):
+		return self.sequential(['snapshot values ' + ', '.join(POLL_CHANNELS)], n)
+
+	def burst(self, n, size = len(BURST_COMMANDS)):
+		'''
+		Sends bursts of size commands at once, n commands in all
+		'''
+		latencies = []
+		dropped = 0
+		sent = 0
+		start = time.perf_counter()
+
+		while sent < n:
+			cmds = [BURST_COMMANDS[(sent + i) % len(BURST_COMMANDS)]
+				for i in range(min(size, n - sent))]
+
+			lat, drop = self.collect(self.send(cmds))
+			latencies += lat
+			dropped += drop
+			sent += len(cmds)
+
+		return summarize(latencies, dropped, n, time.perf_counter() - start)
+
+	def binary(self, n):
+		'''
+		Sends the snapshot in binary frames, one at a time (the line reader
+		is paused, since replies are not lines)
+		'''
+		self.stopReader()
+
+		reader = protocol.FrameReader(self.link)
+		cmd = ('snapshot values ' + ', '.join(POLL_CHANNELS)).encode()
+		latencies = []
+		dropped = 0
+
+		try:
+			self.link.write(b'protocol on\n')
+			time.sleep(0.5)
+			self.link.read(max(1, self.link.in_waiting))
+
+			start = time.perf_counter()
+
+			for i in range(n):
+				msgid = i % 256
+				t = time.perf_counter()
+				self.link.write(protocol.encode(msgid, protocol.COMMAND, cmd))
+
+				reply = reader.readReply(msgid, self.timeout)
+
+				if isinstance(reply, list):
+					latencies.append(time.perf_counter() - t)
+
+				else:
+					dropped += 1
+
+			elapsed = time.perf_counter() - start
+
+		#always switch back to text, even if interrupted
+		finally:
+			self.link.write(protocol.encode(0, protocol.COMMAND, b'protocol off'))
+			reader.readReply(0, self.timeout)
+			self.startReader()
+
+		return summarize(latencies, dropped, n, elapsed)
+
+	def stream(self, n, period = 0.05):
+		'''
+		Streams until n records are due (at the given period) and checks
+		what arrived
+		'''
+		with self.reader.lock:
+			self.reader.records = []
+
+		self.query('stream start %g' % period)
+		time.sleep(n * period)
+		self.query('stream stop')
+
+		with self.reader.lock:
+			records = self.reader.records
+			self.reader.records = []
+
+		#sequence numbers and arrival times
+		seqs = [int(line.split(',')[1]) for _, line in records]
+		times = [t for t, _ in records]
+		gaps = sum(b - a - 1 for a, b in zip(seqs, seqs[1:]) if b > a + 1)
+		intervals = [b - a for a, b in zip(times, times[1:])]
+
+		res = summarize(intervals, gaps, len(seqs), times[-1] - times[0] \
+			if len(times) > 1 else 0.)
+
+		res['expected'] = n
+		res['period_ms'] = period * 1000
+		res['note'] = 'latency_ms is the interval between records'
+
+		return res
+
+	#function to get the firmware's own numbers
+	def firmwareStats(self):
+		'''
+		Gets the firmware's queue metrics, job accounting and latency table
+		(if it has them)
+		'''
+		return {
+			'queue': self.query('queue'),
+			'jobs': self.query('jobs'),
+			'stats': self.query('stats'),
+			}
+
+#function to summarize latencies
+def summarize(latencies, dropped, sent, elapsed):
+	'''
+	Summarizes latencies (in seconds) as a dict of ms percentiles, plus
+	commands/s and dropped replies
+	'''
+	lat = sorted(1000 * x for x in latencies)
+
+	def pct(p):
+		if not lat:
+			return None
+
+		return round(lat[min(len(lat) - 1, int(p / 100 * len(lat)))], 3)
+
+	return {
+		'sent': sent,
+		'answered': len(lat),
+		'dropped': dropped,
+		'elapsed_s': round(elapsed, 3),
+		'per_s': round(sent / elapsed, 1) if elapsed > 0 else None,
+		'latency_ms': {
+			'p50': pct(50),
+			'p95': pct(95),
+			'p99': pct(99),
+			'mean': round(sum(lat) / len(lat), 3) if lat else None,
+			'max': round(lat[-1], 3) if lat else None,
+			},
+		}
+
+#function to print the results
+def report(results, previous = None):
+	'''
+	Prints a table of the results (with the change from a previous run)
+	'''
+	print('%-10s %6s %6s %8s %9s %9s %9s' % (
+		'workload', 'sent', 'drop', 'per_s', 'p50_ms', 'p95_ms', 'p99_ms'
+		))
+
+	for name, res in results.items():
+		lat = res['latency_ms']
+
+		print('%-10s %6d %6d %8s %9s %9s %9s' % (
+			name, res['sent'], res['dropped'], res['per_s'],
+			lat['p50'], lat['p95'], lat['p99']
+			))
+
+		#change from the previous run
+		if previous is not None and name in previous:
+			old = previous[name]
+
+			def change(new, before):
+				if new is None or not before:
+					return ''
+
+				return '%+.0f%%' % (100 * (new - before) / before)
+
+			print('%-10s %6s %6s %8s %9s %9s %9s' % (
+				'  vs prev', '', '%+d' % (res['dropped'] - old['dropped']),
+				change(res['per_s'], old['per_s']),
+				change(lat['p50'], old['latency_ms']['p50']),
+				change(lat['p95'], old['latency_ms']['p95']),
+				change(lat['p99'], old['latency_ms']['p99']),
+				))
+
+#function to run everything
+def main(argv = None):
+	'''
+	Parses the command line, runs the workloads and saves the results
+	'''
+	parser = argparse.ArgumentParser(description = __doc__.split('\n\n')[0])
+	where = parser.add_mutually_exclusive_group(required = True)
+	where.add_argument('--port', help = 'serial port of the pico')
+	where.add_argument('--sim', action = 'store_true',
+		help = 'run the simulated firmware on a pty')
+	parser.add_argument('--baudrate', type = int, default = 115200)
+	parser.add_argument('--workloads',
+		default = 'ping,poll,snapshot,binary,burst,stream',
+		help = 'comma-separated workloads to run')
+	parser.add_argument('-n', type = int, default = 100,
+		help = 'commands (or stream records) per workload')
+	parser.add_argument('--timeout', type = float, default = 2.0,
+		help = 'time to wait for each reply, in seconds')
+	parser.add_argument('--out', help = 'json file to save the results to')
+	parser.add_argument('--compare', help = 'json file of an earlier run')
+	args = parser.parse_args(argv)
+
+	if args.sim:
+		link = SimLink()
+		port = link.port
+
+	else:
+		link = serialLink(args.port, args.baudrate)
+		port = args.port
+
+	bench = Benchmark(link, args.timeout)
+	bench.startReader()
+
+	try:
+		bench.waitReady()
+		bench.query('stats reset')
+		bench.query('queue reset')
+		bench.query('jobs reset')
+
+		results = {}
+
+		for name in args.workloads.split(','):
+			results[name] = getattr(bench, name.strip())(args.n)
+
+		firmware = bench.firmwareStats()
+
+	finally:
+		bench.stopReader()
+		link.close()
+
+	out = {
+		'date': datetime.now().isoformat(timespec = 'seconds'),
+		'port': port,
+		'n': args.n,
+		'results': results,
+		'firmware': firmware,
+		}
+
+	if args.out:
+		with open(args.out, 'w') as f:
+			json.dump(out, f, indent = 4)
+
+	previous = None
+
+	if args.compare:
+		with open(args.compare) as f:
+			previous = json.load(f)['results']
+
+	report(results, previous)
+
+	if args.out:
+		print('saved to', args.out)
+
+if __name__ == '__main__':
+
+	main()
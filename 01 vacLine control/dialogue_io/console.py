@@ -0,0 +1,121 @@
+'''
+Readback console of the GUI. Each message is appended to the text box as one
+line (the box keeps only the newest maxLines, dropping the oldest), and also
+written to a log file on disk that rotates once it gets big, so the cost of a
+message does not grow with the length of the session while the full history
+is still kept.
+'''
+
+import logging
+import os
+
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+#class for the readback console
+class Console():
+	'''
+	Appends timestamped lines to a QPlainTextEdit and to a rotating log file
+	'''
+
+	def __init__(self, browser, folder, maxLines = 5000,
+		maxBytes = 5 * 1024 * 1024, backups = 20):
+		'''
+		Initializes the class
+
+		Parameters
+		----------
+		browser : QPlainTextEdit
+			Text box to show the lines in
+
+		folder : str
+			Folder to put the log files in (one per session, named after the
+			time the GUI was started)
+
+		maxLines : int
+			Number of lines the text box keeps
+
+		maxBytes : int
+			Size at which the log file is rotated
+
+		backups : int
+			Number of rotated log files to keep
+		'''
+		self.browser = browser
+		self.browser.setMaximumBlockCount(maxLines)
+
+		#one log file per session
+		os.makedirs(folder, exist_ok = True)
+		self.path = os.path.join(
+			folder,
+			datetime.now().strftime('console_%Y%m%d_%H%M%S.log')
+			)
+
+		self.handler = RotatingFileHandler(
+			self.path,
+			maxBytes = maxBytes,
+			backupCount = backups,
+			encoding = 'utf-8'
+			)
+		self.handler.setFormatter(logging.Formatter('%(message)s'))
+
+		#own logger, so nothing else ends up in the file
+		self.logger = logging.getLogger('vacLine.console.' + self.path)
+		self.logger.propagate = False
+		self.logger.setLevel(logging.INFO)
+		self.logger.addHandler(self.handler)
+
+	#function to add a message
+	def write(self, text):
+		'''
+		Adds a timestamped message to the text box and the log file
+
+		Parameters
+		----------
+		text : str
+			Message (may span several lines)
+		'''
+		s = datetime.now().strftime("%Y %m %d %H:%M:%S") + "\t" + text
+
+		self.browser.appendPlainText(s)
+		self.logger.info(s)
+
+	#function to clear the text box
+	def clear(self):
+		'''
+		Clears the text box (the log file keeps everything)
+		'''
+		self.browser.clear()
+
+	#function to get the log files of this session
+	def files(self):
+		'''
+		Gets the log files of this session, oldest first
+		'''
+		backups = []
+
+		for i in range(self.handler.backupCount, 0, -1):
+			path = '%s.%d' % (self.path, i)
+
+			if os.path.exists(path):
+				backups.append(path)
+
+		return backups + [self.path]
+
+	#function to save the whole session
+	def save(self, path):
+		'''
+		Saves every message of this session (that is still in the log
+		files) to a text file
+		'''
+		self.handler.flush()
+
+		with open(path, 'w', encoding = 'utf-8') as outfile:
+			for log in self.files():
+				with open(log, 'r', encoding = 'utf-8') as infile:
+					outfile.write(infile.read())
+
+	#function to close the log file
+	def close(self):
+		self.logger.removeHandler(self.handler)
+		self.handler.close()
@@ -0,0 +1,209 @@
+'''
+Desktop side of the binary framed protocol spoken by the pico (see
+Library_protocol.py in the microcontroller folder). Every frame looks like
+
+	0xA5 | length | id | type | payload (length bytes) | crc16
+
+where the crc16 is the modbus crc (little endian) of length, id, type and
+payload. A batched command ("a; b; c") is answered with one TEXT frame, one
+line per command. A reply longer than 255 bytes comes as MORE frames followed
+by one frame of the reply's own type, all with the same id; readReply joins
+them.
+'''
+
+import struct
+import time
+
+#frame bytes
+SYNC = 0xA5
+HEADER_LENGTH = 4
+FRAME_OVERHEAD = 6
+
+#frame types (desktop to pico)
+COMMAND = 0x01
+
+#frame types (pico to desktop)
+ACK = 0x80
+VALUES = 0x81
+TEXT = 0x82
+MORE = 0x83
+ERROR = 0xFF
+
+#make the modbus crc16 table (same as CRC16_TABLE in umodbus/const.py)
+def _crcTable():
+	table = []
+
+	for i in range(256):
+		crc = i
+
+		for _ in range(8):
+			crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+
+		table.append(crc)
+
+	return tuple(table)
+
+CRC16_TABLE = _crcTable()
+
+#function to calculate the crc16 of some bytes
+def crc16(data):
+	'''
+	Calculates the modbus crc16 of some bytes
+	'''
+	crc = 0xFFFF
+
+	for char in data:
+		crc = (crc >> 8) ^ CRC16_TABLE[(crc ^ char) & 0xFF]
+
+	return crc
+
+#function to make a frame
+def encode(msgid, ftype, payload = b''):
+	'''
+	Makes a frame
+
+	Parameters
+	----------
+	msgid : int
+		Message id (0 to 255)
+
+	ftype : int
+		Frame type
+
+	payload : bytes
+		Frame payload (up to 255 bytes)
+	'''
+	body = bytes((len(payload), msgid, ftype)) + payload
+
+	return bytes((SYNC,)) + body + struct.pack('<H', crc16(body))
+
+#class for reading frames off the serial connection
+class FrameReader():
+	'''
+	Reads frames from a serial connection, skipping any text the pico prints
+	outside of frames
+	'''
+
+	def __init__(self, connection):
+		'''
+		Initializes the class
+
+		Parameters
+		----------
+		connection : serial.Serial
+			Open connection to the raspberry pi pico
+		'''
+		self.connection = connection
+		self.buffer = bytearray()
+		self.text = bytearray()
+		self.errors = 0
+
+	#function to pull the next good frame out of the buffer
+	def nextFrame(self):
+		'''
+		Returns the next good frame in the buffer as (id, type, payload), or
+		None if there is not a whole one yet
+		'''
+		buf = self.buffer
+
+		while buf:
+
+			#anything before the sync byte is printed text
+			if buf[0] != SYNC:
+				i = buf.find(bytes((SYNC,)))
+				i = len(buf) if i < 0 else i
+
+				self.text += buf[:i]
+				del buf[:i]
+				continue
+
+			if len(buf) < HEADER_LENGTH:
+				return None
+
+			n = buf[1] + FRAME_OVERHEAD
+
+			if len(buf) < n:
+				return None
+
+			#a bad crc means this was not really a frame start
+			if crc16(buf[1:n - 2]) != struct.unpack('<H', buf[n - 2:n])[0]:
+				self.errors += 1
+				self.text += buf[:1]
+				del buf[:1]
+				continue
+
+			frame = (buf[2], buf[3], bytes(buf[HEADER_LENGTH:n - 2]))
+			del buf[:n]
+
+			return frame
+
+		return None
+
+	#function to wait for the reply to a request
+	def readReply(self, msgid, timeout):
+		'''
+		Waits for the frame with the given id and decodes it (joining the
+		payloads of any MORE frames before it); frames for other (earlier,
+		timed out) requests are dropped
+
+		Parameters
+		----------
+		msgid : int
+			Id of the request
+
+		timeout : float
+			Time to wait, in seconds
+
+		Returns
+		-------
+		reply : str, list or None
+			One value as text (as a typed command would print it), a list of
+			floats for several values, or text; None if no reply came
+		'''
+		self.text = bytearray()
+		parts = bytearray()
+		deadline = time.time() + timeout
+
+		while True:
+			frame = self.nextFrame()
+
+			if frame is not None:
+				if frame[0] != msgid:
+					continue
+
+				#first parts of a long reply
+				if frame[1] == MORE:
+					parts += frame[2]
+					continue
+
+				return self.decode(frame[1], bytes(parts) + frame[2])
+
+			if time.time() > deadline:
+				return None
+
+			self.buffer += self.connection.read(
+				max(1, self.connection.in_waiting)
+				)
+
+	#function to decode a reply frame
+	def decode(self, ftype, payload):
+		'''
+		Decodes the payload of a reply frame
+		'''
+
+		#values as float32
+		if ftype == VALUES:
+			values = list(struct.unpack('<%df' % (len(payload) // 4), payload))
+
+			if len(values) == 1:
+				return '%.7g' % values[0]
+
+			return values
+
+		#nothing returned; show whatever the device printed instead
+		if ftype == ACK:
+			text = self.text.decode('utf-8', 'replace').strip()
+
+			return text if text else 'OK'
+
+		return payload.decode('utf-8', 'replace')
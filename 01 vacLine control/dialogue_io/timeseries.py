@@ -0,0 +1,370 @@
+'''
+Time-series store for the real-time plots. All channels live in one
+preallocated 2-D float64 array, one row for the timestamps and one per
+channel, so appending a point writes one column instead of copying the whole
+history (as np.append does). When the array is full it doubles, so appends
+are amortized O(1).
+
+Optionally the store is capped: once it holds maxLength points, the oldest
+half is appended to a csv file on disk (if given) and dropped, so RAM stays
+bounded on very long runs while the full history is kept.
+
+Each row is contiguous, so times() and channel() hand out views that can go
+straight to setData without copying.
+
+For drawing long runs, the store also keeps a min/max pyramid: level k holds
+the min and max of each channel over blocks of FACTOR**k points, built as the
+points come in. decimated() picks the finest level that still fits the view
+in about two points per pixel, so a redraw costs the same however long the
+run has been going, and spikes are never thinned away.
+'''
+
+import csv
+import os
+
+import numpy as np
+
+#points per block from one pyramid level to the next
+FACTOR = 4
+
+#function to make a bigger copy of a buffer
+def _grow(buffer, n, size):
+	'''
+	Copies the first n columns of buffer into a new one with size columns
+	'''
+	bigger = np.full((buffer.shape[0], size), np.nan)
+	bigger[:, :n] = buffer[:, :n]
+
+	return bigger
+
+#class for one level of the min/max pyramid
+class _Level():
+	'''
+	Start time, and min and max of each channel, for blocks of points
+	'''
+
+	def __init__(self, channels, capacity = 64):
+		self.channels = channels
+		self.buffer = np.full((2 * channels + 1, capacity), np.nan)
+		self.n = 0
+
+	#views of the rows
+	@property
+	def t(self):
+		return self.buffer[0]
+
+	@property
+	def lo(self):
+		return self.buffer[1:self.channels + 1]
+
+	@property
+	def hi(self):
+		return self.buffer[self.channels + 1:]
+
+	#function to add a block
+	def append(self, t, lo, hi):
+		if self.n == self.buffer.shape[1]:
+			self.buffer = _grow(self.buffer, self.n, 2 * self.n)
+
+		col = self.buffer[:, self.n]
+		col[0] = t
+		col[1:self.channels + 1] = lo
+		col[self.channels + 1:] = hi
+
+		self.n += 1
+
+#class for holding the plot data
+class TimeSeries():
+	'''
+	Holds timestamps and one value per channel for each point
+	'''
+
+	def __init__(self, channels, capacity = 1024, maxLength = None,
+		spill = None):
+		'''
+		Initializes the class
+
+		Parameters
+		----------
+		channels : list
+			Channel names (keys to get each channel by)
+
+		capacity : int
+			Number of points to make room for at first
+
+		maxLength : int or None
+			Most points to hold in RAM; None to grow without limit
+
+		spill : str or None
+			Csv file to append dropped points to (only used with maxLength);
+			None to just drop them
+		'''
+		self.channels = list(channels)
+		self.index = {c: i + 1 for i, c in enumerate(self.channels)}
+		self.maxLength = maxLength
+		self.spill = spill
+		self.spilled = 0
+
+		#one row for the timestamps, then one per channel
+		self.buffer = np.full((len(self.channels) + 1, max(1, capacity)), np.nan)
+		self.n = 0
+
+		#min/max pyramid, level 1 first
+		self.levels = []
+
+	def __len__(self):
+		return self.n
+
+	#function to add a point
+	def append(self, t, values):
+		'''
+		Adds one point
+
+		Parameters
+		----------
+		t : float
+			Timestamp
+
+		values : list
+			One value per channel, in channel order; None for a value that
+			is not known (stored as nan)
+		'''
+
+		#make room if full
+		if self.n == self.buffer.shape[1]:
+			if self.maxLength is not None and self.n >= self.maxLength:
+				self.drop(max(1, self.n // 2))
+
+			else:
+				self.grow()
+
+		col = self.buffer[:, self.n]
+		col[0] = t
+
+		for i, v in enumerate(values):
+			col[i + 1] = np.nan if v is None else v
+
+		self.n += 1
+		self.reduce()
+
+	#function to double the buffer
+	def grow(self):
+		'''
+		Doubles the capacity (up to maxLength, if set)
+		'''
+		size = 2 * self.buffer.shape[1]
+
+		if self.maxLength is not None:
+			size = min(size, self.maxLength)
+
+		self.buffer = _grow(self.buffer, self.n, size)
+
+	#function to drop the oldest points
+	def drop(self, k):
+		'''
+		Drops the oldest k points, appending them to the spill file first
+		'''
+		if self.spill is not None:
+			self.write(self.spill, 0, k, append = True)
+			self.spilled += k
+
+		self.buffer[:, :self.n - k] = self.buffer[:, k:self.n]
+		self.n -= k
+
+		#blocks no longer line up with the points, so start the pyramid over
+		self.rebuild()
+
+	#function to empty the store
+	def clear(self):
+		'''
+		Drops all points in RAM (the spill file is left alone)
+		'''
+		self.n = 0
+		self.levels = []
+
+	#PYRAMID#
+
+	#function to fold finished blocks into the pyramid
+	def reduce(self):
+		'''
+		Adds a block to each level whose block below just filled up (run
+		after each append; O(1) amortized)
+		'''
+		t = self.buffer[0]
+		lo = hi = self.buffer[1:]
+		n = self.n
+
+		for level in self.levels + [None]:
+			if n % FACTOR:
+				return
+
+			#the top level filled a block, so start the next one up
+			if level is None:
+				level = _Level(len(self.channels))
+				self.levels.append(level)
+
+			i = n - FACTOR
+			level.append(
+				t[i],
+				np.fmin.reduce(lo[:, i:n], axis = 1),
+				np.fmax.reduce(hi[:, i:n], axis = 1),
+				)
+
+			t, lo, hi, n = level.t, level.lo, level.hi, level.n
+
+	#function to make the pyramid from scratch
+	def rebuild(self):
+		'''
+		Makes every level from the points in RAM at once
+		'''
+		c = len(self.channels)
+		t = self.times()
+		lo = hi = self.buffer[1:, :self.n]
+
+		self.levels = []
+
+		while t.size >= FACTOR:
+			m = t.size // FACTOR
+			t = t[:m * FACTOR:FACTOR]
+			lo = np.fmin.reduce(lo[:, :m * FACTOR].reshape(c, m, FACTOR), axis = 2)
+			hi = np.fmax.reduce(hi[:, :m * FACTOR].reshape(c, m, FACTOR), axis = 2)
+
+			level = _Level(c, m)
+			level.t[:] = t
+			level.lo[:] = lo
+			level.hi[:] = hi
+			level.n = m
+
+			self.levels.append(level)
+
+	#function to get a channel thinned out to the view
+	def decimated(self, name, x0, x1, width):
+		'''
+		Gets the points to draw a channel between x0 and x1 on a plot width
+		pixels wide: the points themselves if there are few enough, else the
+		min and max of each block from the finest pyramid level that fits
+
+		Parameters
+		----------
+		name : str
+			Channel name
+
+		x0, x1 : float
+			Range of timestamps in view (-inf, inf for all)
+
+		width : int
+			Width of the plot, in pixels
+
+		Returns
+		-------
+		x, y : np.ndarray
+			Points to draw (blocks as a min and a max at the block's start
+			time); one point past each end of the view is included, so lines
+			run to the edges
+		'''
+		row = self.index[name] - 1
+		t = self.times()
+
+		i0 = max(0, int(np.searchsorted(t, x0)) - 1)
+		i1 = min(self.n, int(np.searchsorted(t, x1, 'right')) + 1)
+
+		#finest level with at most about two points per pixel
+		k = 0
+		span = i1 - i0
+
+		while span > 2 * width and k < len(self.levels):
+			span //= FACTOR
+			k += 1
+
+		if k == 0:
+			return t[i0:i1], self.channel(name)[i0:i1]
+
+		#blocks of level k in view
+		level = self.levels[k - 1]
+		b0 = i0 // FACTOR**k
+		b1 = min(level.n, -(-i1 // FACTOR**k))
+
+		xs = [level.t[b0:b1]]
+		los = [level.lo[row, b0:b1]]
+		his = [level.hi[row, b0:b1]]
+
+		#points after the last full block come from the finer levels
+		pos = b1 * FACTOR**k
+
+		for m in range(k - 1, 0, -1):
+			level = self.levels[m - 1]
+			start = pos // FACTOR**m
+			end = min(level.n, -(-i1 // FACTOR**m))
+
+			xs.append(level.t[start:end])
+			los.append(level.lo[row, start:end])
+			his.append(level.hi[row, start:end])
+
+			pos = max(pos, end * FACTOR**m)
+
+		xs.append(t[pos:i1])
+		los.append(self.channel(name)[pos:i1])
+		his.append(self.channel(name)[pos:i1])
+
+		x = np.repeat(np.concatenate(xs), 2)
+		y = np.column_stack((np.concatenate(los), np.concatenate(his))).ravel()
+
+		return x, y
+
+	#VIEWS#
+
+	def times(self):
+		'''
+		Gets the timestamps (a view; only valid until the next append)
+		'''
+		return self.buffer[0, :self.n]
+
+	def channel(self, name):
+		'''
+		Gets the values of a channel (a view; only valid until the next
+		append)
+		'''
+		return self.buffer[self.index[name], :self.n]
+
+	def last(self):
+		'''
+		Gets the newest timestamp (None if empty)
+		'''
+		return self.buffer[0, self.n - 1] if self.n else None
+
+	#function to save to csv
+	def write(self, path, start = 0, stop = None, headers = None,
+		append = False):
+		'''
+		Writes points start to stop to a csv file, one row per point
+
+		Parameters
+		----------
+		path : str
+			File to write to
+
+		start, stop : int
+			Range of points to write (stop None for all)
+
+		headers : list or None
+			Header row; defaults to 'date_time' and the channel names (only
+			written to new files when appending)
+
+		append : bool
+			Whether to add to the end of the file instead of replacing it
+		'''
+		if stop is None:
+			stop = self.n
+
+		if headers is None:
+			headers = ['date_time'] + self.channels
+
+		new = not (append and os.path.exists(path))
+
+		with open(path, 'a' if append else 'w', newline = '') as outfile:
+			writer = csv.writer(outfile, delimiter = ',')
+
+			if new:
+				writer.writerow(headers)
+
+			writer.writerows(self.buffer[:, start:stop].T.tolist())